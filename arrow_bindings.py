@@ -0,0 +1,202 @@
+"""
+arrow_bindings.py
+-----------------
+Snap bound arrows / lines onto the shapes they connect.
+
+Gemini writes startBinding / endBinding for connecting arrows (they are in
+the structured-output schema, element_schema, and the rules ask for them),
+and auto_layout sets them on every edge. The binding is usually right, but
+Gemini often puts the arrow in the wrong place. normalize_elements only syncs points to the arrow's own
+width / height, so the misplaced ends stay where they are. The target
+shapes' boundElements usually stay empty too, so Excalidraw doesn't drag the
+arrow along when the shape is moved.
+
+resolve_bindings does the following:
+  - builds an id → element index once
+  - moves each bound end onto the outline of its shape, `gap` px outside it.
+    It uses the true outline intersection for rectangles, ellipses and
+    diamonds, rotated shapes included. Other bindable elements count as
+    rectangles.
+  - clears bindings to ids that don't exist or can't be bound (arrows, lines,
+    deleted elements)
+  - makes boundElements agree with the bindings and with bound text
+    (containerId): it adds missing entries, and drops arrow / text entries
+    that nothing binds back
+
+Each end aims along its segment: a straight arrow is drawn from center to
+center, and a bent arrow keeps its interior points. The work is linear in
+the number of elements.
+
+Usage:
+    from arrow_bindings import resolve_bindings
+
+    report = resolve_bindings(elements)   # mutates elements in place
+"""
+import math
+
+LINEAR_TYPES = ("arrow", "line")
+
+# Excalidraw's default distance between a bound end and the shape outline
+DEFAULT_GAP = 4
+# boundElements entries that must be matched by a binding / containerId
+_BINDS_BACK = LINEAR_TYPES + ("text",)
+# Ends that move less than this (px) don't count as snapped
+_EPSILON = 0.5
+
+
+def _center(el: dict) -> tuple:
+    return el.get("x", 0) + el.get("width", 0) / 2, el.get("y", 0) + el.get("height", 0) / 2
+
+
+def outline_point(shape: dict, tx: float, ty: float, gap: float = 0) -> tuple:
+    """
+    Where the ray from a shape's center toward (tx, ty) crosses its outline,
+    pushed `gap` px further out. Ellipses and diamonds use their real outline,
+    and everything else uses the bounding rectangle. Rotation (`angle`, in
+    radians) is taken into account.
+    """
+    cx, cy = _center(shape)
+    dx, dy = tx - cx, ty - cy
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return cx, cy
+    a, b = abs(shape.get("width", 0)) / 2, abs(shape.get("height", 0)) / 2
+    angle = shape.get("angle") or 0
+    # The ray in the shape's own (unrotated) frame. Rotation keeps lengths, so
+    # the scale along the ray is the same in both frames.
+    lx, ly = dx, dy
+    if angle:
+        cos, sin = math.cos(angle), math.sin(angle)
+        lx, ly = dx * cos + dy * sin, -dx * sin + dy * cos
+    kind = shape.get("type")
+    if a == 0 or b == 0:
+        scale = 0.0
+    elif kind == "ellipse":
+        scale = 1 / math.hypot(lx / a, ly / b)
+    elif kind == "diamond":
+        scale = 1 / (abs(lx) / a + abs(ly) / b)
+    else:
+        scale = min(a / abs(lx) if lx else math.inf, b / abs(ly) if ly else math.inf)
+    scale += gap / length
+    return cx + dx * scale, cy + dy * scale
+
+
+def _binding(el: dict, key: str, index: dict):
+    """The shape a binding points at, or None (the binding is cleared if it can't be used)."""
+    binding = el.get(key)
+    if binding is None:
+        return None
+    ref = binding.get("elementId") if isinstance(binding, dict) else None
+    target = index.get(ref) if isinstance(ref, (str, int)) else None
+    if target is None or target is el or target.get("type") in LINEAR_TYPES or target.get("isDeleted"):
+        el[key] = None
+        return False
+    if not isinstance(binding.get("gap"), (int, float)):
+        binding["gap"] = DEFAULT_GAP
+    binding["focus"] = 0     # every snapped end aims through the center
+    return target
+
+
+def _container(text: dict, index: dict):
+    """The element a bound text sits in; a containerId that can't be used is cleared (None)."""
+    ref = text["containerId"]
+    container = index.get(ref) if isinstance(ref, (str, int)) else None
+    if container is None or container.get("type") == "text" or container.get("isDeleted"):
+        text["containerId"] = None
+        return None
+    return container
+
+
+def _snap(el: dict, start: dict, end: dict) -> int:
+    """Move the bound ends of one arrow; returns how many ends moved."""
+    x, y = el.get("x", 0), el.get("y", 0)
+    points = el.get("points") or [[0, 0], [el.get("width", 0), el.get("height", 0)]]
+    try:
+        pts = [(x + p[0], y + p[1]) for p in points]
+    except (TypeError, IndexError):
+        return 0
+    if len(pts) < 2 or (start is end and len(pts) == 2):
+        return 0     # nothing to aim along
+    straight = len(pts) == 2
+    new = list(pts)
+    if start:
+        aim = _center(end) if straight and end else pts[1]
+        new[0] = outline_point(start, *aim, el["startBinding"]["gap"])
+    if end:
+        aim = _center(start) if straight and start else pts[-2]
+        new[-1] = outline_point(end, *aim, el["endBinding"]["gap"])
+    moved = sum(math.dist(p, q) > _EPSILON for p, q in ((pts[0], new[0]), (pts[-1], new[-1])))
+    if not moved:
+        return 0
+
+    x0, y0 = new[0]
+    x0, y0 = round(x0, 2), round(y0, 2)
+    rel = [[round(px - x0, 2), round(py - y0, 2)] for px, py in new]
+    rel[0] = [0, 0]
+    xs = [p[0] for p in rel]
+    ys = [p[1] for p in rel]
+    el["x"], el["y"] = x0, y0
+    el["points"] = rel
+    el["width"] = max(xs) - min(xs)
+    el["height"] = max(ys) - min(ys)
+    return moved
+
+
+def resolve_bindings(elements: list, snap: bool = True) -> dict:
+    """
+    Snap bound ends and make boundElements reciprocal, in place.
+    snap=False only fixes the bookkeeping. Returns a report:
+    {"arrows": bound arrows/lines, "snapped": ends moved,
+     "dangling": bindings / containerIds cleared, "linked": boundElements entries added,
+     "unlinked": stale entries removed}.
+    """
+    index = {}
+    for el in elements:
+        el_id = el.get("id")
+        if isinstance(el_id, (str, int)):
+            index.setdefault(el_id, el)
+
+    report = {"arrows": 0, "snapped": 0, "dangling": 0, "linked": 0, "unlinked": 0}
+    wanted = {}      # shape id -> {arrow / text id: its type}
+    for el in elements:
+        if el.get("type") == "text" and el.get("containerId") is not None:
+            container = _container(el, index)
+            if container and isinstance(el.get("id"), (str, int)):
+                wanted.setdefault(container["id"], {})[el["id"]] = "text"
+            report["dangling"] += container is None
+            continue
+        if el.get("type") not in LINEAR_TYPES or el.get("isDeleted"):
+            continue
+        start, end = _binding(el, "startBinding", index), _binding(el, "endBinding", index)
+        report["dangling"] += (start is False) + (end is False)
+        start, end = start or None, end or None
+        if not (start or end):
+            continue
+        report["arrows"] += 1
+        if isinstance(el.get("id"), (str, int)):
+            for shape in {id(s): s for s in (start, end) if s}.values():
+                wanted.setdefault(shape["id"], {})[el["id"]] = el["type"]
+        if snap:
+            report["snapped"] += _snap(el, start, end)
+
+    for el in elements:
+        bound = el.get("boundElements")
+        el_id = el.get("id")
+        want = wanted.get(el_id, {}) if isinstance(el_id, (str, int)) else {}
+        if not bound and not want:
+            continue
+        kept, seen = [], set()
+        for entry in bound or []:
+            ref = entry.get("id") if isinstance(entry, dict) else None
+            if not isinstance(ref, (str, int)) or ref in seen or ref not in index or (
+                    entry.get("type") in _BINDS_BACK and ref not in want):
+                report["unlinked"] += 1
+                continue
+            seen.add(ref)
+            kept.append(entry)
+        for ref, kind in want.items():
+            if ref not in seen:
+                kept.append({"id": ref, "type": kind})
+                report["linked"] += 1
+        el["boundElements"] = kept
+    return report
@@ -0,0 +1,762 @@
+"""
+auto_layout.py
+--------------
+Deterministic local layout: turns a diagram topology (groups, nodes, edges)
+into positioned Excalidraw elements, so Gemini only names things and
+connects them instead of generating every coordinate.
+
+Topology (what Gemini returns in --layout local mode, see
+element_schema.topology_schema):
+    {
+      "groups": [{"id": "api", "label": "Backend"}],       # tiers, lanes, branches, zones
+      "nodes":  [{"id": "n1", "label": "Login", "kind": "process",
+                  "group": "api", "detail": "POST /login"}],
+      "edges":  [{"from": "n1", "to": "n2", "label": "yes", "style": "dashed"}]
+    }
+
+Engines, following each type's TYPE_RULES conventions:
+    layered   flowchart, architecture, erd, class, state, network, c4
+              (break cycles, rank by longest path, order each layer by
+              barycenter sweeps, then place nodes under their parents)
+              Groups of architecture / network / c4 become stacked bands
+              (tiers, zones, boundaries).
+    radial    mindmap
+    columns   sequence (actors, lifelines, messages) and swimlane (lanes)
+    axis      timeline (events alternating around an axis) and gitflow
+              (one row per branch)
+
+The output is raw elements like Gemini's (no seeds, versions, ...), ready
+for normalize_elements(geometry=False). Arrows are bound to their shapes
+and snapped by arrow_bindings. Same topology in, same elements out.
+
+Usage:
+    from auto_layout import layout
+    elements = layout("flowchart", topology)
+"""
+import math
+
+from arrow_bindings import DEFAULT_GAP, outline_point, resolve_bindings
+from text_layout import bind_text, measure_text
+
+LAYOUT_ENGINES = {
+    "flowchart": "layered", "architecture": "layered", "erd": "layered", "class": "layered",
+    "state": "layered", "network": "layered", "c4": "layered",
+    "mindmap": "radial",
+    "sequence": "columns", "swimlane": "columns",
+    "timeline": "axis", "gitflow": "axis",
+}
+
+# Types whose connections are plain lines rather than arrows
+_LINE_EDGES = {"erd", "network", "mindmap"}
+# Types whose groups are drawn as stacked bands around their members
+_BANDED = {"architecture", "network", "c4"}
+
+_FONT_SIZE = 16
+_H_GAP = 80            # between nodes of a layer
+_V_GAP = 70            # between layers
+_BAND_PAD = 40         # inside a tier / zone / boundary box
+_ORIGIN = (100, 100)
+
+
+# ─────────────────────────────────────────────
+# Node styles per type and kind (from TYPE_RULES)
+# ─────────────────────────────────────────────
+def _style(shape: str, w: int, h: int, bg: str, stroke: str = "#333333", **extra) -> dict:
+    return {"type": shape, "width": w, "height": h, "backgroundColor": bg, "strokeColor": stroke, **extra}
+
+
+NODE_STYLES = {
+    "flowchart": {
+        "*":        _style("rectangle", 180, 60, "#dbe9f9"),
+        "start":    _style("ellipse", 140, 50, "#d4edda", "#28a745"),
+        "end":      _style("ellipse", 140, 50, "#d4edda", "#28a745"),
+        "decision": _style("diamond", 160, 90, "#fff3cd", "#856404"),
+        "io":       _style("rectangle", 180, 60, "#e8d5f5", "#6f42c1"),
+        "database": _style("ellipse", 160, 50, "#fde8d8"),
+    },
+    "architecture": {
+        "*":            _style("rectangle", 150, 60, "#ffffff"),
+        "database":     _style("ellipse", 140, 60, "#fde8d8"),
+        "cache":        _style("rectangle", 150, 60, "#ffe8cc"),
+        "queue":        _style("rectangle", 150, 60, "#ffffff", strokeStyle="dashed"),
+        "loadbalancer": _style("rectangle", 150, 60, "#e8ffe8", icon="⚖️"),
+        "external":     _style("rectangle", 150, 60, "#f8e8f8"),
+    },
+    "erd": {
+        "*":    _style("rectangle", 200, 60, "#ffffff", "#2c5f8a"),
+        "weak": _style("rectangle", 200, 60, "#ffffff", "#2c5f8a", strokeStyle="dashed"),
+    },
+    "class": {
+        "*":         _style("rectangle", 220, 60, "#ffffff", "#4a90d9"),
+        "abstract":  _style("rectangle", 220, 60, "#ffffff", "#6c757d", prefix="«abstract»"),
+        "interface": _style("rectangle", 220, 60, "#ffffff", "#17a2b8", prefix="«interface»"),
+    },
+    "state": {
+        "*":       _style("rectangle", 160, 60, "#dbe9f9"),
+        "initial": _style("ellipse", 30, 30, "#333333", label=False),
+        "final":   _style("ellipse", 36, 36, "#333333", label=False, strokeWidth=4),
+        "active":  _style("rectangle", 160, 60, "#d4edda"),
+        "error":   _style("rectangle", 160, 60, "#f8d7da"),
+    },
+    "network": {
+        "*":            _style("rectangle", 140, 60, "#dae8fc", icon="🖥️"),
+        "router":       _style("rectangle", 140, 60, "#e8f4f8", icon="🔀"),
+        "switch":       _style("rectangle", 140, 60, "#d5e8d4", icon="🔃"),
+        "firewall":     _style("rectangle", 140, 60, "#f8cecc", icon="🛡️"),
+        "pc":           _style("rectangle", 140, 60, "#fff2cc", icon="💻"),
+        "cloud":        _style("ellipse", 160, 80, "#e1d5e7", strokeStyle="dashed", icon="☁️"),
+        "database":     _style("ellipse", 130, 60, "#fde8d8"),
+        "ap":           _style("ellipse", 140, 60, "#fff2cc", icon="📡"),
+        "loadbalancer": _style("rectangle", 140, 60, "#e8ffe8", icon="⚖️"),
+    },
+    "c4": {
+        "*":         _style("rectangle", 200, 100, "#1168bd", "#0b4884"),
+        "person":    _style("rectangle", 120, 100, "#08427b", "#052e56"),
+        "external":  _style("rectangle", 200, 100, "#999999", "#666666"),
+        "container": _style("rectangle", 200, 110, "#438dd5", "#2e6295"),
+        "component": _style("rectangle", 200, 110, "#85bbf0", "#5d82a8"),
+        "database":  _style("ellipse", 180, 100, "#438dd5", "#2e6295"),
+    },
+    "sequence": {
+        "*": _style("rectangle", 140, 50, "#dbe9f9"),
+    },
+    "swimlane": {
+        "*":        _style("rectangle", 160, 50, "#ffffff"),
+        "decision": _style("diamond", 140, 80, "#fff3cd", "#856404"),
+        "start":    _style("ellipse", 120, 50, "#d4edda", "#28a745"),
+        "end":      _style("ellipse", 120, 50, "#d4edda", "#28a745"),
+    },
+    "timeline": {
+        "*":       _style("rectangle", 150, 50, "#dbe9f9"),
+        "success": _style("rectangle", 150, 50, "#d4edda"),
+        "issue":   _style("rectangle", 150, 50, "#f8d7da"),
+        "info":    _style("rectangle", 150, 50, "#fff3cd"),
+    },
+    "mindmap": {
+        "*": _style("rectangle", 150, 50, "#ffffff"),
+    },
+    "gitflow": {
+        "*": _style("ellipse", 24, 24, "#ffffff", strokeWidth=2, label=False),
+    },
+}
+
+_BAND_COLORS = ["#e8f4f8", "#e8f9e8", "#fff8e8", "#f8e8f8", "#f0f0f0"]
+_LANE_COLORS = ["#e3f2fd", "#e8f5e9", "#fff8e1", "#fce4ec", "#f3e5f5", "#e0f2f1"]
+_BRANCH_PALETTE = ["#e74c3c", "#3498db", "#27ae60", "#f39c12", "#9b59b6", "#1abc9c", "#e67e22", "#34495e"]
+_GIT_COLORS = {"main": "#2c3e50", "master": "#2c3e50", "develop": "#2980b9", "feature": "#27ae60",
+               "release": "#8e44ad", "hotfix": "#c0392b", "bugfix": "#e67e22"}
+
+
+# ─────────────────────────────────────────────
+# Element builders
+# ─────────────────────────────────────────────
+def _ink(bg: str) -> str:
+    """Text color readable on a background (white on dark fills)."""
+    if not bg.startswith("#") or len(bg) != 7:
+        return "#1e1e1e"
+    r, g, b = (int(bg[i:i + 2], 16) for i in (1, 3, 5))
+    return "#ffffff" if 0.299 * r + 0.587 * g + 0.114 * b < 128 else "#1e1e1e"
+
+
+def _tint(color: str, amount: float) -> str:
+    """Mix a #rrggbb color with white (amount=1 → white)."""
+    r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    return "#" + "".join(f"{round(c + (255 - c) * amount):02x}" for c in (r, g, b))
+
+
+def _text(el_id: str, text: str, cx: float, cy: float, font_size: int = _FONT_SIZE,
+          color: str = "#1e1e1e", align: str = "center") -> dict:
+    w, h = measure_text(text, font_size)
+    x = {"center": cx - w / 2, "right": cx - w}.get(align, cx)
+    return {"id": el_id, "type": "text", "x": round(x, 1), "y": round(cy - h / 2, 1),
+            "width": round(w, 1), "height": round(h, 1), "text": text, "fontSize": font_size,
+            "fontFamily": 1, "textAlign": align, "verticalAlign": "middle", "strokeColor": color}
+
+
+def _linear(el_id: str, kind: str, pts: list, stroke: str = "#333333", style: str = "solid",
+            width: int = 2, start_head=None, end_head="arrow") -> dict:
+    """Arrow / line through absolute points."""
+    x0, y0 = pts[0]
+    rel = [[round(x - x0, 1), round(y - y0, 1)] for x, y in pts]
+    xs = [p[0] for p in rel]
+    ys = [p[1] for p in rel]
+    el = {"id": el_id, "type": kind, "x": round(x0, 1), "y": round(y0, 1),
+          "width": max(xs) - min(xs), "height": max(ys) - min(ys), "points": rel,
+          "strokeColor": stroke, "strokeStyle": style, "strokeWidth": width}
+    if kind == "arrow":
+        el["startArrowhead"] = start_head
+        el["endArrowhead"] = end_head
+    else:
+        el["startArrowhead"] = el["endArrowhead"] = None
+    return el
+
+
+def _connect(a: dict, b: dict) -> list:
+    """Straight connection between two boxes' outlines."""
+    ac = (a["x"] + a["width"] / 2, a["y"] + a["height"] / 2)
+    bc = (b["x"] + b["width"] / 2, b["y"] + b["height"] / 2)
+    return [outline_point(a, *bc), outline_point(b, *ac)]
+
+
+def _bind(arrow: dict, start: dict, end: dict) -> None:
+    """Bind an arrow to its shapes (layout() snaps it and fills boundElements)."""
+    arrow["startBinding"] = {"elementId": start["id"], "focus": 0, "gap": DEFAULT_GAP}
+    arrow["endBinding"] = {"elementId": end["id"], "focus": 0, "gap": DEFAULT_GAP}
+
+
+# ─────────────────────────────────────────────
+# Topology
+# ─────────────────────────────────────────────
+class _Graph:
+    """Validated topology: unique nodes in input order, edges between known nodes."""
+
+    def __init__(self, diagram_type: str, topology: dict):
+        self.type = diagram_type
+        self.nodes, self.order = {}, []
+        for node in topology.get("nodes") or []:
+            nid = str(node.get("id", "")).strip()
+            if nid and nid not in self.nodes:
+                self.nodes[nid] = node
+                self.order.append(nid)
+        self.edges = [e for e in topology.get("edges") or []
+                      if str(e.get("from")) in self.nodes and str(e.get("to")) in self.nodes]
+        self.groups = []
+        labels = {}
+        for group in topology.get("groups") or []:
+            gid = str(group.get("id", "")).strip()
+            if gid and gid not in labels:
+                labels[gid] = group.get("label") or gid
+                self.groups.append(gid)
+        for nid in self.order:   # groups only named on nodes, in first-seen order
+            gid = self.nodes[nid].get("group")
+            if gid and gid not in labels:
+                labels[gid] = gid
+                self.groups.append(gid)
+        self.group_labels = labels
+
+    def group_of(self, nid: str):
+        return self.nodes[nid].get("group") or None
+
+    def shape(self, nid: str) -> dict:
+        """Positionless shape element for a node, sized to fit its text."""
+        node = self.nodes[nid]
+        styles = NODE_STYLES.get(self.type, NODE_STYLES["flowchart"])
+        style = dict(styles.get((node.get("kind") or "").lower(), styles["*"]))
+        icon, prefix = style.pop("icon", None), style.pop("prefix", None)
+        show_label = style.pop("label", True)
+        el = {"id": nid, **style}
+        if show_label:
+            text = self.node_text(node, icon, prefix)
+            w, h = measure_text(text, self.font_size(node))
+            el["width"] = max(el["width"], round(w + 40))
+            el["height"] = max(el["height"], round(h + 24))
+            _fit_label(el, text, self.font_size(node))
+            el["_text"] = text
+        if el["type"] == "rectangle":
+            el["roundness"] = None if self.type in ("erd", "swimlane") else {"type": 3}
+        return el
+
+    @staticmethod
+    def node_text(node: dict, icon: str = None, prefix: str = None) -> str:
+        parts = [prefix] if prefix else []
+        label = str(node.get("label") or node.get("id"))
+        parts.append(f"{icon} {label}" if icon else label)
+        if node.get("detail"):
+            parts.append(str(node["detail"]))
+        return "\n".join(parts)
+
+    @staticmethod
+    def font_size(node: dict) -> int:
+        return 14 if node.get("detail") else _FONT_SIZE
+
+
+def _fit_label(shape: dict, text: str, font_size: int) -> None:
+    """Grow a shape (before placement) so its bound label fits; ellipses and diamonds wrap it."""
+    probe = dict(shape, x=0, y=0)
+    bind_text(probe, text, font_size=font_size)
+    shape["width"], shape["height"] = math.ceil(probe["width"]), math.ceil(probe["height"])
+
+
+def _place(shape: dict, cx: float, cy: float) -> dict:
+    shape["x"] = round(cx - shape["width"] / 2, 1)
+    shape["y"] = round(cy - shape["height"] / 2, 1)
+    return shape
+
+
+def _emit_shape(out: list, graph: _Graph, shape: dict) -> None:
+    """Append a placed shape and its label, bound to it."""
+    text = shape.pop("_text", None)
+    out.append(shape)
+    if text:
+        node = graph.nodes.get(shape["id"], {})
+        out.append(bind_text(shape, text, font_size=graph.font_size(node), color=_ink(shape["backgroundColor"])))
+
+
+def _edge_style(edge: dict) -> str:
+    style = (edge.get("style") or "solid").lower()
+    return style if style in ("solid", "dashed", "dotted") else "solid"
+
+
+def _emit_edge(out: list, graph: _Graph, k: int, edge: dict, pts: list, shapes: dict,
+               stroke: str = "#333333", **heads) -> dict:
+    kind = "line" if graph.type in _LINE_EDGES else "arrow"
+    el = _linear(f"edge{k}", kind, pts, stroke, _edge_style(edge), **heads)
+    if kind == "arrow":
+        _bind(el, shapes[str(edge["from"])], shapes[str(edge["to"])])
+    out.append(el)
+    if edge.get("label"):
+        mid = len(pts) // 2
+        (x1, y1), (x2, y2) = pts[mid - 1], pts[mid]
+        out.append(_text(f"edge{k}-label", str(edge["label"]), (x1 + x2) / 2 + 6, (y1 + y2) / 2 - 12,
+                         13, "#555555", align="left"))
+    return el
+
+
+# ─────────────────────────────────────────────
+# Layered (Sugiyama-style)
+# ─────────────────────────────────────────────
+def _acyclic(order: list, edges: list) -> list:
+    """Edges as (u, v) with back edges of a DFS (in node order) reversed."""
+    succ = {n: [] for n in order}
+    for e in edges:
+        u, v = str(e["from"]), str(e["to"])
+        if u != v:
+            succ[u].append(v)
+    state, flipped = {}, set()     # state: 1 = on stack, 2 = done
+    for root in order:
+        if root in state:
+            continue
+        stack = [(root, iter(succ[root]))]
+        state[root] = 1
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state.get(child) == 1:
+                    flipped.add((node, child))
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(succ[child])))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    dag = []
+    for u in order:
+        for v in succ[u]:
+            dag.append((v, u) if (u, v) in flipped else (u, v))
+    return dag
+
+
+def _longest_path_ranks(order: list, dag: list) -> dict:
+    preds = {n: [] for n in order}
+    indegree = dict.fromkeys(order, 0)
+    succ = {n: [] for n in order}
+    for u, v in dag:
+        succ[u].append(v)
+        preds[v].append(u)
+        indegree[v] += 1
+    rank = dict.fromkeys(order, 0)
+    queue = [n for n in order if indegree[n] == 0]
+    for u in queue:       # Kahn's algorithm; the list grows while iterating
+        for v in succ[u]:
+            rank[v] = max(rank[v], rank[u] + 1)
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                queue.append(v)
+    return rank
+
+
+def _order_layers(layers: list, dag: list, sweeps: int = 4) -> list:
+    """Reduce crossings: reorder each layer by the barycenter of its neighbours."""
+    preds, succs = {}, {}
+    for u, v in dag:
+        succs.setdefault(u, []).append(v)
+        preds.setdefault(v, []).append(u)
+    pos = {n: i for layer in layers for i, n in enumerate(layer)}
+
+    def sweep(indexes, neighbours):
+        for r in indexes:
+            layer = layers[r]
+            keys = {}
+            for n in layer:
+                near = [pos[m] for m in neighbours.get(n, ()) if m in pos]
+                keys[n] = sum(near) / len(near) if near else pos[n]
+            layer.sort(key=lambda n: (keys[n], pos[n]))
+            for i, n in enumerate(layer):
+                pos[n] = i
+
+    for _ in range(sweeps):
+        sweep(range(1, len(layers)), preds)
+        sweep(range(len(layers) - 2, -1, -1), succs)
+    return layers
+
+
+def _layered_positions(layers: list, shapes: dict, dag: list, v_gap: float) -> None:
+    """Place layers top to bottom; each node as close as possible above its parents' mean x."""
+    preds = {}
+    for u, v in dag:
+        preds.setdefault(v, []).append(u)
+    y = _ORIGIN[1]
+    for layer in layers:
+        height = max(shapes[n]["height"] for n in layer)
+        cy = y + height / 2
+        wanted = {}
+        for n in layer:
+            xs = [shapes[p]["x"] + shapes[p]["width"] / 2 for p in preds.get(n, ()) if "x" in shapes[p]]
+            if xs:
+                wanted[n] = sum(xs) / len(xs)
+        right = -math.inf
+        for n in layer:
+            w = shapes[n]["width"]
+            left = wanted[n] - w / 2 if n in wanted else max(right + _H_GAP, 0)
+            left = max(left, right + _H_GAP)
+            _place(shapes[n], left + w / 2, cy)
+            right = left + w
+        # Shift the whole layer so it sits centered on its parents on average
+        drift = [wanted[n] - (shapes[n]["x"] + shapes[n]["width"] / 2) for n in layer if n in wanted]
+        shift = sum(drift) / len(drift) if drift else -(right + shapes[layer[0]]["x"]) / 2
+        for n in layer:
+            shapes[n]["x"] = round(shapes[n]["x"] + shift, 1)
+        y += height + v_gap
+
+
+def _layered(graph: _Graph) -> list:
+    shapes = {n: graph.shape(n) for n in graph.order}
+    dag = _acyclic(graph.order, graph.edges)
+    banded = graph.type in _BANDED and graph.groups
+    if banded:
+        band = {g: i for i, g in enumerate(graph.groups)}
+        ranks = {n: band.get(graph.group_of(n), len(graph.groups)) for n in graph.order}
+    else:
+        ranks = _longest_path_ranks(graph.order, dag)
+    layers = [[] for _ in range(max(ranks.values(), default=-1) + 1)]
+    for n in graph.order:
+        layers[ranks[n]].append(n)
+    layers = [layer for layer in layers if layer]
+    _order_layers(layers, dag)
+    _layered_positions(layers, shapes, dag, 2 * _BAND_PAD + 40 if banded else _V_GAP)
+    _normalize_origin(shapes.values())
+
+    out = []
+    if banded:
+        out.extend(_bands(graph, shapes))
+    for n in graph.order:
+        _emit_shape(out, graph, shapes[n])
+    for k, edge in enumerate(graph.edges):
+        a, b = shapes[str(edge["from"])], shapes[str(edge["to"])]
+        pts = _self_loop(a) if a is b else _connect(a, b)
+        _emit_edge(out, graph, k, edge, pts, shapes)
+    return out
+
+
+def _self_loop(shape: dict) -> list:
+    x, y = shape["x"] + shape["width"], shape["y"] + shape["height"] / 2
+    return [(x, y - 10), (x + 40, y - 30), (x + 40, y + 30), (x, y + 10)]
+
+
+def _bands(graph: _Graph, shapes: dict) -> list:
+    """Tier / zone / boundary boxes around each group's members (drawn first, behind them)."""
+    out = []
+    for i, gid in enumerate(graph.groups):
+        members = [shapes[n] for n in graph.order if graph.group_of(n) == gid]
+        if not members:
+            continue
+        x0 = min(s["x"] for s in members) - _BAND_PAD
+        y0 = min(s["y"] for s in members) - _BAND_PAD
+        x1 = max(s["x"] + s["width"] for s in members) + _BAND_PAD
+        y1 = max(s["y"] + s["height"] for s in members) + _BAND_PAD
+        out.append({"id": f"group-{gid}", "type": "rectangle", "x": x0, "y": y0,
+                    "width": x1 - x0, "height": y1 - y0, "strokeStyle": "dashed", "strokeColor": "#666666",
+                    "backgroundColor": _BAND_COLORS[i % len(_BAND_COLORS)], "opacity": 30,
+                    "roundness": {"type": 3}})
+        out.append(_text(f"group-{gid}-label", graph.group_labels[gid], x0 + 10, y0 + 18, 18, align="left"))
+    return out
+
+
+def _normalize_origin(shapes) -> None:
+    shapes = list(shapes)
+    if not shapes:
+        return
+    dx = _ORIGIN[0] + 2 * _BAND_PAD - min(s["x"] for s in shapes)
+    dy = _ORIGIN[1] + 2 * _BAND_PAD - min(s["y"] for s in shapes)
+    for s in shapes:
+        s["x"] = round(s["x"] + dx, 1)
+        s["y"] = round(s["y"] + dy, 1)
+
+
+# ─────────────────────────────────────────────
+# Radial (mindmap)
+# ─────────────────────────────────────────────
+def _radial(graph: _Graph) -> list:
+    if not graph.order:
+        return []
+    adjacent = {n: [] for n in graph.order}
+    incoming = set()
+    for e in graph.edges:
+        u, v = str(e["from"]), str(e["to"])
+        if u != v:
+            adjacent[u].append(v)
+            adjacent[v].append(u)
+            incoming.add(v)
+    root = next((n for n in graph.order if n not in incoming), graph.order[0])
+
+    # BFS tree; anything unreachable hangs off the root
+    parent, children, depth = {root: None}, {n: [] for n in graph.order}, {root: 0}
+    queue = [root]
+    for n in queue:
+        for m in adjacent[n]:
+            if m not in parent:
+                parent[m], depth[m] = n, depth[n] + 1
+                children[n].append(m)
+                queue.append(m)
+    for n in graph.order:
+        if n not in parent:
+            parent[n], depth[n] = root, 1
+            children[root].append(n)
+            queue.append(n)
+
+    leaves = {}
+    for n in reversed(queue):
+        leaves[n] = sum(leaves[c] for c in children[n]) or 1
+
+    # Angular wedges proportional to leaf counts, clockwise from the top
+    angle = {root: -math.pi / 2}
+    wedge = {root: (-math.pi / 2, 3 * math.pi / 2)}
+    for n in queue:
+        start, end = wedge[n]
+        for c in children[n]:
+            span = (end - start) * leaves[c] / leaves[n]
+            wedge[c] = (start, start + span)
+            angle[c] = start + span / 2
+            start += span
+
+    branch = {}
+    for n in queue:
+        if depth[n] == 1:
+            branch[n] = _BRANCH_PALETTE[len(branch) % len(_BRANCH_PALETTE)]
+        elif depth[n] > 1:
+            branch[n] = branch[parent[n]]
+
+    # Sizes first: root ellipse, boxed levels 1–2, bare text below that
+    shapes, sizes = {}, {}
+    for n in queue:
+        d = depth[n]
+        label = graph.node_text(graph.nodes[n])
+        if d == 0:
+            shape, size = _style("ellipse", 180, 70, "#4a90d9", "#2c5f8a"), 18
+        elif d <= 2:
+            shape = _style("rectangle", 150 if d == 1 else 130, 50 if d == 1 else 40,
+                           _tint(branch[n], 0.7 if d == 1 else 0.85), branch[n], roundness={"type": 3})
+            size = _FONT_SIZE if d == 1 else 14
+        else:
+            shape, size = None, 13
+        w, h = measure_text(label, size)
+        if shape is None:
+            shape = {"id": f"{n}-label", "width": w, "height": h}
+        else:
+            shape.update(id=n, width=max(shape["width"], round(w + 40)), height=max(shape["height"], round(h + 20)))
+            _fit_label(shape, label, size)
+        shapes[n], sizes[n] = shape, (label, size)
+
+    # Ring radius per depth: far enough out that neighbours on the ring don't touch
+    per_depth = {}
+    for n in queue:
+        per_depth.setdefault(depth[n], []).append(n)
+    radius = {0: 0}
+    for d in range(1, max(per_depth) + 1):
+        ring = sorted(angle[n] for n in per_depth[d])
+        radius[d] = radius[d - 1] + (250 if d == 1 else 180)
+        if len(ring) > 1:
+            closest = min(b - a for a, b in zip(ring, ring[1:] + [ring[0] + 2 * math.pi]))
+            extent = max(max(shapes[n]["width"], shapes[n]["height"]) for n in per_depth[d]) + 30
+            radius[d] = max(radius[d], extent / (2 * math.sin(min(closest, math.pi) / 2)))
+
+    cx, cy = 500, 400
+    out = []
+    for n in queue:
+        d = depth[n]
+        x, y = cx + math.cos(angle[n]) * radius[d], cy + math.sin(angle[n]) * radius[d]
+        shape = _place(shapes[n], x, y)
+        label, size = sizes[n]
+        if d <= 2:
+            out.append(shape)
+            out.append(bind_text(shape, label, font_size=size, color=_ink(shape["backgroundColor"])))
+        else:
+            out.append(_text(f"{n}-label", label, x, y, size))
+
+    for k, n in enumerate(queue[1:]):
+        d = depth[n]
+        pts = _connect(shapes[parent[n]], shapes[n])
+        out.append(_linear(f"edge{k}", "line", pts, branch[n], "dashed" if d >= 3 else "solid",
+                           width=max(1, 4 - d)))
+    return out
+
+
+# ─────────────────────────────────────────────
+# Columns (sequence, swimlane)
+# ─────────────────────────────────────────────
+def _sequence(graph: _Graph) -> list:
+    out, shapes = [], {}
+    for n in graph.order:
+        shapes[n] = graph.shape(n)
+    spacing = max([200] + [s["width"] + 60 for s in shapes.values()])
+    top = _ORIGIN[1]
+    for i, s in enumerate(shapes.values()):
+        _place(s, 80 + 70 + i * spacing, top + s["height"] / 2)
+    msg_top = top + 50 + 60
+    height = (len(graph.edges) + 1) * 70 + 60
+    for n in graph.order:
+        s = shapes[n]
+        _emit_shape(out, graph, s)
+        cx = s["x"] + s["width"] / 2
+        out.append(_linear(f"{n}-lifeline", "line", [(cx, s["y"] + s["height"]), (cx, s["y"] + s["height"] + height)],
+                           "#999999", "dashed", width=1))
+
+    for k, edge in enumerate(graph.edges):
+        a, b = shapes[str(edge["from"])], shapes[str(edge["to"])]
+        ax, bx = a["x"] + a["width"] / 2, b["x"] + b["width"] / 2
+        y = msg_top + k * 70
+        pts = [(ax, y), (ax + 40, y), (ax + 40, y + 40), (ax, y + 40)] if a is b else [(ax, y), (bx, y)]
+        dashed = _edge_style(edge) != "solid"
+        el = _linear(f"edge{k}", "arrow", pts, "#888888" if dashed else "#333333",
+                     "dashed" if dashed else "solid")
+        out.append(el)
+        if edge.get("label"):
+            out.append(_text(f"edge{k}-label", str(edge["label"]), (ax + (bx if a is not b else ax + 40)) / 2,
+                             y - 14, 13))
+    return out
+
+
+def _swimlane(graph: _Graph) -> list:
+    lanes = graph.groups or [None]
+    lane_of = {n: graph.group_of(n) if graph.group_of(n) in lanes else lanes[0] for n in graph.order}
+    shapes = {n: graph.shape(n) for n in graph.order}
+
+    # Rows: topological rank, bumped down until the slot in the node's lane is free
+    dag = _acyclic(graph.order, graph.edges)
+    preds = {n: [] for n in graph.order}
+    for u, v in dag:
+        preds[v].append(u)
+    ranks = _longest_path_ranks(graph.order, dag)
+    row, taken = {}, set()
+    index = {n: i for i, n in enumerate(graph.order)}
+    for n in sorted(graph.order, key=lambda n: (ranks[n], index[n])):
+        r = max([row[p] + 1 for p in preds[n] if p in row] + [0])
+        while (lane_of[n], r) in taken:
+            r += 1
+        row[n] = r
+        taken.add((lane_of[n], r))
+
+    rows = max(row.values(), default=0) + 1
+    header, top = 50, 20
+    lane_h = header + rows * 100 + 40
+    out, x = [], 20
+    lane_x = {}
+    for i, lane in enumerate(lanes):
+        members = [n for n in graph.order if lane_of[n] == lane]
+        w = max([200] + [shapes[n]["width"] + 40 for n in members])
+        color = _LANE_COLORS[min(i, len(_LANE_COLORS) - 1)]
+        gid = lane if lane is not None else "lane"
+        out.append({"id": f"group-{gid}", "type": "rectangle", "x": x, "y": top, "width": w, "height": lane_h,
+                    "backgroundColor": color, "strokeColor": "#cccccc", "opacity": 20, "roundness": None})
+        out.append({"id": f"group-{gid}-header", "type": "rectangle", "x": x, "y": top, "width": w,
+                    "height": header, "backgroundColor": color, "strokeColor": "#cccccc", "opacity": 60,
+                    "roundness": None})
+        if lane is not None:
+            out.append(_text(f"group-{gid}-label", graph.group_labels[lane], x + w / 2, top + header / 2))
+        lane_x[lane] = x + w / 2
+        x += w
+
+    for n in graph.order:
+        _emit_shape(out, graph, _place(shapes[n], lane_x[lane_of[n]], top + header + 60 + row[n] * 100))
+    for k, edge in enumerate(graph.edges):
+        a, b = shapes[str(edge["from"])], shapes[str(edge["to"])]
+        ax, bx = a["x"] + a["width"] / 2, b["x"] + b["width"] / 2
+        a_bottom, b_top = a["y"] + a["height"], b["y"]
+        if a is b:
+            pts = _self_loop(a)
+        elif b_top - a_bottom >= 40 and ax != bx:     # elbow down, across, down
+            pts = [(ax, a_bottom), (ax, a_bottom + 30), (bx, a_bottom + 30), (bx, b_top)]
+        elif b_top > a_bottom and ax == bx:
+            pts = [(ax, a_bottom), (bx, b_top)]
+        else:
+            pts = _connect(a, b)
+        _emit_edge(out, graph, k, edge, pts, shapes)
+    return out
+
+
+# ─────────────────────────────────────────────
+# Axis (timeline, gitflow)
+# ─────────────────────────────────────────────
+def _timeline(graph: _Graph) -> list:
+    shapes = {n: graph.shape(n) for n in graph.order}
+    spacing = max([170] + [s["width"] + 20 for s in shapes.values()])
+    axis_y, start = 300, 200
+    end = max(start + (len(graph.order) - 1) * spacing + 100, 1100)
+    out = [_linear("axis", "line", [(100, axis_y), (end, axis_y)], "#333333", width=3)]
+    for i, n in enumerate(graph.order):
+        tx = start + i * spacing
+        s = shapes[n]
+        above = i % 2 == 0
+        cy = axis_y - 30 - s["height"] / 2 if above else axis_y + 40 + s["height"] / 2
+        _place(s, tx, cy)
+        out.append(_linear(f"{n}-tick", "line", [(tx, axis_y - 10), (tx, axis_y + 10)], "#333333"))
+        edge_y = s["y"] + s["height"] if above else s["y"]
+        out.append(_linear(f"{n}-stem", "line", [(tx, edge_y), (tx, axis_y - 10 if above else axis_y + 10)],
+                           "#999999", "dashed", width=1))
+        _emit_shape(out, graph, s)
+    return out
+
+
+def _branch_color(name: str, index: int) -> str:
+    key = name.lower().split("/")[0].split("-")[0]
+    return _GIT_COLORS.get(key, _BRANCH_PALETTE[index % len(_BRANCH_PALETTE)])
+
+
+def _gitflow(graph: _Graph) -> list:
+    branches = graph.groups or ["main"]
+    row = {b: i for i, b in enumerate(branches)}
+    color = {b: _branch_color(graph.group_labels.get(b, b), i) for i, b in enumerate(branches)}
+    end = max(140 + len(graph.order) * 100, 1100)
+    out = []
+    for b in branches:
+        y = 100 + 100 * row[b]
+        out.append(_linear(f"branch-{b}", "line", [(100, y), (end, y)], color[b], width=3))
+        out.append(_text(f"branch-{b}-label", graph.group_labels.get(b, b), 90, y, 14, align="right"))
+
+    shapes = {}
+    for i, n in enumerate(graph.order):
+        b = graph.group_of(n) if graph.group_of(n) in row else branches[0]
+        s = graph.shape(n)
+        s["strokeColor"] = color[b]
+        shapes[n] = _place(s, 180 + i * 100, 100 + 100 * row[b])
+        out.append(s)
+        out.append(_text(f"{n}-label", str(graph.nodes[n].get("label") or n),
+                         180 + i * 100, 100 + 100 * row[b] + 28, 10))
+
+    for k, edge in enumerate(graph.edges):
+        u, v = str(edge["from"]), str(edge["to"])
+        bu = graph.group_of(u) if graph.group_of(u) in row else branches[0]
+        bv = graph.group_of(v) if graph.group_of(v) in row else branches[0]
+        if bu == bv:
+            continue     # history along a branch is the branch line itself
+        merge = row[bv] < row[bu]
+        _emit_edge(out, graph, k, edge, _connect(shapes[u], shapes[v]), shapes, color[bv],
+                   end_head="arrow" if merge else "dot")
+    return out
+
+
+_ENGINES = {
+    "layered": _layered,
+    "radial": _radial,
+    "columns": lambda g: _sequence(g) if g.type == "sequence" else _swimlane(g),
+    "axis": lambda g: _timeline(g) if g.type == "timeline" else _gitflow(g),
+}
+
+
+def layout(diagram_type: str, topology: dict) -> list:
+    """Positioned raw elements for a topology, using the type's layout engine."""
+    graph = _Graph(diagram_type, topology)
+    elements = _ENGINES[LAYOUT_ENGINES.get(diagram_type, "layered")](graph)
+    resolve_bindings(elements)
+    return elements
@@ -0,0 +1,134 @@
+"""
+bench_auto_layout.py
+--------------------
+Offline benchmark of --layout local for every diagram type:
+
+    topology   size of the {"groups", "nodes", "edges"} JSON Gemini returns
+    elements   size of the same diagram as Gemini writes it in the default
+               mode: auto_layout's elements cut down to the response schema
+               (element_schema), with bound text folded back into inline
+               "label" objects on its shapes
+    ratio      elements / topology: the cut in output tokens
+    layout     time for auto_layout.layout
+    issues     overlaps / spacing violations left (layout_repair check)
+
+Topologies are synthesized deterministically per type: a random tree plus
+a few cross edges, with groups where the type uses them. Token counts use
+the same ~4 characters per token estimate as the scheduler.
+
+Usage:
+    python benchmarks/bench_auto_layout.py
+    python benchmarks/bench_auto_layout.py --sizes 10 100 1000 --types flowchart mindmap
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excalidraw_rules import SUPPORTED_TYPES
+from auto_layout import layout
+from element_schema import element_schema
+from gemini_scheduler import estimate_tokens
+from layout_repair import find_layout_issues
+
+_GROUPS = {
+    "architecture": ["Client", "API", "Services", "Data"],
+    "swimlane": ["Customer", "Frontend", "Backend", "Billing"],
+    "network": ["Internet", "DMZ", "Core", "LAN"],
+    "gitflow": ["main", "develop", "feature/login", "feature/search", "release/1.0"],
+    "c4": ["Users", "System", "External"],
+}
+_KINDS = {
+    "flowchart": ["process", "process", "decision", "io"],
+    "architecture": ["service", "service", "database", "cache", "queue"],
+    "network": ["server", "router", "switch", "firewall", "pc"],
+    "c4": ["system", "container", "person", "external"],
+    "state": ["state", "state", "active", "error"],
+}
+_WORDS = ["order", "user", "payment", "cache", "queue", "auth", "search", "report", "invoice", "event"]
+
+
+def topology(diagram_type: str, n: int) -> dict:
+    """n nodes: a random tree (chronological for gitflow / timeline) plus ~n/5 extra edges."""
+    rng = random.Random(zlib.crc32(diagram_type.encode()) ^ n)
+    groups = _GROUPS.get(diagram_type, [])
+    kinds = _KINDS.get(diagram_type, [None])
+    nodes, edges = [], []
+    for i in range(n):
+        node = {"id": f"n{i}", "label": f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS)} {i}"}
+        kind = rng.choice(kinds)
+        if kind:
+            node["kind"] = kind
+        if groups:
+            node["group"] = groups[min(i * len(groups) // n, len(groups) - 1)] if diagram_type != "gitflow" \
+                else rng.choice(groups)
+        if diagram_type in ("erd", "class"):
+            node["detail"] = "\n".join(f"+ {rng.choice(_WORDS)}_{k}: str" for k in range(rng.randint(2, 5)))
+        if diagram_type == "timeline":
+            node["detail"] = f"Q{i % 4 + 1} {2024 + i // 4}"
+        nodes.append(node)
+        if i and diagram_type != "timeline":
+            edge = {"from": f"n{rng.randrange(max(i - 3, 0), i) if diagram_type == 'sequence' else rng.randrange(i)}",
+                    "to": f"n{i}"}
+            if rng.random() < 0.3:
+                edge["label"] = rng.choice(_WORDS)
+            edges.append(edge)
+    if diagram_type not in ("timeline", "mindmap"):
+        for _ in range(n // 5):
+            edges.append({"from": f"n{rng.randrange(n)}", "to": f"n{rng.randrange(n)}", "style": "dashed"})
+    out = {"nodes": nodes, "edges": edges}
+    if groups:
+        out["groups"] = [{"id": g, "label": g} for g in groups]
+    return out
+
+
+def model_output(elements: list) -> list:
+    """elements as the default mode would have Gemini write them: schema fields only, inline labels."""
+    schema = element_schema()["properties"]
+    label_keys = schema["label"]["properties"]
+    binding_keys = schema["startBinding"]["properties"]
+    ids = {el["id"] for el in elements}
+    labels = {el["containerId"]: {k: el[k] for k in label_keys if k in el}
+              for el in elements if el.get("type") == "text" and el.get("containerId") in ids}
+    out = []
+    for el in elements:
+        if el.get("type") == "text" and el.get("containerId") in ids:
+            continue
+        item = {k: v for k, v in el.items() if k in schema}
+        for key in ("startBinding", "endBinding"):
+            if item.get(key):
+                item[key] = {k: v for k, v in item[key].items() if k in binding_keys}
+        if el["id"] in labels:
+            item["label"] = labels[el["id"]]
+        out.append(item)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--types", nargs="+", default=SUPPORTED_TYPES, choices=SUPPORTED_TYPES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000],
+                        help="nodes per topology")
+    args = parser.parse_args()
+
+    print(f"{'type':<13} {'nodes':>6} {'topology':>9} {'elements':>9} {'ratio':>6} {'layout':>9} {'issues':>6}")
+    for n in args.sizes:
+        for dtype in args.types:
+            topo = topology(dtype, n)
+            start = time.perf_counter()
+            elements = layout(dtype, topo)
+            seconds = time.perf_counter() - start
+            topo_tokens = estimate_tokens(json.dumps(topo, ensure_ascii=False))
+            element_tokens = estimate_tokens(json.dumps(model_output(elements), ensure_ascii=False))
+            issues = len(find_layout_issues(elements))
+            print(f"{dtype:<13} {n:>6} {topo_tokens:>8}t {element_tokens:>8}t {element_tokens / topo_tokens:>5.1f}x "
+                  f"{seconds * 1000:>7.1f}ms {issues:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+bench_bindings.py
+-----------------
+Benchmark of arrow_bindings.resolve_bindings on scenes where Gemini got the
+bindings right but the geometry wrong. Shapes (rectangles, ellipses,
+diamonds) sit on a grid, and each is bound by arrows to its right and lower
+neighbours. The arrows' points are scrambled. A few bindings point at
+missing ids, and a few boundElements entries are stale.
+
+resolve_bindings as a whole (index, snapping and bookkeeping) is timed next
+to the lookups alone done by scanning the element list, which is what
+resolving without an index costs before any geometry. The scan is
+O(bindings × elements), so it is only run up to --naive-max shapes. After
+resolving, the scene is checked: every bound end must sit `gap` px outside
+its shape's outline, and every boundElements list must match the bindings.
+
+Usage:
+    python benchmarks/bench_bindings.py
+    python benchmarks/bench_bindings.py --sizes 1000 10000 100000 --naive-max 2000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arrow_bindings import resolve_bindings, outline_point
+
+SHAPES = ("rectangle", "ellipse", "diamond")
+
+
+def scene(n_shapes: int, seed: int = 7) -> list:
+    """n_shapes on a grid, with scrambled bound arrows between neighbours."""
+    rng = random.Random(seed ^ n_shapes)
+    cols = max(int(n_shapes ** 0.5), 1)
+    elements = []
+    for i in range(n_shapes):
+        r, c = divmod(i, cols)
+        elements.append({"id": f"s{i}", "type": rng.choice(SHAPES), "x": c * 260, "y": r * 180,
+                         "width": rng.randint(100, 180), "height": rng.randint(50, 100),
+                         "boundElements": [{"id": f"stale{i}", "type": "arrow"}] if i % 50 == 0 else []})
+    for i in range(n_shapes):
+        for j in (i + 1, i + cols):
+            if j >= n_shapes or (j == i + 1 and (i + 1) % cols == 0):
+                continue
+            w, h = rng.randint(-300, 300), rng.randint(-300, 300)
+            end = f"s{j}" if rng.random() > 0.02 else f"missing{j}"
+            elements.append({"id": f"a{i}-{j}", "type": "arrow", "x": rng.randint(0, cols * 260),
+                             "y": rng.randint(0, cols * 180), "width": w, "height": h,
+                             "points": [[0, 0], [w, h]],
+                             "startBinding": {"elementId": f"s{i}", "focus": 0, "gap": 4},
+                             "endBinding": {"elementId": end, "focus": 0, "gap": 4}})
+    return elements
+
+
+def naive_lookup(elements: list) -> int:
+    """Find every binding target by scanning the element list."""
+    found = 0
+    for el in elements:
+        for key in ("startBinding", "endBinding"):
+            binding = el.get(key)
+            if binding:
+                found += any(other.get("id") == binding["elementId"] for other in elements)
+    return found
+
+
+def check(elements: list) -> int:
+    """Count bound ends off their outline and boundElements lists that disagree with the bindings."""
+    index = {el["id"]: el for el in elements}
+    wanted, bad = {}, 0
+    for el in elements:
+        if el["type"] != "arrow":
+            continue
+        pts = [(el["x"] + px, el["y"] + py) for px, py in el["points"]]
+        for key, end, aim in (("startBinding", pts[0], pts[1]), ("endBinding", pts[-1], pts[-2])):
+            binding = el.get(key)
+            if binding:
+                shape = index[binding["elementId"]]
+                wanted.setdefault(shape["id"], set()).add(el["id"])
+                bad += math.dist(end, outline_point(shape, *aim, binding["gap"])) > 1
+    for el in elements:
+        if el["type"] in SHAPES:
+            bad += {b["id"] for b in el["boundElements"]} != wanted.get(el["id"], set())
+    return bad
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="number of shapes per scene")
+    parser.add_argument("--naive-max", type=int, default=2000,
+                        help="largest scene to run the scanning lookup on")
+    args = parser.parse_args()
+
+    print(f"{'shapes':>7} {'arrows':>7} {'resolve':>9} {'scan':>9} {'snapped':>8} {'dangling':>8} {'bad':>4}")
+    for n in args.sizes:
+        elements = scene(n)
+        naive = "-"
+        if n <= args.naive_max:
+            _, t_naive = timed(naive_lookup, elements)
+            naive = f"{t_naive * 1000:7.1f}ms"
+        report, t_resolve = timed(resolve_bindings, elements)
+        print(f"{n:>7} {report['arrows']:>7} {t_resolve * 1000:7.1f}ms {naive:>9} {report['snapped']:>8} "
+              f"{report['dangling']:>8} {check(elements):>4}")
+
+
+if __name__ == "__main__":
+    main()
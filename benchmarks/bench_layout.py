@@ -0,0 +1,95 @@
+"""
+bench_layout.py
+---------------
+Benchmark of layout_repair on diagram-like scenes: shapes on a jittered grid
+(so some overlap or crowd their neighbours), each with a label and an arrow
+to the next shape in its row.
+
+Detection through the spatial grid is compared with the naive pairwise
+check it replaces. The naive check is O(n²), so it is only run up to
+--naive-max shapes. Then repair_layout is timed, and the scene is checked
+to confirm nothing is left to fix.
+
+Usage:
+    python benchmarks/bench_layout.py
+    python benchmarks/bench_layout.py --sizes 1000 10000 50000 --naive-max 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layout_repair import SHAPE_TYPES, find_layout_issues, repair_layout, _box, _gaps, _FLUSH
+
+PITCH_X, PITCH_Y = 260, 180
+
+
+def scene(n_shapes: int, jitter: int = 90, seed: int = 7) -> list:
+    """n_shapes labelled shapes on a jittered grid, with row arrows."""
+    rng = random.Random(seed ^ n_shapes)
+    cols = max(int(n_shapes ** 0.5), 1)
+    elements, prev = [], None
+    for i in range(n_shapes):
+        r, c = divmod(i, cols)
+        w, h = rng.randint(120, 200), rng.randint(60, 100)
+        x = c * PITCH_X + rng.randint(-jitter, jitter)
+        y = r * PITCH_Y + rng.randint(-jitter // 2, jitter // 2)
+        shape = {"id": f"s{i}", "type": rng.choice(SHAPE_TYPES), "x": x, "y": y, "width": w, "height": h}
+        elements.append(shape)
+        elements.append({"id": f"t{i}", "type": "text", "x": x + 10, "y": y + h / 2 - 12,
+                         "width": w - 20, "height": 25, "text": f"Node {i}"})
+        if c:
+            sx, sy = prev["x"] + prev["width"], prev["y"] + prev["height"] / 2
+            ex, ey = x, y + h / 2
+            elements.append({"id": f"a{i}", "type": "arrow", "x": sx, "y": sy,
+                             "width": abs(ex - sx), "height": abs(ey - sy), "points": [[0, 0], [ex - sx, ey - sy]]})
+        prev = shape
+    return elements
+
+
+def naive_issues(elements: list, min_gap: float = 20) -> int:
+    """The all-pairs check: count shape pairs that overlap or sit closer than min_gap."""
+    boxes = [_box(el) for el in elements if el.get("type") in SHAPE_TYPES]
+    count = 0
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            gap = max(_gaps(boxes[i], boxes[j]))
+            count += abs(gap) > _FLUSH and gap < min_gap
+    return count
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000],
+                        help="number of shapes per scene")
+    parser.add_argument("--naive-max", type=int, default=2000,
+                        help="largest scene to run the O(n²) check on")
+    parser.add_argument("--min-gap", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{'shapes':>7} {'issues':>7} {'grid':>9} {'naive':>9} {'repair':>9} {'moved':>6} {'left':>5}")
+    for n in args.sizes:
+        elements = scene(n)
+        issues, t_grid = timed(find_layout_issues, elements, args.min_gap)
+        naive = "-"
+        if n <= args.naive_max:
+            count, t_naive = timed(naive_issues, elements, args.min_gap)
+            assert count == len(issues), f"grid found {len(issues)}, naive {count}"
+            naive = f"{t_naive * 1000:7.1f}ms"
+        report, t_repair = timed(repair_layout, elements, args.min_gap)
+        left = len(find_layout_issues(elements, args.min_gap))
+        print(f"{n:>7} {len(issues):>7} {t_grid * 1000:7.1f}ms {naive:>9} {t_repair * 1000:7.1f}ms "
+              f"{report['moved']:>6} {left:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+bench_pipeline.py
+-----------------
+Offline benchmark of the pipeline's hot paths on Gemini response fixtures
+(see fixtures.py) for every diagram type, from 10 to 50,000 elements:
+
+    detect     detect_diagram_type on the type's prompt
+    prompt     get_system_prompt
+    parse      json_repair.salvage_elements on the response text
+    sanitize   sanitize_elements
+    fix        fix_elements (on sanitized elements)
+    normalize  normalize_elements (fused sanitize + fix)
+    write      write_excalidraw to a temp file
+
+No network is used. Results can be saved with --save and compared against
+a previous run with --baseline; a stage slower than baseline × --tolerance
+fails the run, so this can gate a deploy.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --types flowchart sequence --sizes 1000 50000
+    python benchmarks/bench_pipeline.py --save baseline.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json --tolerance 1.25
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import SIZES, TYPE_PROMPTS, fixture_source, response_text  # also puts the repo root on sys.path
+
+from excalidraw_rules import SUPPORTED_TYPES, detect_diagram_type, get_system_prompt
+from sanitize_elements import sanitize_elements, fix_elements, normalize_elements
+from json_repair import salvage_elements
+from gemini_to_excalidraw_no_mcp import write_excalidraw
+
+STAGES = ("detect", "prompt", "parse", "sanitize", "fix", "normalize", "write")
+
+# Stages faster than this are too noisy to gate on
+_MIN_GATED_SECONDS = 0.001
+
+
+def best_of(fn, setup, repeat: int) -> float:
+    """Fastest of `repeat` runs of fn(setup()); setup is not timed."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_case(diagram_type: str, n: int, repeat: int, out_path: str) -> dict:
+    prompt = TYPE_PROMPTS[diagram_type]
+    raw = response_text(diagram_type, n)
+    fresh = lambda: json.loads(raw)
+
+    # detect / prompt are per-request costs, independent of n: loop to get a measurable time
+    loops = 1000
+    return {
+        "detect": best_of(lambda _: [detect_diagram_type(prompt) for _ in range(loops)], lambda: None, repeat) / loops,
+        "prompt": best_of(lambda _: [get_system_prompt(diagram_type) for _ in range(loops)], lambda: None, repeat) / loops,
+        "parse": best_of(salvage_elements, lambda: raw, repeat),
+        "sanitize": best_of(sanitize_elements, fresh, repeat),
+        "fix": best_of(fix_elements, lambda: sanitize_elements(fresh()), repeat),
+        "normalize": best_of(normalize_elements, fresh, repeat),
+        "write": best_of(lambda els: write_excalidraw(els, out_path), lambda: normalize_elements(fresh()), repeat),
+    }
+
+
+def _fmt(seconds: float) -> str:
+    if seconds < 0.001:
+        return f"{seconds * 1e6:7.1f}µs"
+    return f"{seconds * 1000:7.1f}ms"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower than tolerance × baseline (ignoring sub-millisecond timings)."""
+    regressions = []
+    for case, stages in results.items():
+        for stage, seconds in stages.items():
+            before = baseline.get(case, {}).get(stage)
+            if before is None or max(seconds, before) < _MIN_GATED_SECONDS:
+                continue
+            if seconds > before * tolerance:
+                regressions.append(f"{case} {stage}: {_fmt(before)} → {_fmt(seconds)} ({seconds / before:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--types", nargs="+", default=SUPPORTED_TYPES, choices=SUPPORTED_TYPES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", type=str, default=None, help="write results as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="fail if a stage is slower than baseline × tolerance")
+    args = parser.parse_args()
+
+    sources = [fixture_source(dtype) for dtype in args.types]
+    print(f"fixtures: {sources.count('recorded')} recorded, {sources.count('synthesized')} synthesized\n")
+    results = {}
+    print(f"{'type':<13} {'elements':>8}  " + "  ".join(f"{s:>9}" for s in STAGES))
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "bench.excalidraw")
+        for n in args.sizes:
+            for dtype in args.types:
+                timings = bench_case(dtype, n, args.repeat, out_path)
+                results[f"{dtype}/{n}"] = timings
+                print(f"{dtype:<13} {n:>8}  " + "  ".join(f"{_fmt(timings[s]):>9}" for s in STAGES))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✔ Results → {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌  {len(regressions)} regression(s) beyond {args.tolerance:.2f}x:")
+            for line in regressions:
+                print(f"    {line}")
+            sys.exit(1)
+        print(f"\n✔ No regressions beyond {args.tolerance:.2f}x of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
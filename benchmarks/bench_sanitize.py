@@ -0,0 +1,85 @@
+"""
+bench_sanitize.py
+-----------------
+Compares fix_elements(sanitize_elements(...)) with the single-pass
+normalize_elements on synthetic scenes, and checks both produce the
+same elements (ignoring the random seed/versionNonce and timestamp fields).
+
+Usage:
+    python benchmarks/bench_sanitize.py
+    python benchmarks/bench_sanitize.py --sizes 1000 50000 --repeat 5
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sanitize_elements import sanitize_elements, fix_elements, normalize_elements
+
+VOLATILE = ("seed", "versionNonce", "updated")
+
+
+def make_scene(n: int, seed: int = 0) -> list:
+    """Gemini-shaped raw elements: sparse fields, some negative arrows, labels."""
+    rng = random.Random(seed)
+    kinds = ["rectangle", "ellipse", "diamond", "text", "arrow", "arrow", "line"]
+    scene = []
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        el = {"id": f"el{i}", "type": kind,
+              "x": rng.randint(0, 4000), "y": rng.randint(0, 4000),
+              "width": rng.randint(20, 300), "height": rng.randint(20, 120)}
+        if kind == "rectangle" and i % 3 == 0:
+            el["label"] = {"text": f"Box {i}"}
+        elif kind == "text":
+            el["text"] = f"Label {i}"
+        elif kind in ("arrow", "line"):
+            el["width"] = rng.choice([-1, 1]) * rng.randint(0, 300)
+            el["height"] = rng.choice([0, 0, rng.randint(-200, 400)])
+            if i % 2:
+                el["points"] = [[0, 0], [el["width"], el["height"]]]
+        scene.append(el)
+    return scene
+
+
+def strip_volatile(elements: list) -> list:
+    return [{k: v for k, v in el.items() if k not in VOLATILE} for el in elements]
+
+
+def best_of(fn, scene: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        data = copy.deepcopy(scene)
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    two_pass = lambda els: fix_elements(sanitize_elements(els))
+
+    print(f"{'elements':>10}  {'two-pass':>10}  {'fused':>10}  {'speedup':>8}")
+    for n in args.sizes:
+        scene = make_scene(n)
+        expected = strip_volatile(two_pass(copy.deepcopy(scene)))
+        actual = strip_volatile(normalize_elements(copy.deepcopy(scene)))
+        if expected != actual:
+            sys.exit(f"❌  Outputs differ for n={n}")
+
+        t_old = best_of(two_pass, scene, args.repeat)
+        t_new = best_of(normalize_elements, scene, args.repeat)
+        print(f"{n:>10}  {t_old * 1000:>8.1f}ms  {t_new * 1000:>8.1f}ms  {t_old / t_new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
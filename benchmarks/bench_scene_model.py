@@ -0,0 +1,89 @@
+"""
+bench_scene_model.py
+--------------------
+Memory of a normalized scene held as plain dicts vs scene_model.Scene.
+
+Scenes mix every diagram type's fixture (see fixtures.py) and are
+normalized first, so each element carries the ~25 keys a merged scene
+holds. The JSON text is then loaded both ways while tracemalloc measures
+what stays allocated:
+
+    dicts      json.loads → list of dicts
+    scene      Scene.loads → compact Elements
+    saved      1 - scene / dicts
+    json       time for json.loads → dicts
+    load       time for Scene.loads (json.loads included)
+    dump       time for Scene.dumps
+    exact      Scene.dumps() == json.dumps(dicts): the JSON round-trips unchanged
+
+Usage:
+    python benchmarks/bench_scene_model.py
+    python benchmarks/bench_scene_model.py --sizes 1000 50000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excalidraw_rules import SUPPORTED_TYPES
+from fixtures import response_text
+from sanitize_elements import normalize_elements
+from scene_model import Scene
+
+
+def scene_text(n: int) -> str:
+    """JSON of ~n normalized elements, an even mix of all diagram types."""
+    per_type = max(n // len(SUPPORTED_TYPES), 1)
+    elements = []
+    for dtype in SUPPORTED_TYPES:
+        elements.extend(normalize_elements(json.loads(response_text(dtype, per_type))))
+    return json.dumps(elements, ensure_ascii=False)
+
+
+def retained(load, text: str):
+    """(result, bytes still allocated after load(text))."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = load(text)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="elements per scene")
+    args = parser.parse_args()
+
+    print(f"{'elements':>9} {'dicts':>9} {'scene':>9} {'saved':>6} {'json':>9} {'load':>9} {'dump':>9} "
+          f"{'exact':>6}")
+    for n in args.sizes:
+        text = scene_text(n)
+        dicts, dict_bytes = retained(json.loads, text)
+        scene, scene_bytes = retained(Scene.loads, text)
+        _, t_json = timed(json.loads, text)
+        _, t_load = timed(Scene.loads, text)
+        dumped, t_dump = timed(lambda: scene.dumps(ensure_ascii=False))
+        exact = dumped == json.dumps(dicts, ensure_ascii=False)
+        print(f"{len(scene):>9} {dict_bytes / 2**20:>7.1f}MB {scene_bytes / 2**20:>7.1f}MB "
+              f"{1 - scene_bytes / dict_bytes:>5.0%} {t_json * 1000:>7.1f}ms {t_load * 1000:>7.1f}ms "
+              f"{t_dump * 1000:>7.1f}ms {'yes' if exact else 'NO':>6}")
+        del dicts, scene
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench_startup.py
+----------------
+Measures CLI startup cost: `python -X importtime` for each entry module
+(cumulative import time plus the heaviest imports it pulls in) and the
+wall time of `<script> --help`.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --top 5 --max-ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["gemini_to_excalidraw_no_mcp", "gemini_to_excalidraw"]
+
+
+def import_times(module: str) -> list:
+    """(self_us, cumulative_us, name) for every import done by `import module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"❌  import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def help_wall_time(module: str, repeat: int) -> float:
+    """Median wall time in seconds of `python <module>.py --help`."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, f"{module}.py", "--help"],
+                       cwd=ROOT, capture_output=True, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="--help runs per script (median is reported)")
+    parser.add_argument("--top", type=int, default=8,
+                        help="heaviest top-level imports to list per module")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="exit non-zero if any module's import time exceeds this")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in MODULES:
+        rows = import_times(module)
+        total_ms = next(cum for _, cum, name in reversed(rows) if name == module) / 1000
+        wall_ms = help_wall_time(module, args.repeat) * 1000
+        print(f"\n{module}: import {total_ms:.1f}ms, --help {wall_ms:.1f}ms (median of {args.repeat})")
+
+        # Top-level packages only (nested imports are indented by importtime)
+        top_level = [r for r in rows if not r[2].startswith(" ") and r[2] != module]
+        for self_us, cum_us, name in sorted(top_level, key=lambda r: r[1], reverse=True)[:args.top]:
+            print(f"    {cum_us / 1000:>8.1f}ms  {name}")
+
+        if args.max_ms is not None and total_ms > args.max_ms:
+            over_budget.append(f"{module} ({total_ms:.1f}ms)")
+
+    if over_budget:
+        sys.exit(f"❌  Over the {args.max_ms:.0f}ms import budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+bench_text.py
+-------------
+Benchmark of text_layout on shape labels like the ones Gemini writes:
+short phrases drawn from a small vocabulary, so the same words recur
+throughout a diagram.
+
+    bind       bound_label for every shape (wrap, measure, position, grow),
+               with the LRU width cache, then with the cache bypassed
+    hits       cache hit rate during the cached run
+    tokens     output tokens per label: a separate text element as the
+               rules used to ask for, vs a "label" object on the shape
+
+Usage:
+    python benchmarks/bench_text.py
+    python benchmarks/bench_text.py --sizes 1000 50000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_layout
+from text_layout import CONTAINER_TYPES, bound_label
+from gemini_scheduler import estimate_tokens
+
+_WORDS = ["order", "payment", "user", "service", "validate", "send", "invoice", "database",
+          "queue", "gateway", "retry", "cache", "report", "customer", "shipping", "auth"]
+
+
+def shapes(n: int, seed: int = 3) -> list:
+    """n labelled shapes of Gemini-like sizes."""
+    rng = random.Random(seed ^ n)
+    out = []
+    for i in range(n):
+        label = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6))).capitalize()
+        out.append({"id": f"s{i}", "type": rng.choice(CONTAINER_TYPES), "x": i % 100 * 220, "y": i // 100 * 160,
+                    "width": rng.randint(120, 200), "height": rng.randint(50, 90), "label": label})
+    return out
+
+
+def separate_text(shape: dict) -> dict:
+    """The centered text element the old rules asked Gemini to write for a label."""
+    text = shape["label"]
+    return {"id": f"{shape['id']}-text", "type": "text", "x": shape["x"] + 10, "y": shape["y"] + 20,
+            "width": round(len(text) * 16 * 0.6), "height": 20, "text": text, "originalText": text,
+            "fontSize": 16, "fontFamily": 1, "textAlign": "center", "verticalAlign": "middle",
+            "strokeColor": "#1e1e1e"}
+
+
+def bind_all(scene: list) -> float:
+    start = time.perf_counter()
+    for shape in scene:
+        bound_label(shape)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000],
+                        help="number of labelled shapes")
+    args = parser.parse_args()
+
+    cached = text_layout._em_width
+    print(f"{'shapes':>7} {'cached':>9} {'uncached':>9} {'hits':>6} {'text el':>8} {'label':>6}")
+    for n in args.sizes:
+        scene = shapes(n)
+        old = sum(estimate_tokens(json.dumps(separate_text(s))) for s in scene) / n
+        new = sum(estimate_tokens(json.dumps({"label": {"text": s["label"]}})) for s in scene) / n
+
+        cached.cache_clear()
+        t_cached = bind_all(copy.deepcopy(scene))
+        info = cached.cache_info()
+        text_layout._em_width = cached.__wrapped__
+        try:
+            t_uncached = bind_all(copy.deepcopy(scene))
+        finally:
+            text_layout._em_width = cached
+        print(f"{n:>7} {t_cached * 1000:7.1f}ms {t_uncached * 1000:7.1f}ms "
+              f"{info.hits / max(info.hits + info.misses, 1):>5.0%} {old:>7.0f}t {new:>5.0f}t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+fixtures.py
+-----------
+Gemini response fixtures for the offline benchmarks, one per diagram type.
+
+If benchmarks/fixtures/<type>.json exists (a real response recorded with
+--record), it is used as a template. The template is tiled, with fresh ids
+and shifted x, up to the requested size. Otherwise a Gemini-shaped
+response is synthesized deterministically from a per-type mix of element
+kinds. Synthesized responses include Gemini's usual quirks: sparse fields,
+inline labels, lifelines drawn as arrows, negative widths, and missing or
+stale points.
+
+No recorded responses are committed yet, so every fixture is synthesized
+until someone records templates with --record (fixture_source tells which
+is in use; bench_pipeline prints it).
+
+Nothing here touches the network unless --record is passed.
+
+Usage:
+    from fixtures import TYPE_PROMPTS, response_text
+    raw = response_text("flowchart", 10000)     # JSON text as Gemini returns it
+
+    python benchmarks/fixtures.py --record flowchart sequence   # needs GEMINI_API_KEY
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+sys.path.insert(0, ROOT)
+
+from excalidraw_rules import SUPPORTED_TYPES
+
+SIZES = (10, 100, 1000, 10000, 50000)
+
+# One representative prompt per type (same as excalidraw_rules' self-test)
+TYPE_PROMPTS = {
+    "sequence":     "Draw a sequence diagram for user login flow",
+    "flowchart":    "Create a flowchart for order processing with decisions",
+    "architecture": "Design a 3-tier web architecture with load balancer",
+    "erd":          "Show an ER diagram for a blog database",
+    "class":        "Draw a UML class diagram for a payment system",
+    "state":        "Create a state machine for a traffic light",
+    "mindmap":      "Mind map for machine learning concepts",
+    "swimlane":     "Swimlane diagram for customer support ticket flow",
+    "network":      "Network topology for a small office",
+    "timeline":     "Product roadmap timeline for Q1-Q4",
+    "gitflow":      "Git branching strategy with feature branches",
+    "c4":           "C4 context diagram for an e-commerce system",
+}
+
+# Element kinds each type is mostly made of, cycled in order
+_MIX = {
+    "sequence":     ["rectangle", "text", "lifeline", "arrow", "text", "arrow", "text"],
+    "flowchart":    ["ellipse", "rectangle", "text", "arrow", "diamond", "text", "arrow", "labeled"],
+    "architecture": ["rectangle", "text", "rectangle", "text", "arrow", "text", "labeled"],
+    "erd":          ["rectangle", "text", "text", "text", "line", "text"],
+    "class":        ["rectangle", "text", "line", "text", "text", "arrow"],
+    "state":        ["ellipse", "text", "arrow", "text", "ellipse", "arrow"],
+    "mindmap":      ["ellipse", "text", "line", "rectangle", "text", "line"],
+    "swimlane":     ["rectangle", "text", "rectangle", "text", "arrow", "diamond", "text"],
+    "network":      ["rectangle", "text", "ellipse", "text", "line", "line"],
+    "timeline":     ["line", "ellipse", "text", "rectangle", "text"],
+    "gitflow":      ["lifeline", "ellipse", "text", "line", "ellipse", "arrow"],
+    "c4":           ["rectangle", "text", "text", "arrow", "text", "labeled"],
+}
+
+_COLORS = ["#1e1e1e", "#1971c2", "#2f9e44", "#e03131", "#f08c00", "#6741d9"]
+_FILLS = ["transparent", "#a5d8ff", "#b2f2bb", "#ffc9c9", "#ffec99"]
+
+
+def _element(kind: str, i: int, rng: random.Random) -> dict:
+    x, y = rng.randint(0, 4000), rng.randint(0, 3000)
+    el = {"id": f"el{i}", "type": kind, "x": x, "y": y,
+          "width": rng.randint(80, 260), "height": rng.randint(40, 120)}
+    if kind in ("rectangle", "ellipse", "diamond", "labeled"):
+        el["type"] = "rectangle" if kind == "labeled" else kind
+        el["strokeColor"] = rng.choice(_COLORS)
+        el["backgroundColor"] = rng.choice(_FILLS)
+        if kind == "labeled":
+            el["label"] = {"text": f"Component {i}"}
+    elif kind == "text":
+        words = rng.randint(1, 5)
+        el["text"] = " ".join(f"word{rng.randint(0, 99)}" for _ in range(words))
+        el["fontSize"] = rng.choice([14, 16, 16, 20])
+        el["fontFamily"] = 1
+        el["textAlign"] = rng.choice(["left", "center"])
+        el["height"] = 25
+    elif kind == "lifeline":
+        h = rng.randint(300, 700)
+        el.update(type="arrow", width=0, height=h, points=[[0, 0], [0, h]])
+    elif kind in ("arrow", "line"):
+        w = rng.choice([-1, 1]) * rng.randint(40, 300)
+        h = rng.choice([0, 0, rng.randint(-200, 200)])
+        el.update(width=w, height=h)
+        if rng.random() < 0.7:
+            el["points"] = [[0, 0], [w, h]] if rng.random() < 0.8 else [[0, 0], [100, 0]]
+        if kind == "arrow":
+            el["endArrowhead"] = "arrow"
+    return el
+
+
+def synthesize(diagram_type: str, n: int) -> list:
+    """n Gemini-shaped raw elements for diagram_type (same output every call)."""
+    rng = random.Random(zlib.crc32(diagram_type.encode()) ^ n)
+    mix = _MIX[diagram_type]
+    return [_element(mix[i % len(mix)], i, rng) for i in range(n)]
+
+
+def _tile(template: list, n: int) -> list:
+    """Repeat a recorded response side by side until it has n elements."""
+    xs = [el.get("x", 0) + max(el.get("width", 0), 0) for el in template] or [0]
+    dx = max(xs) + 200
+    out = []
+    for k in range(-(-n // len(template))):
+        for el in template:
+            if len(out) == n:
+                return out
+            clone = json.loads(json.dumps(el))
+            clone["id"] = f"{el.get('id', 'el')}~{k}"
+            clone["x"] = el.get("x", 0) + k * dx
+            out.append(clone)
+    return out
+
+
+def _template_path(diagram_type: str) -> str:
+    return os.path.join(FIXTURE_DIR, f"{diagram_type}.json")
+
+
+def fixture_source(diagram_type: str) -> str:
+    """"recorded" if a recorded template exists for diagram_type, else "synthesized"."""
+    return "recorded" if os.path.exists(_template_path(diagram_type)) else "synthesized"
+
+
+def elements(diagram_type: str, n: int) -> list:
+    path = _template_path(diagram_type)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            template = json.load(f)
+        if template:
+            return _tile(template, n)
+    return synthesize(diagram_type, n)
+
+
+def response_text(diagram_type: str, n: int) -> str:
+    """The fixture as Gemini's response text (pretty-printed JSON array)."""
+    return json.dumps(elements(diagram_type, n), indent=2, ensure_ascii=False)
+
+
+def record(diagram_types: list) -> None:
+    """Call Gemini once per type and save the raw elements as that type's template."""
+    import gemini_to_excalidraw_no_mcp as pipeline
+    from excalidraw_rules import get_system_prompt
+
+    pipeline.load_env()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for dtype in diagram_types:
+        raw = pipeline.generate_elements(TYPE_PROMPTS[dtype], get_system_prompt(dtype), verbose=False)
+        path = _template_path(dtype)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(raw, f, indent=2, ensure_ascii=False)
+        print(f"  ✔ {dtype}: {len(raw)} elements → {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--record", nargs="+", choices=SUPPORTED_TYPES, metavar="TYPE",
+                        help="record real Gemini responses as templates (needs GEMINI_API_KEY)")
+    args = parser.parse_args()
+    if args.record:
+        record(args.record)
+        return
+    for dtype in SUPPORTED_TYPES:
+        print(f"  {dtype:<13} {fixture_source(dtype)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+element_schema.py
+-----------------
+Gemini response schema for Excalidraw element arrays.
+
+With `response_mime_type="application/json"` and this schema, Gemini's
+structured output mode constrains decoding to a JSON array of element
+objects, so responses parse with a plain json.loads — no markdown fences
+to strip and no reruns for malformed JSON.
+
+The element schema is derived from sanitize_elements.TYPE_DEFAULTS: every
+styling field that has a per-type default becomes an optional, typed
+property (its Schema type inferred from the default value). Of the
+BASE_DEFAULTS, the ones the rules ask the model to set — angle, opacity,
+groupIds — are properties too, and so are the arrow bindings
+({elementId, focus, gap}), which arrow_bindings.resolve_bindings snaps
+onto their shapes. Fields normalize_elements only defaults or derives
+(seed, version, updated, boundElements, originalText, ...) are left out so
+the model doesn't spend output tokens on them.
+
+topology_schema() is the much smaller schema for --layout local, where
+Gemini returns only groups / nodes / edges and auto_layout places them.
+
+Usage:
+    from element_schema import response_schema
+
+    config = types.GenerateContentConfig(
+        system_instruction=system_prompt,
+        response_mime_type="application/json",
+        response_schema=response_schema(),
+    )
+"""
+from sanitize_elements import TYPE_DEFAULTS
+
+# Shapes without their own TYPE_DEFAULTS entry (they take rectangle's)
+ELEMENT_TYPES = ("rectangle", "ellipse", "diamond") + tuple(t for t in TYPE_DEFAULTS if t != "rectangle")
+
+# Defaulted or derived by normalize_elements; not worth generating.
+_SKIP = {"lastCommittedPoint", "originalText", "autoResize", "elbowed"}
+
+_BINDING = {"type": "OBJECT", "nullable": True,
+            "properties": {"elementId": {"type": "STRING"},
+                           "focus": {"type": "NUMBER"},
+                           "gap": {"type": "NUMBER"}},
+            "required": ["elementId"],
+            "propertyOrdering": ["elementId", "focus", "gap"]}
+
+# A shape's caption, in the object form the rules and the MCP prompt use
+# (text_layout.bound_label also accepts a bare string)
+_LABEL = {"type": "OBJECT",
+          "properties": {"text": {"type": "STRING"},
+                         "fontSize": {"type": "NUMBER"},
+                         "fontFamily": {"type": "INTEGER"},
+                         "strokeColor": {"type": "STRING"},
+                         "textAlign": {"type": "STRING", "enum": ["left", "center", "right"]},
+                         "verticalAlign": {"type": "STRING", "enum": ["top", "middle", "bottom"]}},
+          "required": ["text"],
+          "propertyOrdering": ["text", "fontSize", "fontFamily", "strokeColor", "textAlign", "verticalAlign"]}
+
+# Defaults of None (or too loose to infer from) need an explicit schema.
+_EXPLICIT = {
+    "roundness": {"type": "OBJECT", "nullable": True,
+                  "properties": {"type": {"type": "INTEGER"}}},
+    "points": {"type": "ARRAY",
+               "items": {"type": "ARRAY", "items": {"type": "NUMBER"}}},
+    "startArrowhead": {"type": "STRING", "nullable": True,
+                       "enum": ["arrow", "bar", "dot", "triangle"]},
+    "endArrowhead": {"type": "STRING", "nullable": True,
+                     "enum": ["arrow", "bar", "dot", "triangle"]},
+    "containerId": {"type": "STRING", "nullable": True},
+    "startBinding": _BINDING,
+    "endBinding": _BINDING,
+    "fillStyle": {"type": "STRING", "enum": ["solid", "hachure", "cross-hatch"]},
+    "strokeStyle": {"type": "STRING", "enum": ["solid", "dashed", "dotted"]},
+    "textAlign": {"type": "STRING", "enum": ["left", "center", "right"]},
+    "verticalAlign": {"type": "STRING", "enum": ["top", "middle", "bottom"]},
+}
+
+# Geometry every element needs, in the order the model should emit it
+REQUIRED_FIELDS = ("id", "type", "x", "y", "width", "height")
+
+
+def _infer(value) -> dict:
+    # bool before int: bool is a subclass of int
+    if isinstance(value, bool):
+        return {"type": "BOOLEAN"}
+    if isinstance(value, int):
+        return {"type": "INTEGER"}
+    if isinstance(value, float):
+        return {"type": "NUMBER"}
+    if isinstance(value, str):
+        return {"type": "STRING"}
+    raise TypeError(f"no schema for default {value!r}; add it to _EXPLICIT")
+
+
+def element_schema() -> dict:
+    """Schema (Gemini OpenAPI subset, as a dict) for one raw element."""
+    properties = {
+        "id": {"type": "STRING"},
+        "type": {"type": "STRING", "enum": list(ELEMENT_TYPES)},
+        "x": {"type": "NUMBER"},
+        "y": {"type": "NUMBER"},
+        "width": {"type": "NUMBER"},
+        "height": {"type": "NUMBER"},
+        "text": {"type": "STRING"},
+        "label": _LABEL,                 # shape caption → bound text (text_layout)
+        # BASE_DEFAULTS the rules use: rotated shapes, translucent zones, groups
+        "angle": {"type": "NUMBER"},
+        "opacity": {"type": "INTEGER", "minimum": 0, "maximum": 100},
+        "groupIds": {"type": "ARRAY", "items": {"type": "STRING"}},
+    }
+    for defaults in TYPE_DEFAULTS.values():
+        for key, value in defaults.items():
+            if key in properties or key in _SKIP:
+                continue
+            properties[key] = dict(_EXPLICIT.get(key) or _infer(value))
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(REQUIRED_FIELDS),
+        "propertyOrdering": list(properties),
+    }
+
+
+def response_schema() -> dict:
+    """Schema for a full response: an array of elements."""
+    return {"type": "ARRAY", "items": element_schema()}
+
+
+def topology_schema() -> dict:
+    """Schema for --layout local responses: groups / nodes / edges, no geometry (see auto_layout)."""
+    def obj(properties: dict, required: list) -> dict:
+        return {"type": "OBJECT", "properties": properties, "required": required,
+                "propertyOrdering": list(properties)}
+
+    string = {"type": "STRING"}
+    node = obj({"id": string, "label": string, "kind": string, "group": string, "detail": string},
+               ["id", "label"])
+    edge = obj({"from": string, "to": string, "label": string,
+                "style": {"type": "STRING", "enum": ["solid", "dashed", "dotted"]}},
+               ["from", "to"])
+    group = obj({"id": string, "label": string}, ["id", "label"])
+    return obj({"groups": {"type": "ARRAY", "items": group},
+                "nodes": {"type": "ARRAY", "items": node},
+                "edges": {"type": "ARRAY", "items": edge}},
+               ["nodes", "edges"])
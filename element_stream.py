@@ -0,0 +1,124 @@
+"""
+element_stream.py
+-----------------
+Incremental parser for a streamed JSON array of Excalidraw elements.
+
+Gemini's streaming API delivers the array in arbitrary text chunks. The
+parser scans each chunk once, tracks string/escape state and bracket depth,
+and hands back every element object as soon as its closing brace arrives —
+so sanitizing (or uploading) can start long before the model finishes.
+Leading markdown fences or chatter before the opening "[" are ignored.
+
+Usage:
+    parser = ElementStreamParser()
+    for chunk in stream:
+        for element in parser.feed(chunk.text or ""):
+            ...
+"""
+import json
+import re
+
+# Characters that matter outside / inside a JSON string
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_IN_STRING  = re.compile(r'["\\]')
+
+
+class ElementStreamParser:
+    """Yields each top-level object of a JSON array as soon as it is complete."""
+
+    def __init__(self):
+        self._buf = ""        # unconsumed text (starts at the current element, if any)
+        self._pos = 0         # scan position within _buf
+        self._depth = 0       # 0 = before the array, 1 = inside it, 2+ = inside an element
+        self._in_string = False
+        self._obj_start = None
+        self.done = False     # closing "]" of the array was seen
+        self.count = 0        # elements emitted so far
+        self.skipped = 0      # complete objects that were not valid JSON
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk of text; return the elements completed by it."""
+        if self.done or not chunk:
+            return []
+        self._buf += chunk
+        elements = []
+        buf = self._buf
+        pos = self._pos
+
+        while True:
+            if self._in_string:
+                m = _IN_STRING.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                if m.group() == "\\":
+                    if m.end() >= len(buf):   # escape split across chunks
+                        pos = m.start()
+                        break
+                    pos = m.end() + 1
+                    continue
+                self._in_string = False
+                pos = m.end()
+                continue
+
+            m = _STRUCTURAL.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            ch = m.group()
+            pos = m.end()
+
+            if self._depth == 0:
+                # Anything before the array ("```json", prose) is skipped
+                if ch == "[":
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                if self._depth == 1:
+                    self._obj_start = m.start()
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._obj_start is not None:
+                    element = self._decode(buf[self._obj_start:pos])
+                    if element is not None:
+                        elements.append(element)
+                    self._obj_start = None
+                elif self._depth == 0:
+                    self.done = True
+                    break
+
+        # Drop everything before the element currently being read
+        cut = self._obj_start if self._obj_start is not None else pos
+        self._buf = buf[cut:]
+        self._pos = pos - cut
+        if self._obj_start is not None:
+            self._obj_start = 0
+        return elements
+
+    def _decode(self, text: str):
+        try:
+            element = json.loads(text)
+        except ValueError:
+            self.skipped += 1
+            return None
+        if not isinstance(element, dict):
+            self.skipped += 1
+            return None
+        self.count += 1
+        return element
+
+    @property
+    def truncated(self) -> bool:
+        """True if the stream ended inside the array (e.g. token limit)."""
+        return self._depth > 0 and not self.done
+
+
+def iter_elements(chunks):
+    """Generator form: text chunks in → element dicts out."""
+    parser = ElementStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
@@ -0,0 +1,328 @@
+"""
+excalidraw_mcp.py
+-----------------
+Long-lived client for the @scofieldfree/excalidraw-mcp server.
+
+Spawning `npx -y @scofieldfree/excalidraw-mcp` costs a Node cold start,
+package resolution, a browser launch and `list_tools` before any work is
+done. ExcalidrawMCPClient starts the server once and keeps one warm
+ClientSession open, so many diagrams (each in its own sessionId) can be
+pushed through it. If the server process dies, the next call reconnects.
+
+Instead of fixed sleeps, wait_for_scene polls the session with cheap
+get_scene calls (exponential backoff, bounded by a timeout) and returns as
+soon as the canvas answers.
+
+add_elements_chunked uploads large scenes in slices with a few calls in
+flight at once, so no single JSON-RPC message holds the whole scene, the
+canvas draws incrementally, and a failed slice is retried on its own.
+export_formats exports one session as json / png / svg concurrently.
+
+Usage:
+    async with ExcalidrawMCPClient() as client:
+        await client.call_tool("start_session", {"sessionId": "diagram-1"})
+        await wait_for_scene(client, "diagram-1")
+        await add_elements_chunked(client, "diagram-1", elements, chunk_size=200)
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+import timing
+
+DEFAULT_SERVER_PARAMS = StdioServerParameters(
+    command="npx",
+    args=["-y", "@scofieldfree/excalidraw-mcp"],
+)
+
+DEFAULT_CHUNK_SIZE = 200
+
+# Errors that mean the server process / stdio pipe is gone (not a tool error)
+_DISCONNECT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    EOFError,
+)
+
+
+class ExcalidrawMCPClient:
+    """
+    One warm excalidraw-mcp server process + one ClientSession, shared by
+    every diagram. Safe to use from many asyncio tasks at once; tool calls
+    are multiplexed over the same session.
+    """
+
+    def __init__(self, server_params: StdioServerParameters = None,
+                 max_reconnects: int = 2, read_timeout: float = 120.0):
+        self.server_params = server_params or DEFAULT_SERVER_PARAMS
+        self.max_reconnects = max_reconnects
+        self.read_timeout = read_timeout
+        self.tool_names = []
+        # Bumped on every (re)connect — callers compare it to detect that
+        # server-side state (browser sessions, added elements) was lost.
+        self.generation = 0
+        self._session = None
+        self._runner = None
+        self._closing = None
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._session is not None and self._runner is not None and not self._runner.done()
+
+    async def connect(self) -> ClientSession:
+        async with self._lock:
+            if self.connected:
+                return self._session
+            await self._shutdown_runner()
+
+            print("      Starting excalidraw-mcp server...")
+            ready = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            # The stdio transport and session are owned by one background task
+            # so they are entered and exited in the same task (anyio requires it).
+            with timing.span("mcp.connect"):
+                self._runner = asyncio.create_task(self._run_connection(ready))
+                self._session = await ready
+            self.generation += 1
+            print(f"      Available tools: {self.tool_names}\n")
+            return self._session
+
+    async def _run_connection(self, ready: asyncio.Future) -> None:
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(
+                    read, write,
+                    read_timeout_seconds=timedelta(seconds=self.read_timeout),
+                ) as session:
+                    await session.initialize()
+                    tools_response = await session.list_tools()
+                    self.tool_names = [t.name for t in tools_response.tools]
+                    ready.set_result(session)
+                    await self._closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                if isinstance(e, asyncio.CancelledError):
+                    ready.cancel()
+                else:
+                    ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                print(f"      ⚠ excalidraw-mcp connection lost: {type(e).__name__}: {e}")
+        finally:
+            if self._runner is asyncio.current_task():
+                self._session = None
+
+    async def _shutdown_runner(self) -> None:
+        runner, self._runner = self._runner, None
+        self._session = None
+        if runner is None:
+            return
+        if self._closing is not None:
+            self._closing.set()
+        try:
+            await asyncio.wait_for(runner, timeout=10)
+        except (asyncio.TimeoutError, Exception):
+            runner.cancel()
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._shutdown_runner()
+
+    async def call_tool(self, name: str, arguments: dict):
+        """call_tool on the shared session, reconnecting if the server died."""
+        for attempt in range(self.max_reconnects + 1):
+            session = await self.connect()
+            try:
+                with timing.span(f"mcp.{name}"):
+                    return await session.call_tool(name, arguments)
+            except McpError as e:
+                if e.error.code != CONNECTION_CLOSED or attempt == self.max_reconnects:
+                    raise
+            except _DISCONNECT_ERRORS:
+                if attempt == self.max_reconnects:
+                    raise
+            print(f"      ↻ Reconnecting to excalidraw-mcp ({name}, attempt {attempt + 2})...")
+            async with self._lock:
+                if self._session is session:
+                    await self._shutdown_runner()
+
+
+# ─────────────────────────────────────────────
+# Readiness polling
+# ─────────────────────────────────────────────
+def scene_element_ids(result) -> set:
+    """
+    Best-effort extraction of element ids from a get_scene result.
+    Returns None when the scene text isn't JSON we understand.
+    """
+    for block in result.content or []:
+        text = getattr(block, "text", None)
+        if not text:
+            continue
+        try:
+            scene = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(scene, dict):
+            scene = scene.get("elements")
+        if isinstance(scene, list):
+            return {el.get("id") for el in scene if isinstance(el, dict)}
+    return None
+
+
+async def wait_for_scene(client: ExcalidrawMCPClient, session_id: str, expected_ids=None,
+                         timeout: float = 10.0, initial_delay: float = 0.05, max_delay: float = 1.0):
+    """
+    Poll get_scene with exponential backoff until the session answers without
+    an error (and, if expected_ids is given, the scene contains those ids).
+    Returns the last get_scene result; gives up quietly after `timeout` seconds.
+    """
+    with timing.span("mcp.wait_for_scene", session=session_id):
+        return await _wait_for_scene(client, session_id, expected_ids, timeout, initial_delay, max_delay)
+
+
+async def _wait_for_scene(client: ExcalidrawMCPClient, session_id: str, expected_ids,
+                          timeout: float, initial_delay: float, max_delay: float):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    expected = set(expected_ids or ())
+    polls = 0
+    while True:
+        polls += 1
+        result = await client.call_tool("get_scene", {"sessionId": session_id})
+        if not getattr(result, "isError", False):
+            ids = scene_element_ids(result) if expected else None
+            # Unparseable scene text: an error-free answer is the best signal we have
+            if ids is None or expected <= ids:
+                return result
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            print(f"      ⚠ Session {session_id!r} not ready after {timeout:.1f}s ({polls} polls), continuing")
+            return result
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+# ─────────────────────────────────────────────
+# Chunked uploads
+# ─────────────────────────────────────────────
+class ChunkUploadError(RuntimeError):
+    """A slice of add_elements was still rejected after all retries."""
+
+
+async def add_elements_chunked(client: ExcalidrawMCPClient, session_id: str, elements: list,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE, max_in_flight: int = 2,
+                               max_retries: int = 2, verbose: bool = True) -> list:
+    """
+    add_elements in slices of chunk_size, with up to max_in_flight calls
+    pipelined over the shared session. Each slice counts as acknowledged
+    when its call returns without isError; rejected or failed slices are
+    retried alone (with backoff) up to max_retries times. chunk_size <= 0
+    sends everything in one call.
+
+    Returns one dict per slice: index, start, count, attempts, seconds and
+    the final add_elements result. Raises ChunkUploadError when a slice is
+    never acknowledged; errors from a server restart are re-raised as-is,
+    since the session (and every slice already added) is gone with it.
+    """
+    total = len(elements)
+    size = chunk_size if 0 < chunk_size < total else max(total, 1)
+    starts = range(0, total, size) if total else [0]
+    generation = client.generation
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def upload(index: int, start: int) -> dict:
+        async with semaphore:
+            # Sliced only once a slot is free, so at most max_in_flight
+            # chunk payloads are being serialized / sent at any time.
+            chunk = elements[start:start + size]
+            t0 = time.perf_counter()
+            for attempt in range(1, max_retries + 2):
+                error = None
+                try:
+                    result = await client.call_tool("add_elements", {"sessionId": session_id, "elements": chunk})
+                    if not getattr(result, "isError", False):
+                        break
+                    error = _result_text(result) or "isError"
+                except Exception as e:
+                    if client.generation != generation:
+                        raise
+                    error = f"{type(e).__name__}: {e}"
+                if attempt > max_retries:
+                    raise ChunkUploadError(
+                        f"add_elements chunk {index + 1}/{len(starts)} "
+                        f"(elements {start}–{start + len(chunk) - 1}) failed after {attempt} attempts: {error}"
+                    )
+                if verbose:
+                    print(f"      ↻ Chunk {index + 1}/{len(starts)} rejected ({error[:120]}), retrying...")
+                await asyncio.sleep(0.2 * 2 ** (attempt - 1))
+            seconds = time.perf_counter() - t0
+        if verbose and len(starts) > 1:
+            print(f"      ✔ Chunk {index + 1}/{len(starts)}: {len(chunk)} elements in {seconds:.2f}s"
+                  + (f" ({attempt} attempts)" if attempt > 1 else ""))
+        return {"index": index, "start": start, "count": len(chunk),
+                "attempts": attempt, "seconds": seconds, "result": result}
+
+    with timing.span("mcp.add_elements_chunked", elements=total, chunks=len(starts)):
+        tasks = [asyncio.create_task(upload(i, start)) for i, start in enumerate(starts)]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _result_text(result) -> str:
+    return " ".join(getattr(block, "text", "") for block in result.content or []).strip()
+
+
+# ─────────────────────────────────────────────
+# Exports
+# ─────────────────────────────────────────────
+EXPORT_FORMATS = ("json", "png", "svg")
+
+
+async def export_formats(client: ExcalidrawMCPClient, session_id: str, paths: dict) -> dict:
+    """
+    Issue one export_diagram call per {format: path} concurrently on the same
+    session. Returns {format: export_diagram result}; raises the first error
+    once every call has finished.
+    """
+    formats = list(paths)
+    with timing.span("mcp.export_formats", formats=",".join(formats)):
+        results = await asyncio.gather(
+            *(client.call_tool("export_diagram", {"sessionId": session_id, "path": paths[fmt], "format": fmt})
+              for fmt in formats),
+            return_exceptions=True,
+        )
+    for fmt, result in zip(formats, results):
+        if isinstance(result, BaseException):
+            raise result
+        if getattr(result, "isError", False):
+            raise RuntimeError(f"export_diagram ({fmt}) failed: {_result_text(result) or 'isError'}")
+    return dict(zip(formats, results))
+
+
+async def push_to_canvas(client: ExcalidrawMCPClient, elements: list, session_id: str,
+                         ready_timeout: float = 10.0, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """start_session → wait for the canvas → add_elements_chunked. Returns the per-chunk stats."""
+    await client.call_tool("start_session", {"sessionId": session_id})
+    await wait_for_scene(client, session_id, timeout=ready_timeout)
+    return await add_elements_chunked(client, session_id, elements, chunk_size=chunk_size, verbose=False)
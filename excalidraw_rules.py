@@ -8,7 +8,11 @@ Usage:
     
     diagram_type = detect_diagram_type(user_prompt)   # or pass explicitly
     system_prompt = get_system_prompt(diagram_type)
+    topology_prompt = get_topology_prompt(diagram_type)   # --layout local
 """
+import hashlib
+import re
+from types import MappingProxyType
 
 # ─────────────────────────────────────────────────────────────────────────────
 # UNIVERSAL RULES  (always prepended — covers valid JSON structure only)
@@ -24,34 +28,39 @@ OUTPUT:
 - Return ONLY a raw JSON array — no markdown fences, no explanation, no comments.
 - All element ids must be unique short strings (e.g. "el1", "ar2", "t3").
 
-REQUIRED FIELDS — every element must include ALL of these, no exceptions:
-  angle (always 0 unless rotated),
-  seed (unique random integer per element),
-  version (1),
-  versionNonce (unique random integer per element),
-  isDeleted (false),
-  groupIds ([]),
-  boundElements ([]),
-  updated (1700000000000),
-  link (null),
-  locked (false),
-  opacity (100)
+FIELDS:
+- Write only the fields in the schemas below; any you leave out get their
+  defaults. seed, version, versionNonce, isDeleted, boundElements, updated,
+  link, locked and originalText are always filled in for you — never write them.
+- "opacity" (0–100, default 100): set it wherever a rule below asks for a
+  translucent zone, tier, lane or container, so it doesn't hide its contents.
+- "angle" (radians, default 0): only for rotated elements.
+- "groupIds" (default []): elements sharing a group id move together.
 
 SHAPES:
-- NEVER use "label" inside shape elements.
-  Always create a separate "text" element positioned at the center of the shape.
+- Text inside a rectangle / ellipse / diamond goes in the shape's "label", never in
+  a separate "text" element: {"text": "Order service"}, optionally with "fontSize",
+  "fontFamily", "strokeColor", "textAlign", "verticalAlign". It is bound to the
+  shape, wrapped and centered for you, and the shape grows if it doesn't fit.
+  Use "\\n" in "text" for separate lines.
 - Valid types: "rectangle", "ellipse", "diamond", "line", "arrow", "text", "image".
 - "width" and "height" must always be positive numbers (never zero, never negative).
 
 ARROWS:
 - MUST include "points" array: [[0,0],[width,height]] matching actual span.
+- An arrow that connects two shapes sets "startBinding" / "endBinding" to
+  {"elementId": <shape id>, "focus": 0, "gap": 4}: its ends are then snapped
+  onto the shapes' outlines and stay attached when a shape moves.
 - For leftward arrows: flip x position — start at right actor x, use negative width,
   then apply negative-fix so width stays positive and points are correct.
 - Never use negative width or height — adjust x/y instead.
 
 TEXT:
-- "originalText" must always equal "text".
-- "width" should approximate text length × fontSize × 0.6.
+- Use "text" elements only for free-standing text: titles, arrow and axis labels,
+  annotations, attribute rows.
+- "width" / "height" can be rough: they are measured from text, fontSize and
+  fontFamily for you. x / y place the text's top and its left edge (its center for
+  textAlign "center", its right edge for "right").
 
 LINES:
 - For decorative/structural lines (not connections), use type "line".
@@ -66,9 +75,7 @@ RECTANGLE:
 {
   "id": "el1", "type": "rectangle",
   "x": 100, "y": 100, "width": 160, "height": 60,
-  "angle": 0, "seed": 123456, "version": 1, "versionNonce": 654321,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
+  "label": {"text": "Order service"},
   "strokeColor": "#333333", "backgroundColor": "#dbe9f9",
   "fillStyle": "solid", "strokeWidth": 2, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": {"type": 3}
@@ -78,9 +85,6 @@ ELLIPSE:
 {
   "id": "el2", "type": "ellipse",
   "x": 100, "y": 100, "width": 160, "height": 60,
-  "angle": 0, "seed": 123457, "version": 1, "versionNonce": 654322,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
   "strokeColor": "#333333", "backgroundColor": "#dbe9f9",
   "fillStyle": "solid", "strokeWidth": 2, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": {"type": 2}
@@ -90,28 +94,31 @@ DIAMOND (for decisions/conditions):
 {
   "id": "el3", "type": "diamond",
   "x": 100, "y": 100, "width": 140, "height": 80,
-  "angle": 0, "seed": 123458, "version": 1, "versionNonce": 654323,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
   "strokeColor": "#333333", "backgroundColor": "#fff3cd",
   "fillStyle": "solid", "strokeWidth": 2, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": null
 }
 
-ARROW:
+ZONE (translucent background container, listed before its contents):
+{
+  "id": "z1", "type": "rectangle",
+  "x": 60, "y": 60, "width": 520, "height": 240,
+  "strokeColor": "#cccccc", "backgroundColor": "#e8f4f8",
+  "fillStyle": "solid", "strokeWidth": 1, "strokeStyle": "solid",
+  "roughness": 1, "opacity": 30, "roundness": null
+}
+
+ARROW (from el1 to el2):
 {
   "id": "ar1", "type": "arrow",
-  "x": 100, "y": 200, "width": 160, "height": 0,
+  "x": 260, "y": 130, "width": 160, "height": 0,
   "points": [[0, 0], [160, 0]],
-  "angle": 0, "seed": 111111, "version": 1, "versionNonce": 222222,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
   "strokeColor": "#333333", "backgroundColor": "transparent",
   "fillStyle": "solid", "strokeWidth": 2, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": {"type": 2},
-  "lastCommittedPoint": null,
-  "startArrowhead": null, "endArrowhead": "arrow", "elbowed": false,
-  "startBinding": null, "endBinding": null
+  "startArrowhead": null, "endArrowhead": "arrow",
+  "startBinding": {"elementId": "el1", "focus": 0, "gap": 4},
+  "endBinding": {"elementId": "el2", "focus": 0, "gap": 4}
 }
 
 LINE:
@@ -119,29 +126,22 @@ LINE:
   "id": "ln1", "type": "line",
   "x": 100, "y": 100, "width": 0, "height": 300,
   "points": [[0, 0], [0, 300]],
-  "angle": 0, "seed": 333333, "version": 1, "versionNonce": 444444,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
   "strokeColor": "#333333", "backgroundColor": "transparent",
   "fillStyle": "solid", "strokeWidth": 1, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": null,
-  "lastCommittedPoint": null, "startArrowhead": null, "endArrowhead": null
+  "startArrowhead": null, "endArrowhead": null
 }
 
 TEXT:
 {
   "id": "t1", "type": "text",
   "x": 100, "y": 100, "width": 160, "height": 25,
-  "text": "My Label", "originalText": "My Label",
-  "angle": 0, "seed": 555555, "version": 1, "versionNonce": 666666,
-  "isDeleted": false, "groupIds": [], "boundElements": [],
-  "updated": 1700000000000, "link": null, "locked": false,
+  "text": "My Label",
   "strokeColor": "#1e1e1e", "backgroundColor": "transparent",
   "fillStyle": "solid", "strokeWidth": 1, "strokeStyle": "solid",
   "roughness": 1, "opacity": 100, "roundness": null,
   "fontSize": 16, "fontFamily": 1, "textAlign": "center",
-  "verticalAlign": "middle", "containerId": null,
-  "lineHeight": 1.25, "autoResize": true
+  "verticalAlign": "middle", "lineHeight": 1.25
 }
 
 """
@@ -163,7 +163,7 @@ ACTORS (top row):
 - Use "rectangle" with roundness type 3 for each actor.
 - Spread actors evenly: first actor x=80, spacing=200px between centers.
 - Actor box: width=140, height=50. backgroundColor="#dbe9f9".
-- Place a "text" element centered inside each actor box.
+- The actor name goes in the box's "label".
 
 LIFELINES:
 - For each actor, add a vertical "line" element.
@@ -207,6 +207,7 @@ SHAPES BY NODE TYPE:
 - Input/Output: "rectangle" with angle=0, use parallelogram style via skewed text positioning, backgroundColor="#e8d5f5"
 - Subprocess: "rectangle" with double border (create two nested rectangles), backgroundColor="#dbe9f9"
 - Database/Storage: "ellipse" squashed (width=160, height=50), backgroundColor="#fde8d8"
+- Each node's text goes in its "label".
 
 LAYOUT:
 - Flow direction: top-to-bottom by default.
@@ -254,7 +255,7 @@ TIERS / ZONES / GROUPS:
 COMPONENTS (inside tiers):
 - Use "rectangle" roundness type 3, width=150, height=60.
 - Space components at least 80px apart inside their tier.
-- Each component gets a centered "text" label.
+- Each component's name goes in its "label".
 - Database components: use "ellipse", width=140, height=60.
 - Queue/Message broker: use "rectangle" with strokeStyle="dashed".
 - Cache: use "rectangle" with backgroundColor="#ffe8cc".
@@ -273,7 +274,8 @@ LAYOUT:
 - Canvas: 1000px wide minimum for multi-tier diagrams.
 
 ICONS (text substitutes since no icon support):
-- Use emoji in text elements as icon hints: 🗄️ for DB, 🔄 for cache, ⚖️ for LB.
+- Start a component's label with an emoji as icon hint: 🗄️ for DB, 🔄 for cache,
+  ⚖️ for LB (e.g. "label": {"text": "🗄️ Orders DB"}).
 """
 
 # ─────────────────────────────────────
@@ -285,7 +287,7 @@ ER DIAGRAM RULES
 ═══════════════════════════════════
 ENTITIES:
 - Use "rectangle" with roundness null (sharp corners), width=200, height=auto.
-- Header: a filled rectangle at the top (height=40) with entity name.
+- Header: a filled rectangle at the top (height=40), the entity name as its "label".
   backgroundColor="#4a90d9", strokeColor="#333333".
 - Body: a taller rectangle below header for attributes.
   backgroundColor="#ffffff", strokeColor="#333333".
@@ -306,7 +308,7 @@ RELATIONSHIPS (lines between entities):
 
 RELATIONSHIP DIAMONDS (optional, for complex relationships):
 - Use "diamond" shape, width=100, height=60, backgroundColor="#fff3cd".
-- Place relationship name text inside.
+- The relationship name goes in the diamond's "label".
 
 LAYOUT:
 - Spread entities: minimum 300px between entity centers.
@@ -329,9 +331,9 @@ CLASS DIAGRAM (UML) RULES
 ═══════════════════════════════════
 CLASS BOX (3 compartments stacked vertically, same x):
 1. Name compartment: rectangle, height=40, backgroundColor="#4a90d9".
-   Place class name "text" centered, fontSize=16, strokeColor="#ffffff".
-   For abstract class: prefix name with «abstract» on a separate text line.
-   For interface: prefix with «interface».
+   Class name as its "label": {"text": "Payment", "fontSize": 16, "strokeColor": "#ffffff"}.
+   For abstract class: «abstract» on a line of its own above the name ("«abstract»\\nPayment").
+   For interface: «interface» the same way.
 2. Attributes compartment: rectangle, height = num_attributes × 26 + 10.
    backgroundColor="#ffffff". List each attribute as "text", fontSize=13, x+8, left-aligned.
    Format: "+ fieldName: Type" (+ public, - private, # protected).
@@ -374,7 +376,7 @@ STATE MACHINE RULES
 STATES:
 - Use "rectangle" with roundness {"type": 3} (rounded), width=160, height=60.
 - backgroundColor="#dbe9f9", strokeColor="#333333".
-- Place centered "text" label inside each state.
+- The state name goes in its "label".
 - Initial state: filled "ellipse", width=30, height=30, backgroundColor="#333333".
   No text label.
 - Final state: two concentric circles — outer "ellipse" width=36, height=36,
@@ -419,14 +421,14 @@ CENTRAL NODE:
 - Place at canvas center: x=500, y=400.
 - Use "ellipse" or "rectangle" with roundness type 3.
 - width=180, height=70, backgroundColor="#4a90d9", strokeColor="#2c5f8a".
-- "text" centered inside: fontSize=18, strokeColor="#ffffff".
+- Topic as its "label": {"text": ..., "fontSize": 18, "strokeColor": "#ffffff"}.
 
 MAIN BRANCHES (level 1 — direct children of center):
 - Distribute radially around center at equal angles.
   For N branches: angle_step = 360/N degrees.
   branch_x = center_x + cos(angle) × 250
   branch_y = center_y + sin(angle) × 200
-- Use "rectangle" roundness type 3, width=150, height=50.
+- Use "rectangle" roundness type 3, width=150, height=50, the topic as its "label".
 - Each branch gets a unique color from the palette below.
 - Connect center → branch with "line" (not arrow):
   strokeWidth=3, strokeColor matching branch color.
@@ -434,7 +436,7 @@ MAIN BRANCHES (level 1 — direct children of center):
 
 SUB-BRANCHES (level 2 — children of main branches):
 - Place 180px further from center in same direction.
-- Smaller boxes: width=130, height=40, same color family but lighter.
+- Smaller boxes: width=130, height=40, same color family but lighter, topic as "label".
 - Connect with "line", strokeWidth=2, same color.
 
 LEAF NODES (level 3+):
@@ -472,17 +474,17 @@ LANE SETUP:
   opacity=20, no roundness, strokeStyle="solid", strokeColor="#cccccc".
 - Lane header: a "rectangle" at top of each lane (height=50),
   backgroundColor matching lane but opacity=60.
-  Place "text" label centered in header, fontSize=16.
+  The lane name as the header's "label", fontSize=16.
 
 STEPS/ACTIVITIES:
 - "rectangle" with roundness type 3, width=160, height=50.
 - Centered horizontally in its lane (lane.x + (200-160)/2 = lane.x + 20).
 - Vertical spacing: 100px between step centers.
 - backgroundColor="#ffffff", strokeColor="#333333".
-- Add "text" label centered inside.
+- The step's text goes in its "label".
 
 DECISIONS:
-- "diamond", width=140, height=80, centered in lane.
+- "diamond", width=140, height=80, centered in lane, the question as its "label".
 - backgroundColor="#fff3cd".
 
 ARROWS:
@@ -513,17 +515,18 @@ TYPE_RULES["network"] = """\
 ═══════════════════════════════════
 NETWORK DIAGRAM RULES
 ═══════════════════════════════════
-DEVICE SHAPES (use text emoji as icon + rectangle):
-- Router:      "rectangle" + "text" with 🔀, backgroundColor="#e8f4f8"
-- Switch:      "rectangle" + "text" with 🔃, backgroundColor="#d5e8d4"
-- Firewall:    "rectangle" + "text" with 🛡️, backgroundColor="#f8cecc"
-- Server:      "rectangle" + "text" with 🖥️, backgroundColor="#dae8fc"
-- PC/Client:   "rectangle" + "text" with 💻, backgroundColor="#fff2cc"
-- Cloud:       "ellipse" + "text" with ☁️, backgroundColor="#e1d5e7", strokeStyle="dashed"
+DEVICE SHAPES (the shape's "label" is the emoji icon + device name, e.g.
+{"text": "🔀 Edge router"}):
+- Router:      "rectangle", label 🔀, backgroundColor="#e8f4f8"
+- Switch:      "rectangle", label 🔃, backgroundColor="#d5e8d4"
+- Firewall:    "rectangle", label 🛡️, backgroundColor="#f8cecc"
+- Server:      "rectangle", label 🖥️, backgroundColor="#dae8fc"
+- PC/Client:   "rectangle", label 💻, backgroundColor="#fff2cc"
+- Cloud:       "ellipse", label ☁️, backgroundColor="#e1d5e7", strokeStyle="dashed"
 - Internet:    "ellipse", width=160, height=80, backgroundColor="#e1d5e7", strokeStyle="dashed"
-- Load Balancer: "rectangle" + "text" with ⚖️, backgroundColor="#e8ffe8"
+- Load Balancer: "rectangle", label ⚖️, backgroundColor="#e8ffe8"
 - Database:    "ellipse", width=130, height=60, backgroundColor="#fde8d8"
-- Wireless AP: "ellipse" + "text" with 📡, backgroundColor="#fff2cc"
+- Wireless AP: "ellipse", label 📡, backgroundColor="#fff2cc"
 - All boxes:   width=140, height=60 unless noted above.
 
 CONNECTIONS (network links):
@@ -583,8 +586,8 @@ EVENTS / MILESTONES:
   Above axis: y = axis_y - 80 - (level × 70).
   Below axis: y = axis_y + 30 + (level × 70).
 - Connect event box to its tick with a vertical "line", strokeWidth=1, strokeStyle="dashed".
-- "text" inside event box: event title, fontSize=13, centered.
-- Small sub-text below title: date/description, fontSize=11.
+- The event box's "label": title, then date/description on a second line,
+  {"text": "Beta launch\\nMar 2024", "fontSize": 13}.
 
 PERIODS / SPANS (ranges on the timeline):
 - Draw a "rectangle" directly on the axis:
@@ -645,7 +648,7 @@ MERGES AND BRANCHES (arrows between branches):
 TAGS:
 - Small "rectangle" above a commit, width=60, height=22.
 - backgroundColor="#fff3cd", strokeColor="#856404".
-- "text" inside: tag name (e.g. "v1.0.0"), fontSize=11.
+- Tag name as its "label": {"text": "v1.0.0", "fontSize": 11}.
 
 LAYOUT:
 - Time flows left to right.
@@ -672,27 +675,30 @@ ELEMENT TYPES:
   "rectangle" with roundness type 3, width=120, height=100.
   Draw a "circle" (ellipse, width=50, height=50) above the rectangle to represent head.
   backgroundColor="#08427b", strokeColor="#052e56".
-  "text" inside box: name (fontSize=14, white) + role (fontSize=12, light).
+  "label": name, then role on the next line, {"text": "Customer\\nPlaces orders",
+  "fontSize": 14, "strokeColor": "#ffffff"}.
 
 - System / Software System:
   "rectangle", width=200, height=100, roundness type 3.
   Internal system: backgroundColor="#1168bd", strokeColor="#0b4884".
   External system: backgroundColor="#999999", strokeColor="#666666".
-  "text" inside: system name (fontSize=16) + "[Software System]" (fontSize=12).
+  "label": {"text": "Shop\\n[Software System]", "fontSize": 16, "strokeColor": "#ffffff"}.
 
 - Container (within a system):
   "rectangle", width=200, height=110, roundness type 3.
   backgroundColor="#438dd5", strokeColor="#2e6295".
-  "text" inside: name (fontSize=15) + "[technology]" (fontSize=12) + description (fontSize=11).
+  "label": name, "[technology]" and description on separate lines,
+  {"text": "API\\n[Python, FastAPI]\\nServes the shop", "fontSize": 14, "strokeColor": "#ffffff"}.
 
 - Component (within a container):
   "rectangle", width=200, height=110, roundness type 3.
   backgroundColor="#85bbf0", strokeColor="#5d82a8".
-  "text" inside: name (fontSize=14) + "[Component]" (fontSize=12) + description (fontSize=11).
+  "label": name, "[Component]" and description on separate lines, fontSize=13.
 
 - Database (Container subtype):
   "ellipse", width=180, height=100.
   backgroundColor="#438dd5", strokeColor="#2e6295".
+  "label": name and "[technology]" on separate lines, strokeColor="#ffffff".
 
 SYSTEM BOUNDARY:
 - Large "rectangle" with dashed border (strokeStyle="dashed"), opacity=15.
@@ -713,6 +719,94 @@ LAYOUT:
 - Canvas: 1200px wide minimum.
 """
 
+# ─────────────────────────────────────────────────────────────────────────────
+# TOPOLOGY-ONLY PROMPTS  (--layout local: auto_layout computes the geometry)
+# ─────────────────────────────────────────────────────────────────────────────
+TOPOLOGY_RULES = """\
+You are a diagram expert. Describe the user's diagram as a graph, as one JSON
+object with "groups", "nodes" and "edges". Positions, sizes, colors and styling
+are computed afterwards by a layout engine — do NOT output any coordinates.
+
+═══════════════════════════════════
+TOPOLOGY RULES (apply to ALL diagrams)
+═══════════════════════════════════
+- nodes: {"id", "label", "kind"?, "group"?, "detail"?}
+    id:     short unique string ("n1", "api", ...)
+    label:  short display name, a few words
+    kind:   one of the kinds listed below for this diagram type (omit for the default)
+    group:  id of the group the node belongs to
+    detail: optional extra lines under the label, separated by "\\n"
+- edges: {"from", "to", "label"?, "style"?}
+    from/to: node ids. style: "solid" (default), "dashed" or "dotted".
+- groups: {"id", "label"} in display order. Omit if the type has none.
+- List nodes in reading order; the layout keeps that order where it can.
+- Every id used in an edge or a node's group must exist.
+
+"""
+
+TOPOLOGY_HINTS = {
+    "sequence": """\
+SEQUENCE: nodes are the participants, left to right. edges are the messages in
+chronological order; style "dashed" for return messages; from == to for a
+self-call. No groups, no kinds.
+""",
+    "flowchart": """\
+FLOWCHART: kinds: start, end, process (default), decision, io, database.
+Edges leaving a decision carry a label ("Yes" / "No"). Flow runs top to bottom.
+""",
+    "architecture": """\
+ARCHITECTURE: groups are tiers, top to bottom (e.g. Client, API, Data).
+Every node has a group. kinds: service (default), database, cache, queue,
+loadbalancer, external. Edge label = protocol / action; style "dashed" for
+async or event traffic.
+""",
+    "erd": """\
+ER DIAGRAM: nodes are entities; detail lists the attributes, one per line,
+prefixed "PK " / "FK " where relevant. kind "weak" for weak entities.
+edges are relationships with a cardinality label ("1:1", "1:N", "N:M").
+""",
+    "class": """\
+CLASS DIAGRAM: nodes are classes; detail lists "+ field: Type" lines, then
+"+ method(args): Type" lines. kinds: class (default), abstract, interface.
+Edges go from subclass to parent (or dependent to dependency); label the
+relationship ("extends", "implements", "1..*"); style "dashed" for
+implements / dependency.
+""",
+    "state": """\
+STATE MACHINE: kinds: state (default), initial, final, active, error.
+initial / final nodes have an empty label. Edge label = "event [guard] / action".
+""",
+    "mindmap": """\
+MIND MAP: the first node is the central topic. Edges go parent → child and
+form a tree. No groups, no kinds.
+""",
+    "swimlane": """\
+SWIMLANE: groups are the lanes (actors), left to right; every node has a
+group. kinds: step (default), decision, start, end. Edges follow the process.
+""",
+    "network": """\
+NETWORK: groups are zones, top to bottom (e.g. Internet, DMZ, LAN).
+kinds: server (default), router, switch, firewall, pc, cloud, database, ap,
+loadbalancer. detail = IP address. Edge label = VLAN / bandwidth / protocol;
+style "dashed" for virtual links, "dotted" for wireless.
+""",
+    "timeline": """\
+TIMELINE: nodes are events in chronological order; detail = the date or period.
+kinds: milestone (default), success, issue, info. No edges, no groups.
+""",
+    "gitflow": """\
+GITFLOW: groups are branches, top to bottom (main, develop, feature/..., release/...,
+hotfix/...). nodes are commits in chronological order, each with its branch
+as group; label = short message or tag. Edges only for branch-offs and merges
+(from a commit on one branch to a commit on another).
+""",
+    "c4": """\
+C4: kinds: system (default), person, external, container, component, database.
+detail = "[technology]" or role. groups are system boundaries; omit for a
+context diagram. Edge label = "[action/protocol]"; style "dashed" for async.
+""",
+}
+
 # ─────────────────────────────────────────────────────────────────────────────
 # DIAGRAM TYPE DETECTION
 # ─────────────────────────────────────────────────────────────────────────────
@@ -755,17 +849,73 @@ DIAGRAM_KEYWORDS = {
                      "software system", "c4"],
 }
 
+# Keyword matcher, compiled once at import.
+# Keywords are split into word tokens and stored in a word-level trie, so a
+# prompt is classified in a single left-to-right pass over its tokens
+# (multi-word keywords are at most a few levels deep). Matching is on whole
+# words — "calls" no longer fires inside "recalls" — but a prompt word may
+# carry a common inflection ("decisions", "branching", "layered").
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_INFLECTIONS = ("s", "es", "d", "ed", "ing")
+_MATCH = "$"   # trie key holding the (type, keyword) pairs ending at a node
+
+
+def _build_keyword_trie(keywords_by_type: dict) -> dict:
+    # A match is recorded as (type, words): keywords that tokenize the same
+    # ("entity relationship" / "entity-relationship") count once.
+    trie = {}
+    for dtype, keywords in keywords_by_type.items():
+        for kw in keywords:
+            words = tuple(_WORD_RE.findall(kw.lower()))
+            node = trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault(_MATCH, set()).add((dtype, words))
+    return trie
+
+
+_KEYWORD_TRIE = _build_keyword_trie(DIAGRAM_KEYWORDS)
+
+
+def _word_forms(word: str) -> tuple:
+    """The word itself plus the stems left after stripping one inflection."""
+    forms = [word]
+    for suffix in _INFLECTIONS:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            forms.append(word[:-len(suffix)])
+    return forms
+
+
+def score_diagram_types(user_prompt: str) -> dict:
+    """
+    Number of distinct DIAGRAM_KEYWORDS matched per diagram type.
+    Only types with a non-zero score are included, in DIAGRAM_KEYWORDS order.
+    """
+    words = _WORD_RE.findall(user_prompt.lower())
+    forms = [_word_forms(w) for w in words]
+    matched = set()
+    for i in range(len(words)):
+        nodes = [_KEYWORD_TRIE]
+        j = i
+        while nodes and j < len(words):
+            nodes = [node[f] for node in nodes for f in forms[j] if f in node]
+            for node in nodes:
+                matched.update(node.get(_MATCH, ()))
+            j += 1
+
+    counts = {}
+    for dtype, _ in matched:
+        counts[dtype] = counts.get(dtype, 0) + 1
+    return {dtype: counts[dtype] for dtype in DIAGRAM_KEYWORDS if dtype in counts}
+
+
 def detect_diagram_type(user_prompt: str) -> str:
     """
     Detect diagram type from user prompt using keyword matching.
     Returns one of the TYPE_RULES keys, or 'architecture' as default.
+    Ties go to the type listed first in DIAGRAM_KEYWORDS.
     """
-    prompt_lower = user_prompt.lower()
-    scores = {}
-    for dtype, keywords in DIAGRAM_KEYWORDS.items():
-        score = sum(1 for kw in keywords if kw in prompt_lower)
-        if score > 0:
-            scores[dtype] = score
+    scores = score_diagram_types(user_prompt)
     if not scores:
         return "architecture"   # safe default
     return max(scores, key=scores.get)
@@ -776,13 +926,35 @@ def detect_diagram_type(user_prompt: str) -> str:
 
 SUPPORTED_TYPES = list(TYPE_RULES.keys())
 
+# Full prompts for every type, built once and frozen. The hash identifies a
+# prompt's exact content (e.g. for Gemini context caches or response caches).
+SYSTEM_PROMPTS = MappingProxyType({
+    dtype: UNIVERSAL_RULES + TYPE_RULES[dtype] for dtype in SUPPORTED_TYPES
+})
+PROMPT_HASHES = MappingProxyType({
+    dtype: hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    for dtype, prompt in SYSTEM_PROMPTS.items()
+})
+
+# Topology-only prompts for --layout local (see auto_layout.py)
+TOPOLOGY_PROMPTS = MappingProxyType({
+    dtype: TOPOLOGY_RULES + TOPOLOGY_HINTS[dtype] for dtype in SUPPORTED_TYPES
+})
+
 def get_system_prompt(diagram_type: str) -> str:
     """
     Returns the full system prompt for a given diagram type.
     Falls back to architecture if type is unknown.
     """
-    type_rule = TYPE_RULES.get(diagram_type, TYPE_RULES["architecture"])
-    return UNIVERSAL_RULES + type_rule
+    return SYSTEM_PROMPTS.get(diagram_type, SYSTEM_PROMPTS["architecture"])
+
+def get_prompt_hash(diagram_type: str) -> str:
+    """Stable content hash of get_system_prompt(diagram_type)."""
+    return PROMPT_HASHES.get(diagram_type, PROMPT_HASHES["architecture"])
+
+def get_topology_prompt(diagram_type: str) -> str:
+    """System prompt asking only for groups / nodes / edges (falls back to architecture)."""
+    return TOPOLOGY_PROMPTS.get(diagram_type, TOPOLOGY_PROMPTS["architecture"])
 
 def get_all_types() -> list:
     return SUPPORTED_TYPES
@@ -0,0 +1,278 @@
+"""
+gemini_client.py
+----------------
+Shared google-genai client factory.
+
+Building a `genai.Client` per call pays client setup and a fresh TLS
+handshake every time. get_client keeps one client per API key alive for the
+life of the process, so its HTTP connection pool (and keep-alive
+connections) are reused across generations. get_async_client returns the
+same client's async surface for batch / server code running on asyncio.
+
+Usage:
+    from gemini_client import get_client, get_async_client
+
+    client = get_client(GEMINI_API_KEY)
+    response = client.models.generate_content(...)
+
+    aclient = get_async_client(GEMINI_API_KEY)
+    response = await aclient.models.generate_content(...)
+
+    # Reuse the system prompt server-side instead of re-sending it
+    context_cache = PromptContextCache(client, GEMINI_MODEL)
+    config = context_cache.generation_config(system_prompt)
+"""
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from excalidraw_rules import SYSTEM_PROMPTS, get_prompt_hash
+from gemini_scheduler import is_retryable
+
+# google-genai (and httpx under it) take a few hundred ms to import, so they
+# are only imported when a client is actually built — `--help`, config errors
+# and cache hits never pay for them.
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+DEFAULT_MAX_CONNECTIONS = 32
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def genai_types():
+    """The google.genai.types module, imported on first use."""
+    from google.genai import types
+    return types
+
+
+def with_timeout(config: "types.GenerateContentConfig", seconds: float) -> "types.GenerateContentConfig":
+    """Copy of config whose HTTP request times out after `seconds`."""
+    types = genai_types()
+    http_options = types.HttpOptions(timeout=max(1, int(seconds * 1000)))   # milliseconds
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={"http_options": http_options})
+
+
+def get_client(api_key: str, max_connections: int = DEFAULT_MAX_CONNECTIONS) -> "genai.Client":
+    """Return the process-wide genai.Client for api_key, creating it on first use."""
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            import httpx
+            from google import genai
+            types = genai_types()
+            client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(
+                    client_args={
+                        "limits": httpx.Limits(
+                            max_connections=max_connections,
+                            max_keepalive_connections=max_connections,
+                        ),
+                    },
+                ),
+            )
+            _clients[api_key] = client
+    return client
+
+
+def get_async_client(api_key: str):
+    """Async surface (client.aio) of the shared client for api_key."""
+    return get_client(api_key).aio
+
+
+def set_client(api_key: str, client) -> None:
+    """Inject a pre-built client (custom transport, proxy, fake for tests)."""
+    with _lock:
+        _clients[api_key] = client
+
+
+def close_clients() -> None:
+    """Drop all cached clients, closing their connection pools."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
+
+
+# ─────────────────────────────────────────────
+# Context caching for the (large, shared) system prompts
+# ─────────────────────────────────────────────
+_KNOWN_PROMPT_HASHES = {prompt: get_prompt_hash(dtype) for dtype, prompt in SYSTEM_PROMPTS.items()}
+
+
+def _is_permanent(exc: BaseException) -> bool:
+    """A 4xx that retrying won't fix (prompt too small, model unsupported, ...)."""
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(exc, "status_code", None)
+    return isinstance(code, int) and 400 <= code < 500 and not is_retryable(exc)
+
+
+class PromptContextCache:
+    """
+    One Gemini cached-content handle per distinct system prompt.
+
+    The diagram rules are several kilobytes and identical for every request
+    of a given diagram type; caching them server-side means they are not
+    re-sent and re-processed as input tokens each time. Handles are created
+    on first use (or adopted from an earlier run via their display name),
+    and their TTL is extended when they get close to expiring. If the model
+    or prompt can't be cached (a 4xx such as below the minimum token count),
+    the prompt is remembered as uncacheable; transient failures (429, 5xx,
+    network errors) are retried after a backoff. Either way callers fall back
+    to a plain system_instruction meanwhile.
+
+    API calls run outside the shared lock: only requests for the same prompt
+    wait for each other, so one slow create doesn't hold up other types.
+    """
+
+    def __init__(self, client: "genai.Client", model: str, ttl: int = 3600, refresh_margin: int = 300,
+                 backoff: float = 5.0, max_backoff: float = 300.0):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._handles = {}        # prompt hash -> (cache name, local expiry time)
+        self._uncacheable = set()
+        self._retry_at = {}       # prompt hash -> (failures, monotonic time of the next attempt)
+        self._adopted = False
+        self._lock = threading.Lock()          # guards the dicts above; never held across API calls
+        self._adopt_lock = threading.Lock()
+        self._prompt_locks = {}   # prompt hash -> lock serializing create / update for that prompt
+
+    @staticmethod
+    def _prompt_hash(system_prompt: str) -> str:
+        # The rules prompts are hashed once at import (excalidraw_rules.PROMPT_HASHES)
+        prompt_hash = _KNOWN_PROMPT_HASHES.get(system_prompt)
+        if prompt_hash is None:
+            prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        return prompt_hash
+
+    def _display_name(self, prompt_hash: str) -> str:
+        return f"excalidraw-{prompt_hash}-{self.model}"[:128]
+
+    def _adopt_existing(self) -> None:
+        """Reuse unexpired caches created by earlier processes."""
+        with self._adopt_lock:
+            if self._adopted:
+                return
+            now = time.time()
+            found = {}
+            try:
+                for cached in self.client.caches.list():
+                    name = getattr(cached, "display_name", "") or ""
+                    expire = getattr(cached, "expire_time", None)
+                    if not name.startswith("excalidraw-") or expire is None:
+                        continue
+                    remaining = expire.timestamp() - now
+                    if remaining > self.refresh_margin:
+                        prompt_hash = name.split("-")[1]
+                        if name == self._display_name(prompt_hash):
+                            found[prompt_hash] = (cached.name, time.monotonic() + remaining)
+            except Exception as e:
+                print(f"      ⚠ Could not list Gemini context caches: {type(e).__name__}: {e}")
+            with self._lock:
+                for prompt_hash, handle in found.items():
+                    self._handles.setdefault(prompt_hash, handle)
+                self._adopted = True
+
+    def _usable(self, prompt_hash: str):
+        """(name, state) under the lock: state is "fresh", "stale", "skip" or None (no handle)."""
+        with self._lock:
+            if prompt_hash in self._uncacheable:
+                return None, "skip"
+            retry = self._retry_at.get(prompt_hash)
+            if retry is not None and time.monotonic() < retry[1]:
+                return None, "skip"
+            handle = self._handles.get(prompt_hash)
+        if handle is None:
+            return None, None
+        name, expires = handle
+        remaining = expires - time.monotonic()
+        if remaining > self.refresh_margin:
+            return name, "fresh"
+        return (name, "stale") if remaining > 0 else (None, None)
+
+    def _failed(self, prompt_hash: str, exc: Exception) -> None:
+        with self._lock:
+            self._handles.pop(prompt_hash, None)
+            if _is_permanent(exc):
+                print(f"      ⚠ Context caching unavailable for this prompt ({type(exc).__name__}: {exc})")
+                self._uncacheable.add(prompt_hash)
+                return
+            failures = self._retry_at.get(prompt_hash, (0, 0))[0] + 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+            self._retry_at[prompt_hash] = (failures, time.monotonic() + delay)
+        print(f"      ⚠ Context cache request failed ({type(exc).__name__}: {exc}); retrying in {delay:.0f}s")
+
+    def get(self, system_prompt: str):
+        """Cached-content name for system_prompt, or None if it can't be cached (right now)."""
+        prompt_hash = self._prompt_hash(system_prompt)
+        name, state = self._usable(prompt_hash)
+        if state == "fresh":
+            return name
+        if state == "skip":
+            return None
+        if not self._adopted:
+            self._adopt_existing()
+
+        with self._lock:
+            prompt_lock = self._prompt_locks.setdefault(prompt_hash, threading.Lock())
+        with prompt_lock:
+            # Another request may have created / refreshed it while we waited
+            name, state = self._usable(prompt_hash)
+            if state == "fresh":
+                return name
+            if state == "skip":
+                return None
+
+            if state == "stale":
+                try:
+                    self.client.caches.update(
+                        name=name,
+                        config=genai_types().UpdateCachedContentConfig(ttl=f"{self.ttl}s"),
+                    )
+                    with self._lock:
+                        self._handles[prompt_hash] = (name, time.monotonic() + self.ttl)
+                    return name
+                except Exception:
+                    pass   # expired/deleted server-side — create a new one
+
+            try:
+                cached = self.client.caches.create(
+                    model=self.model,
+                    config=genai_types().CreateCachedContentConfig(
+                        display_name=self._display_name(prompt_hash),
+                        system_instruction=system_prompt,
+                        ttl=f"{self.ttl}s",
+                    ),
+                )
+            except Exception as e:
+                self._failed(prompt_hash, e)
+                return None
+            with self._lock:
+                self._handles[prompt_hash] = (cached.name, time.monotonic() + self.ttl)
+                self._retry_at.pop(prompt_hash, None)
+            return cached.name
+
+    def generation_config(self, system_prompt: str, **kwargs) -> "types.GenerateContentConfig":
+        """GenerateContentConfig using the cached prompt when possible."""
+        types = genai_types()
+        name = self.get(system_prompt)
+        if name is None:
+            return types.GenerateContentConfig(system_instruction=system_prompt, **kwargs)
+        return types.GenerateContentConfig(cached_content=name, **kwargs)
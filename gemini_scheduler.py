@@ -0,0 +1,326 @@
+"""
+gemini_scheduler.py
+-------------------
+Retry, timeout and rate-limit policy for Gemini calls.
+
+A bare generate_content call has no timeout and fails on the first 429 or
+5xx, which under batch load takes whole jobs down. GeminiScheduler wraps
+each call with:
+
+  - token buckets for the requests-per-minute and tokens-per-minute quotas,
+    shared by every thread / task using the scheduler, so a batch queues
+    locally instead of tripping the API's rate limit
+  - a per-attempt timeout, capped by what is left of the overall deadline
+  - retries on 408 / 429 / 5xx and transport errors with jittered
+    exponential backoff (tenacity), honouring the server's retry delay
+  - optional hedging: if an attempt hasn't answered after hedge_after
+    seconds, an identical request is raced against it and the first
+    success wins
+  - one metrics record per attempt (latency, outcome, hedge, throttle wait)
+
+Usage:
+    scheduler = GeminiScheduler(rpm=60, tpm=1_000_000, hedge_after=20)
+    response = scheduler.call(
+        lambda timeout: client.models.generate_content(
+            model=model, contents=prompt, config=with_timeout(config, timeout)),
+        tokens=estimate_tokens(system_prompt, prompt),
+    )
+    print(scheduler.summary())
+"""
+import asyncio
+import collections
+import re
+import threading
+import time
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+_RETRY_DELAY = re.compile(r"""retryDelay['"]?\s*:\s*['"](\d+(?:\.\d+)?)s""")
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough input-token count (~4 characters per token) for the TPM bucket."""
+    return sum(len(t) for t in texts if t) // 4 + 1
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Timeouts, dropped connections, and 408 / 429 / 5xx API errors."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, httpx.TransportError)
+
+
+def retry_after(exc: BaseException):
+    """Seconds the server asked us to wait (RetryInfo or Retry-After), or None."""
+    if exc is None:
+        return None
+    m = _RETRY_DELAY.search(str(getattr(exc, "details", "") or ""))
+    if m:
+        return float(m.group(1))
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ─────────────────────────────────────────────
+# Rate limiting
+# ─────────────────────────────────────────────
+class TokenBucket:
+    """
+    Refills at per_minute units per minute, holding at most `capacity`
+    (default: one minute's worth). Callers reserve units up front and wait
+    out any deficit, so concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._level = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units; returns the seconds to wait before using them."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) units after the fact, e.g. actual vs. estimated tokens."""
+        with self._lock:
+            self._level = min(self.capacity, self._level - amount)
+
+
+# ─────────────────────────────────────────────
+# Scheduler
+# ─────────────────────────────────────────────
+class GeminiScheduler:
+    """Runs Gemini calls under one retry / timeout / rate-limit policy."""
+
+    def __init__(self, rpm: float = None, tpm: float = None, max_attempts: int = 5,
+                 deadline: float = 300.0, attempt_timeout: float = 120.0,
+                 backoff: float = 1.0, max_backoff: float = 32.0,
+                 hedge_after: float = None, max_records: int = 10000):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_attempts = max(1, max_attempts)
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.attempts = collections.deque(maxlen=max_records)   # one dict per attempt
+        self._executor = None
+        self._lock = threading.Lock()
+
+    # ── rate limiting ─────────────────────────────
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def throttle(self, tokens: int = 0) -> float:
+        """Block until one request of `tokens` fits the quotas; returns the wait."""
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def athrottle(self, tokens: int = 0) -> float:
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _reconcile(self, result, tokens: int) -> None:
+        usage = getattr(result, "usage_metadata", None)
+        actual = getattr(usage, "prompt_token_count", None)
+        if self.tokens is not None and isinstance(actual, int):
+            self.tokens.adjust(actual - tokens)
+
+    # ── retries ───────────────────────────────────
+    def _retrying(self, retrying_cls):
+        from tenacity import retry_if_exception, stop_after_attempt, stop_before_delay, wait_random_exponential
+        backoff = wait_random_exponential(multiplier=self.backoff, max=self.max_backoff)
+
+        def wait(retry_state) -> float:
+            delay = backoff(retry_state)
+            server_delay = retry_after(retry_state.outcome.exception())
+            return max(delay, server_delay) if server_delay else delay
+
+        return retrying_cls(
+            stop=stop_after_attempt(self.max_attempts) | stop_before_delay(self.deadline),
+            wait=wait,
+            retry=retry_if_exception(is_retryable),
+            reraise=True,
+        )
+
+    def _remaining(self, start: float, label: str) -> float:
+        remaining = self.deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            raise TimeoutError(f"{label}: deadline of {self.deadline:.0f}s exceeded")
+        return remaining
+
+    def _record(self, label: str, attempt: int, hedge: bool, seconds: float,
+                throttled: float, error: BaseException = None) -> None:
+        outcome = "ok" if error is None else type(error).__name__
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            outcome = f"{outcome}({code})"
+        with self._lock:
+            self.attempts.append({
+                "label": label, "attempt": attempt, "hedge": hedge, "ok": error is None,
+                "outcome": outcome, "seconds": round(seconds, 3), "throttled": round(throttled, 3),
+            })
+
+    # ── sync ──────────────────────────────────────
+    def call(self, fn, tokens: int = 0, label: str = "gemini"):
+        """
+        Run fn(timeout_seconds) under the policy and return its result.
+        fn must honour the timeout itself (see gemini_client.with_timeout).
+        """
+        from tenacity import Retrying
+        start = time.monotonic()
+        for attempt in self._retrying(Retrying):
+            with attempt:
+                result = self._attempt(fn, tokens, label, attempt.retry_state.attempt_number, start)
+        return result
+
+    def _run(self, fn, timeout: float, tokens: int, label: str, attempt: int,
+             hedge: bool, throttled: float):
+        t0 = time.monotonic()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            self._record(label, attempt, hedge, time.monotonic() - t0, throttled, e)
+            raise
+        self._record(label, attempt, hedge, time.monotonic() - t0, throttled)
+        self._reconcile(result, tokens)
+        return result
+
+    def _attempt(self, fn, tokens: int, label: str, attempt: int, start: float):
+        throttled = self.throttle(tokens)
+        timeout = min(self.attempt_timeout, self._remaining(start, label))
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return self._run(fn, timeout, tokens, label, attempt, False, throttled)
+
+        # Threads can't be cancelled: a losing request finishes in the
+        # background and its result is dropped.
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini-hedge")
+        primary = self._executor.submit(self._run, fn, timeout, tokens, label, attempt, False, throttled)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        hedge_throttled = self.throttle(tokens)
+        hedge = self._executor.submit(self._run, fn, timeout - self.hedge_after, tokens, label,
+                                      attempt, True, hedge_throttled)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{label}: no answer within {timeout:.0f}s")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return primary.result()   # both failed: raise the primary's error
+
+    # ── async ─────────────────────────────────────
+    async def acall(self, fn, tokens: int = 0, label: str = "gemini"):
+        """Async call: fn(timeout_seconds) returns an awaitable."""
+        from tenacity import AsyncRetrying
+        start = time.monotonic()
+        async for attempt in self._retrying(AsyncRetrying):
+            with attempt:
+                result = await self._aattempt(fn, tokens, label, attempt.retry_state.attempt_number, start)
+        return result
+
+    async def _arun(self, fn, timeout: float, tokens: int, label: str, attempt: int,
+                    hedge: bool, throttled: float):
+        t0 = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(timeout), timeout)
+        except (Exception, asyncio.CancelledError) as e:   # cancelled = lost a hedge race
+            self._record(label, attempt, hedge, time.monotonic() - t0, throttled, e)
+            raise
+        self._record(label, attempt, hedge, time.monotonic() - t0, throttled)
+        self._reconcile(result, tokens)
+        return result
+
+    async def _aattempt(self, fn, tokens: int, label: str, attempt: int, start: float):
+        throttled = await self.athrottle(tokens)
+        timeout = min(self.attempt_timeout, self._remaining(start, label))
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await self._arun(fn, timeout, tokens, label, attempt, False, throttled)
+
+        primary = asyncio.ensure_future(self._arun(fn, timeout, tokens, label, attempt, False, throttled))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+            hedge_throttled = await self.athrottle(tokens)
+            pending.add(asyncio.ensure_future(
+                self._arun(fn, timeout - self.hedge_after, tokens, label, attempt, True, hedge_throttled)
+            ))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return primary.result()   # both failed: raise the primary's error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # ── metrics ───────────────────────────────────
+    def summary(self) -> dict:
+        """Aggregate of the per-attempt records."""
+        with self._lock:
+            records = list(self.attempts)
+        latencies = sorted(r["seconds"] for r in records if r["ok"])
+        outcomes = collections.Counter(r["outcome"] for r in records if not r["ok"])
+        return {
+            "attempts": len(records),
+            "ok": len(latencies),
+            "retries": sum(1 for r in records if r["attempt"] > 1 and not r["hedge"]),
+            "hedges": sum(1 for r in records if r["hedge"]),
+            "hedge_wins": sum(1 for r in records if r["hedge"] and r["ok"]),
+            "throttled_seconds": round(sum(r["throttled"] for r in records), 3),
+            "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            "p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            "errors": dict(outcomes),
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> GeminiScheduler:
+    """Process-wide scheduler (retries and timeouts, no rate limits)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GeminiScheduler()
+    return _default
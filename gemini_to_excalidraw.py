@@ -11,29 +11,45 @@ Usage:
     python gemini_to_excalidraw.py
     python gemini_to_excalidraw.py --prompt "Draw a 3-tier web architecture"
     python gemini_to_excalidraw.py --prompt "Draw a 3-tier web architecture" --output arch.excalidraw
+    python gemini_to_excalidraw.py -p "Login sequence" -p "Order flowchart" --output docs.excalidraw
 """
-import asyncio
 import argparse
+import asyncio
+import base64
+import contextlib
 import json
-import math
 import os
-import random
-import re
 import sys
 import time
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from typing import TYPE_CHECKING
+from element_schema import response_schema
+from json_repair import salvage_elements
+from response_cache import ResponseCache, cache_key
+from gemini_client import get_client, genai_types, with_timeout
+import timing
+from gemini_scheduler import default_scheduler, estimate_tokens
+
+# google-genai and mcp are imported lazily, only on the code paths that use
+# them, so --help and config errors return without loading them.
+if TYPE_CHECKING:
+    from google import genai
+    from excalidraw_mcp import ExcalidrawMCPClient
 
 # ─────────────────────────────────────────────
 # Config
 # ─────────────────────────────────────────────
-load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
 GEMINI_MODEL   = os.getenv("GEMINI_MODEL", "YOUR_GEMINI_MODEL_HERE")
 
+
+def load_env() -> None:
+    """Load .env into the environment and refresh GEMINI_API_KEY / GEMINI_MODEL."""
+    global GEMINI_API_KEY, GEMINI_MODEL
+    from dotenv import load_dotenv
+    load_dotenv()
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
+    GEMINI_MODEL   = os.getenv("GEMINI_MODEL", "YOUR_GEMINI_MODEL_HERE")
+
 SYSTEM_PROMPT = """\
 You are an Excalidraw diagram expert. Convert the user's description into
 a valid Excalidraw elements array (JSON).
@@ -119,135 +135,312 @@ def dump_result(label: str, result) -> None:
 # ─────────────────────────────────────────────
 # Step 1: Gemini → Excalidraw elements JSON
 # ─────────────────────────────────────────────
-def generate_elements(user_prompt: str) -> list:
-    client = genai.Client(api_key=GEMINI_API_KEY)
+@timing.timed("generate_elements")
+def generate_elements(user_prompt: str, cache: ResponseCache = None, refresh: bool = False,
+                      client: "genai.Client" = None) -> list:
+    key = cache_key(GEMINI_MODEL, SYSTEM_PROMPT, user_prompt)
+    if cache is not None and not refresh:
+        with timing.span("cache.get"):
+            cached = cache.get(key)
+        if cached is not None:
+            print(f"[1/5] Cache hit — {len(cached)} elements, no Gemini call")
+            return cached
+
+    client = client or get_client(GEMINI_API_KEY)
     print(f"[1/5] Sending to Gemini ({GEMINI_MODEL})...")
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=user_prompt,
-        config=types.GenerateContentConfig(
-            system_instruction=SYSTEM_PROMPT,
-        ),
+    # Structured output: the response is always a JSON array of elements
+    config = genai_types().GenerateContentConfig(
+        system_instruction=SYSTEM_PROMPT,
+        response_mime_type="application/json",
+        response_schema=response_schema(),
     )
+    # Retries 429 / 5xx / timeouts with jittered backoff
+    with timing.span("gemini.generate_content"):
+        response = default_scheduler().call(
+            lambda timeout: client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=user_prompt,
+                config=with_timeout(config, timeout),
+            ),
+            tokens=estimate_tokens(SYSTEM_PROMPT, user_prompt),
+            label="generate_content",
+        )
     raw = response.text.strip()
-    # Strip accidental markdown fences
-    raw = re.sub(r"^```(?:json)?\s*", "", raw, flags=re.MULTILINE)
-    raw = re.sub(r"```\s*$",          "", raw, flags=re.MULTILINE)
-    raw = raw.strip()
 
     print(f"\n── Raw Gemini output (first 500 chars) ─────\n{raw[:500]}\n────────────────────────────────────────────\n")
 
-    elements = json.loads(raw)   # raises if Gemini returned bad JSON
+    # A truncated / damaged array is salvaged element by element instead of failing
+    with timing.span("json.parse"):
+        elements, report = salvage_elements(raw)
     print(f"      ✔ Parsed {len(elements)} raw elements from Gemini")
-
-    
-
+    complete = not report["truncated"] and not report["skipped"]
+    if report["repaired"] or not complete:
+        print(f"      ⚠ Damaged output: salvaged {report['elements']} element(s) "
+              f"({report['repaired']} repaired, {report['skipped']} dropped"
+              f"{', truncated' if report['truncated'] else ''})")
+
+    if cache is not None and complete:
+        cache.put(key, elements)
     return elements
 
 
 # ─────────────────────────────────────────────
 # Steps 2–4: MCP → add_elements → get_scene
 # ─────────────────────────────────────────────
-async def send_to_excalidraw(elements: list, session_name: str = "gemini-diagram",export_path:str = "./export.json", export_format: str = "json") -> str:
-    server_params = StdioServerParameters(
-        command="npx",
-        args=["-y", "@scofieldfree/excalidraw-mcp"],
-    )
-
-    print("[2/5] Connecting to @scofieldfree/excalidraw-mcp...")
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            tools_response = await session.list_tools()
-            tool_names = [t.name for t in tools_response.tools]
-            print(f"      Available tools: {tool_names}\n")
-
-            # ── start_session ────────────────────────────
-            print("[2/5] start_session...")
-            r1 = await session.call_tool("start_session", {"sessionId": session_name})
-            dump_result("start_session", r1)
-            print("      Waiting 4s for browser + WebSocket...")
-            await asyncio.sleep(4)
-
-            # ── add_elements ─────────────────────────────
-            print(f"[3/5] add_elements ({len(elements)} elements)...")
-            r2 = await session.call_tool(
-                "add_elements",
-                {
-                    "sessionId": session_name,
-                    "elements":  elements,
-                },
+async def send_to_excalidraw(elements: list, session_name: str = "gemini-diagram",export_path:str = "./export.json", export_format="json",
+                             client: "ExcalidrawMCPClient" = None, output_path: str = "arch.excalidraw",
+                             ready_timeout: float = 10.0, chunk_size: int = 200, scene: bool = True) -> str:
+    """
+    Push one diagram through excalidraw-mcp in its own sessionId.
+    Pass a shared ExcalidrawMCPClient to reuse a warm server across diagrams;
+    without one a server is started (and stopped) just for this call.
+    Elements are uploaded chunk_size at a time (<= 0 for a single call).
+
+    export_format may be one format or several (e.g. ("json", "png", "svg"));
+    several are exported concurrently from the same session, each next to
+    export_path with its own extension. With scene=False the final get_scene
+    round trip is skipped and "" is returned.
+    """
+    if client is None:
+        from excalidraw_mcp import ExcalidrawMCPClient
+        print("[2/5] Connecting to @scofieldfree/excalidraw-mcp...")
+        async with ExcalidrawMCPClient() as own_client:
+            return await send_to_excalidraw(elements, session_name, export_path, export_format,
+                                            client=own_client, output_path=output_path,
+                                            ready_timeout=ready_timeout, chunk_size=chunk_size, scene=scene)
+
+    formats = (export_format,) if isinstance(export_format, str) else tuple(dict.fromkeys(export_format))
+    export_paths = _export_paths(export_path, formats)
+
+    # If the server dies mid-diagram its browser session is gone with it,
+    # so replay the diagram once from start_session on the new connection.
+    for attempt in range(2):
+        generation = client.generation
+        try:
+            with timing.span("render", session=session_name, attempt=attempt + 1):
+                return await _render_diagram(client, elements, session_name, export_paths,
+                                             output_path, ready_timeout, chunk_size, scene)
+        except Exception:
+            if attempt == 1 or client.generation == generation:
+                raise
+            print(f"      ↻ Server restarted — replaying session {session_name!r}...")
+
+
+def _export_paths(export_path: str, formats: tuple) -> dict:
+    """{format: path}; a single format keeps export_path as given."""
+    root, ext = os.path.splitext(export_path)
+    if len(formats) == 1 and ext.lstrip(".") in (formats[0], ""):
+        return {formats[0]: export_path}
+    return {fmt: f"{root}.{fmt}" for fmt in formats}
+
+
+async def _render_diagram(client: "ExcalidrawMCPClient", elements: list, session_name: str,
+                          export_paths: dict, output_path: str, ready_timeout: float,
+                          chunk_size: int, scene: bool) -> str:
+    from excalidraw_mcp import wait_for_scene, add_elements_chunked, export_formats
+    # ── start_session ────────────────────────────
+    print(f"[2/5] start_session ({session_name})...")
+    r1 = await client.call_tool("start_session", {"sessionId": session_name})
+    dump_result("start_session", r1)
+    print(f"      Waiting for browser + WebSocket (≤{ready_timeout:.0f}s)...")
+    await wait_for_scene(client, session_name, timeout=ready_timeout)
+
+    # ── add_elements ─────────────────────────────
+    # Sent in chunks so the canvas fills in progressively and a rejected
+    # chunk can be retried without resending the whole scene.
+    print(f"[3/5] add_elements ({len(elements)} elements)...")
+    chunks = await add_elements_chunked(client, session_name, elements, chunk_size=chunk_size)
+    if len(chunks) > 1:
+        print(f"      ✔ {len(chunks)} chunks acknowledged in {sum(c['seconds'] for c in chunks):.2f}s "
+              f"(slowest {max(c['seconds'] for c in chunks):.2f}s)")
+    dump_result("add_elements", chunks[-1]["result"])
+
+    # ── get_scene ────────────────────────────────
+    # Polls until the added elements are on the canvas; the last poll is the scene.
+    # Every chunk was acknowledged already, so exports alone don't need it.
+    r3 = None
+    if scene:
+        print("[4/5] get_scene...")
+        expected_ids = [el["id"] for el in elements if isinstance(el, dict) and "id" in el]
+        r3 = await wait_for_scene(client, session_name, expected_ids=expected_ids, timeout=ready_timeout)
+        dump_result("get_scene", r3)
+
+    # ── export_diagram (all formats at once) ─────
+    print(f"[5/5] export_diagram ({', '.join(export_paths)})...")
+    # A file left over from an earlier run must not pass for this export
+    for path in export_paths.values():
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+    results = await export_formats(client, session_name, export_paths)
+    written = await asyncio.gather(*(
+        asyncio.to_thread(_write_export, fmt, export_paths[fmt], results[fmt], output_path)
+        for fmt in export_paths
+    ))
+    for (fmt, path), ok in zip(export_paths.items(), written):
+        if ok:
+            print(f"      ✔ {fmt} → {path}")
+        else:
+            print(f"      ⚠ {fmt}: the server neither wrote {path} nor returned the image")
+
+    if r3 is None:
+        return ""
+    texts = [c.text for c in r3.content if hasattr(c, "text")]
+    return "\n".join(texts)
+
+
+@timing.timed("export.write")
+def _write_export(fmt: str, export_path: str, result, output_path: str) -> bool:
+    """
+    Post-process one export: json becomes an .excalidraw file, images are saved
+    if returned inline. False if there was no file and no inline image.
+    """
+    # ── export json ────────────────────────────────
+    if fmt == "json":
+
+        with open(export_path) as f:
+            exported = json.load(f)
+
+        excalidraw_file = {
+            "type": "excalidraw",
+            "version": 2,
+            "source": "https://excalidraw.com",
+            "elements": exported["elements"],
+            "appState": exported["appState"],
+            "files": {}
+        }
+
+        with open(output_path, "w") as f:
+            json.dump(excalidraw_file, f, ensure_ascii=False)
+        return True
+
+    # ── export png / svg ───────────────────────────
+    # The server normally writes the file itself (any older file was removed
+    # before the export); some versions return the image as a content block instead.
+    if os.path.exists(export_path):
+        return True
+    for block in result.content or []:
+        data = getattr(block, "data", None)
+        text = getattr(block, "text", None)
+        if data:
+            with open(export_path, "wb") as f:
+                f.write(base64.b64decode(data))
+            return True
+        if fmt == "svg" and text and text.lstrip().startswith("<svg"):
+            with open(export_path, "w") as f:
+                f.write(text)
+            return True
+    return False
+
+
+async def render_many(jobs: list, session_prefix: str, ready_timeout: float = 10.0,
+                      chunk_size: int = 200, export_formats: tuple = ("json",), scene: bool = True) -> None:
+    """
+    Push several (elements, output_path) jobs through one warm excalidraw-mcp
+    server, each diagram in its own sessionId, exporting every format in
+    export_formats from that session.
+    """
+    from excalidraw_mcp import ExcalidrawMCPClient
+    async with ExcalidrawMCPClient() as client:
+        for i, (elements, output_path) in enumerate(jobs, 1):
+            session_name = session_prefix if len(jobs) == 1 else f"{session_prefix}-{i}"
+            start = time.perf_counter()
+            await send_to_excalidraw(
+                elements,
+                session_name=session_name,
+                export_path=f"./{session_name}.export.json",
+                export_format=export_formats,
+                client=client,
+                output_path=output_path,
+                ready_timeout=ready_timeout,
+                chunk_size=chunk_size,
+                scene=scene,
             )
-            dump_result("add_elements", r2)
-            await asyncio.sleep(2)
-
-            # ── get_scene ────────────────────────────────
-            print("[4/5] get_scene...")
-            r3 = await session.call_tool("get_scene", {"sessionId": session_name})
-            dump_result("get_scene", r3)
-            await asyncio.sleep(2)
-            
-            print("[5/5] get_scene...")
-            r4 = await session.call_tool("export_diagram", {"sessionId": session_name, "path": export_path,"format":export_format})
-            
-            # ── export json ────────────────────────────────
-            if export_format == "json":
-
-                with open(export_path) as f:
-                    exported = json.load(f)
-
-                excalidraw_file = {
-                    "type": "excalidraw",
-                    "version": 2,
-                    "source": "https://excalidraw.com",
-                    "elements": exported["elements"],
-                    "appState": exported["appState"],
-                    "files": {}
-                }
-
-                with open("arch.excalidraw", "w") as f:
-                    json.dump(excalidraw_file, f, ensure_ascii=False)
-            
-            texts = [c.text for c in r3.content if hasattr(c, "text")]
-            return "\n".join(texts)
+            print(f"      ✔ {session_name} → {output_path} in {time.perf_counter() - start:.2f}s")
 
 
 # ─────────────────────────────────────────────
 # Entry point
 # ─────────────────────────────────────────────
+def _output_path(output: str, index: int, count: int) -> str:
+    output = output or "arch.excalidraw"
+    if count == 1:
+        return output
+    root, ext = os.path.splitext(output)
+    return f"{root}-{index}{ext or '.excalidraw'}"
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--prompt",  "-p", type=str, default=None)
+    parser.add_argument("--prompt",  "-p", type=str, action="append", default=None,
+                        help="diagram description (repeat to render several through one warm server)")
     parser.add_argument("--session", "-s", type=str, default="gemini-diagram")
     parser.add_argument("--output",  "-o", type=str, default=None)
+    parser.add_argument("--ready-timeout", type=float, default=10.0,
+                        help="max seconds to wait for the canvas to become ready")
+    parser.add_argument("--chunk-size", type=int, default=200,
+                        help="elements per add_elements call (0 = send the whole scene at once)")
+    parser.add_argument("--export", type=str, nargs="+", default=["json"], choices=["json", "png", "svg"],
+                        help="export formats, produced concurrently from one session "
+                             "(json also writes the .excalidraw --output)")
+    parser.add_argument("--no-scene", action="store_true",
+                        help="skip the final get_scene call when only the exports are needed")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't read or write the on-disk response cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore cached responses but store the new ones")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a per-stage timing breakdown and append it to --profile-out")
+    parser.add_argument("--profile-out", type=str, default="profile.jsonl",
+                        help="JSON-lines file for --profile spans")
+    parser.add_argument("--cprofile", type=str, default=None, metavar="PATH",
+                        help="also run under cProfile and dump stats to PATH")
     args = parser.parse_args()
 
+    if args.profile:
+        timing.enable()
+    try:
+        with timing.cprofile(args.cprofile):
+            _run(args)
+    finally:
+        if args.profile:
+            timing.print_report()
+            written = timing.write_jsonl(args.profile_out)
+            print(f"      ✔ {written} spans → {args.profile_out}")
+
+
+def _run(args) -> None:
+    load_env()
     if GEMINI_API_KEY == "YOUR_GEMINI_API_KEY_HERE":
         sys.exit("❌  Set GEMINI_API_KEY environment variable.")
 
-    user_prompt = args.prompt or input("📝 Enter diagram description: ").strip()
-    if not user_prompt:
+    prompts = args.prompt or [input("📝 Enter diagram description: ").strip()]
+    prompts = [p for p in prompts if p]
+    if not prompts:
         sys.exit("❌  No prompt provided.")
 
+    cache = None if args.no_cache else ResponseCache()
+
     # Step 1 — Gemini
-    elements = generate_elements(user_prompt)
+    jobs = [
+        (generate_elements(user_prompt, cache=cache, refresh=args.refresh),
+         _output_path(args.output, i, len(prompts)))
+        for i, user_prompt in enumerate(prompts, 1)
+    ]
 
     # Steps 2–4 — MCP → Excalidraw canvas → text
     try:
-        scene_text = asyncio.run(
-            # export image
-            # send_to_excalidraw(elements, session_name=args.session,export_format="png") 
-            send_to_excalidraw(elements, session_name=args.session)
+        asyncio.run(
+            render_many(jobs, session_prefix=args.session, ready_timeout=args.ready_timeout,
+                        chunk_size=args.chunk_size, export_formats=tuple(args.export),
+                        scene=not args.no_scene)
         )
     except KeyboardInterrupt:
         sys.exit("\n👋 Cancelled.")
 
-    print("\n── Excalidraw scene (text) ─────────────────")
-    print(json.dumps(elements, indent=2, ensure_ascii=False))
-    print("────────────────────────────────────────────\n")
-
-   
-
+    for elements, _ in jobs:
+        print("\n── Excalidraw scene (text) ─────────────────")
+        print(json.dumps(elements, indent=2, ensure_ascii=False))
+        print("────────────────────────────────────────────\n")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
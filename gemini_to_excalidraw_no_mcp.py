@@ -11,32 +11,54 @@ Usage:
     python gemini_to_excalidraw.py
     python gemini_to_excalidraw.py --prompt "Draw a 3-tier web architecture"
     python gemini_to_excalidraw.py --prompt "Draw a 3-tier web architecture" --output arch.excalidraw
+    python gemini_to_excalidraw_no_mcp.py --batch prompts.jsonl --out-dir diagrams -j 8
+    cat prompts.jsonl | python gemini_to_excalidraw_no_mcp.py --batch -
+    python gemini_to_excalidraw_no_mcp.py --prompt "Network topology for a datacenter" --stream
+    python gemini_to_excalidraw_no_mcp.py --prompt "Order flowchart" --layout local
 """
-import asyncio
 import argparse
+import asyncio
+import functools
 import json
-import math
 import os
-import random
 import re
 import sys
 import time
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from excalidraw_rules import get_system_prompt, detect_diagram_type
-from sanitize_elements import sanitize_elements, fix_elements
+from typing import TYPE_CHECKING
+from excalidraw_rules import get_system_prompt, get_topology_prompt, detect_diagram_type
+from element_schema import response_schema, topology_schema
+from sanitize_elements import normalize_elements, iter_normalized
+from json_repair import RepairingParser, salvage_elements, strip_trailing_commas
+import auto_layout
+from layout_repair import repair_layout
+from arrow_bindings import resolve_bindings
+from response_cache import ResponseCache, cache_key
+from gemini_client import get_client, get_async_client, genai_types, with_timeout, PromptContextCache
+import timing
+from gemini_scheduler import GeminiScheduler, default_scheduler, estimate_tokens
+
+# google-genai is imported lazily (see gemini_client); this module never
+# needs mcp.
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
 
 # ─────────────────────────────────────────────
 # Config
 # ─────────────────────────────────────────────
-load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
 GEMINI_MODEL   = os.getenv("GEMINI_MODEL", "YOUR_GEMINI_MODEL_HERE")
 
 
+def load_env() -> None:
+    """Load .env into the environment and refresh GEMINI_API_KEY / GEMINI_MODEL."""
+    global GEMINI_API_KEY, GEMINI_MODEL
+    from dotenv import load_dotenv
+    load_dotenv()
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
+    GEMINI_MODEL   = os.getenv("GEMINI_MODEL", "YOUR_GEMINI_MODEL_HERE")
+
+
 
 
 # ─────────────────────────────────────────────
@@ -58,32 +80,594 @@ def dump_result(label: str, result) -> None:
 # ─────────────────────────────────────────────
 # Step 1: Gemini → Excalidraw elements JSON
 # ─────────────────────────────────────────────
-def generate_elements(user_prompt: str, system_prompt: str) -> list:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    print(f"[1/2] Sending to Gemini ({GEMINI_MODEL})...")
-    response = client.models.generate_content(
+def _cached_elements(cache: ResponseCache, key: str, refresh: bool, verbose: bool):
+    if cache is None or refresh:
+        return None
+    with timing.span("cache.get"):
+        cached = cache.get(key)
+    if cached is not None and verbose:
+        print(f"[1/2] Cache hit — {len(cached)} elements, no Gemini call")
+    return cached
+
+
+async def _acached_elements(cache: ResponseCache, key: str, refresh: bool, verbose: bool):
+    """_cached_elements with the SQLite read off the event loop."""
+    if cache is None or refresh:
+        return None
+    return await asyncio.to_thread(_cached_elements, cache, key, refresh, verbose)
+
+
+@timing.timed("gemini.config")
+def _generation_config(system_prompt: str, context_cache: PromptContextCache = None,
+                       schema: dict = None) -> "types.GenerateContentConfig":
+    # Structured output: decoding is constrained to a JSON array of elements
+    # (or `schema`), so the response always parses and needs no fence stripping.
+    structured = {"response_mime_type": "application/json", "response_schema": schema or response_schema()}
+    if context_cache is not None:
+        return context_cache.generation_config(system_prompt, **structured)
+    return genai_types().GenerateContentConfig(
+        system_instruction=system_prompt,
+        **structured,
+    )
+
+
+@timing.timed("json.parse")
+def _parse_response(text: str, verbose: bool):
+    """(elements, complete) — damaged output is salvaged instead of raising."""
+    raw = (text or "").strip()
+
+    if verbose:
+        print(f"\n── Raw Gemini output (first 500 chars) ─────\n{raw[:500]}\n────────────────────────────────────────────\n")
+
+    elements, report = salvage_elements(raw)   # raises only if nothing is recoverable
+    complete = not report["truncated"] and not report["skipped"]
+    if verbose:
+        print(f"      ✔ Parsed {len(elements)} raw elements from Gemini")
+    if report["repaired"] or not complete:
+        print(f"      ⚠ Damaged output: salvaged {report['elements']} element(s) "
+              f"({report['repaired']} repaired, {report['skipped']} dropped"
+              f"{', truncated' if report['truncated'] else ''}"
+              f"{', partial last element kept' if report['tail_recovered'] else ''})")
+    return elements, complete
+
+
+def _continuation_prompt(user_prompt: str, elements: list) -> str:
+    """Ask only for the part of the diagram a truncated response didn't reach."""
+    done = json.dumps(elements, ensure_ascii=False, separators=(",", ":"))
+    return (
+        f"{user_prompt}\n\n"
+        f"A previous answer was cut off after these {len(elements)} elements:\n{done}\n\n"
+        "Continue the same diagram: return ONLY the remaining elements as a JSON array, "
+        "laid out consistently with the ones above. Do not repeat any id above; "
+        "return [] if the diagram is already complete."
+    )
+
+
+def _merge_continuation(elements: list, more: list) -> list:
+    seen = {el.get("id") for el in elements}
+    return elements + [el for el in more if el.get("id") not in seen]
+
+
+@timing.timed("gemini.generate_content")
+def _request(client: "genai.Client", contents: str, config, system_prompt: str,
+             scheduler: GeminiScheduler):
+    """generate_content under the scheduler's retry / timeout / rate-limit policy."""
+    return scheduler.call(
+        lambda timeout: client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=contents,
+            config=with_timeout(config, timeout),
+        ),
+        tokens=estimate_tokens(system_prompt, contents),
+        label="generate_content",
+    )
+
+
+@timing.timed("gemini.generate_content")
+async def _arequest(client, contents: str, config, system_prompt: str, scheduler: GeminiScheduler):
+    return await scheduler.acall(
+        lambda timeout: client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=contents,
+            config=with_timeout(config, timeout),
+        ),
+        tokens=estimate_tokens(system_prompt, contents),
+        label="generate_content",
+    )
+
+
+@timing.timed("generate_elements")
+def generate_elements(user_prompt: str, system_prompt: str, verbose: bool = True,
+                      cache: ResponseCache = None, refresh: bool = False,
+                      client: "genai.Client" = None,
+                      context_cache: PromptContextCache = None, continuations: int = 0,
+                      scheduler: GeminiScheduler = None) -> list:
+    """
+    One Gemini call → raw element list. A damaged response is salvaged; if it
+    was truncated, Gemini is asked for just the missing tail up to
+    `continuations` times. Only complete results are cached. Calls go
+    through `scheduler` (default: retries + timeouts, no rate limits).
+    """
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = _cached_elements(cache, key, refresh, verbose)
+    if cached is not None:
+        return cached
+
+    client = client or get_client(GEMINI_API_KEY)
+    scheduler = scheduler or default_scheduler()
+    if verbose:
+        print(f"[1/2] Sending to Gemini ({GEMINI_MODEL})...")
+    config = _generation_config(system_prompt, context_cache)
+    response = _request(client, user_prompt, config, system_prompt, scheduler)
+    elements, complete = _parse_response(response.text, verbose)
+
+    for attempt in range(continuations):
+        if complete:
+            break
+        if verbose:
+            print(f"      ↻ Asking Gemini to continue after {len(elements)} elements ({attempt + 1}/{continuations})...")
+        response = _request(client, _continuation_prompt(user_prompt, elements), config,
+                            system_prompt, scheduler)
+        more, complete = _parse_response(response.text, verbose)
+        elements = _merge_continuation(elements, more)
+
+    if cache is not None and complete:
+        cache.put(key, elements)
+    return elements
+
+
+@timing.timed("generate_elements")
+async def agenerate_elements(user_prompt: str, system_prompt: str, verbose: bool = True,
+                             cache: ResponseCache = None, refresh: bool = False,
+                             client=None, context_cache: PromptContextCache = None,
+                             continuations: int = 0, scheduler: GeminiScheduler = None) -> list:
+    """
+    Async generate_elements over the shared client's keep-alive connections.
+    Parsing and the response cache run in threads, so a large response
+    doesn't stall the event loop.
+    """
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = await _acached_elements(cache, key, refresh, verbose)
+    if cached is not None:
+        return cached
+
+    client = client or get_async_client(GEMINI_API_KEY)
+    scheduler = scheduler or default_scheduler()
+    if verbose:
+        print(f"[1/2] Sending to Gemini ({GEMINI_MODEL})...")
+    # Creating / refreshing a context cache is a blocking call — keep it off the loop
+    config = await asyncio.to_thread(_generation_config, system_prompt, context_cache)
+    response = await _arequest(client, user_prompt, config, system_prompt, scheduler)
+    elements, complete = await asyncio.to_thread(_parse_response, response.text, verbose)
+
+    for attempt in range(continuations):
+        if complete:
+            break
+        if verbose:
+            print(f"      ↻ Asking Gemini to continue after {len(elements)} elements ({attempt + 1}/{continuations})...")
+        response = await _arequest(client, _continuation_prompt(user_prompt, elements), config,
+                                   system_prompt, scheduler)
+        more, complete = await asyncio.to_thread(_parse_response, response.text, verbose)
+        elements = _merge_continuation(elements, more)
+
+    if cache is not None and complete:
+        await asyncio.to_thread(cache.put, key, elements)
+    return elements
+
+
+@timing.timed("json.parse")
+def _parse_topology(text: str, verbose: bool) -> dict:
+    raw = (text or "").strip()
+    try:
+        topology = json.loads(raw)
+    except json.JSONDecodeError:
+        topology = json.loads(strip_trailing_commas(raw))
+    if not isinstance(topology, dict) or not isinstance(topology.get("nodes"), list):
+        raise ValueError("Gemini returned no 'nodes' list for the topology")
+    if verbose:
+        print(f"      ✔ Parsed {len(topology['nodes'])} nodes, {len(topology.get('edges') or [])} edges "
+              f"({len(raw)} chars) from Gemini")
+    return topology
+
+
+@timing.timed("generate_topology")
+def generate_topology(user_prompt: str, system_prompt: str, verbose: bool = True,
+                      cache: ResponseCache = None, refresh: bool = False,
+                      client: "genai.Client" = None,
+                      context_cache: PromptContextCache = None,
+                      scheduler: GeminiScheduler = None) -> dict:
+    """One Gemini call → {"groups", "nodes", "edges"} for auto_layout (system_prompt from get_topology_prompt)."""
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = _cached_elements(cache, key, refresh, False)
+    if cached is not None:
+        if verbose:
+            print(f"[1/2] Cache hit — {len(cached['nodes'])} nodes, no Gemini call")
+        return cached
+
+    client = client or get_client(GEMINI_API_KEY)
+    scheduler = scheduler or default_scheduler()
+    if verbose:
+        print(f"[1/2] Sending to Gemini ({GEMINI_MODEL}), topology only...")
+    config = _generation_config(system_prompt, context_cache, topology_schema())
+    response = _request(client, user_prompt, config, system_prompt, scheduler)
+    topology = _parse_topology(response.text, verbose)
+    if cache is not None:
+        cache.put(key, topology)
+    return topology
+
+
+@timing.timed("generate_topology")
+async def agenerate_topology(user_prompt: str, system_prompt: str, verbose: bool = True,
+                             cache: ResponseCache = None, refresh: bool = False,
+                             client=None, context_cache: PromptContextCache = None,
+                             scheduler: GeminiScheduler = None) -> dict:
+    """Async generate_topology over the shared client (parsing and cache in threads)."""
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = await _acached_elements(cache, key, refresh, False)
+    if cached is not None:
+        if verbose:
+            print(f"[1/2] Cache hit — {len(cached['nodes'])} nodes, no Gemini call")
+        return cached
+
+    client = client or get_async_client(GEMINI_API_KEY)
+    scheduler = scheduler or default_scheduler()
+    if verbose:
+        print(f"[1/2] Sending to Gemini ({GEMINI_MODEL}), topology only...")
+    config = await asyncio.to_thread(_generation_config, system_prompt, context_cache, topology_schema())
+    response = await _arequest(client, user_prompt, config, system_prompt, scheduler)
+    topology = await asyncio.to_thread(_parse_topology, response.text, verbose)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, topology)
+    return topology
+
+
+def layout_topology(diagram_type: str, topology: dict, verbose: bool = True) -> list:
+    """auto_layout → normalize_elements. The geometry is already exact, so the
+    Gemini-quirk fixes of arrows / lines (tall arrows → lifelines, points
+    resynced to width / height) are skipped."""
+    if verbose:
+        print(f"[2/2] Laying out {diagram_type} locally")
+    with timing.span("auto_layout", nodes=len(topology.get("nodes") or [])):
+        elements = auto_layout.layout(diagram_type, topology)
+    return _normalize(elements, geometry=False)
+
+
+def generate_elements_stream(user_prompt: str, system_prompt: str, verbose: bool = True,
+                             cache: ResponseCache = None, refresh: bool = False,
+                             client: "genai.Client" = None,
+                             context_cache: PromptContextCache = None,
+                             scheduler: GeminiScheduler = None):
+    """
+    Streaming variant of generate_elements: yields each raw element as soon as
+    its JSON object closes in Gemini's streamed output. The scheduler only
+    rate-limits streams; elements already yielded can't be retried.
+    """
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = _cached_elements(cache, key, refresh, verbose)
+    if cached is not None:
+        yield from cached
+        return
+
+    client = client or get_client(GEMINI_API_KEY)
+    if verbose:
+        print(f"[1/2] Streaming from Gemini ({GEMINI_MODEL})...")
+    (scheduler or default_scheduler()).throttle(estimate_tokens(system_prompt, user_prompt))
+    stream = client.models.generate_content_stream(
         model=GEMINI_MODEL,
         contents=user_prompt,
-        config=types.GenerateContentConfig(
-            system_instruction=system_prompt,
-        ),
+        config=_generation_config(system_prompt, context_cache),
     )
-    raw = response.text.strip()
-    # Strip accidental markdown fences
-    raw = re.sub(r"^```(?:json)?\s*", "", raw, flags=re.MULTILINE)
-    raw = re.sub(r"```\s*$",          "", raw, flags=re.MULTILINE)
-    raw = raw.strip()
+    parser = RepairingParser()
+    start = time.perf_counter()
+    received = []
+    for chunk in stream:
+        for element in parser.feed(chunk.text or ""):
+            if verbose and parser.count == 1:
+                print(f"      ✔ First element after {time.perf_counter() - start:.2f}s")
+            # Cache a copy — downstream sanitizing mutates the yielded dict
+            received.append(json.loads(json.dumps(element)))
+            yield element
 
-    print(f"\n── Raw Gemini output (first 500 chars) ─────\n{raw[:500]}\n────────────────────────────────────────────\n")
+    tail = parser.salvage_tail()
+    if tail is not None:
+        received.append(json.loads(json.dumps(tail)))
+        yield tail
+    _finish_stream(parser, start, received, verbose, cache, key)
 
-    elements = json.loads(raw)   # raises if Gemini returned bad JSON
-    print(f"      ✔ Parsed {len(elements)} raw elements from Gemini")
 
-    
+async def agenerate_elements_stream(user_prompt: str, system_prompt: str, verbose: bool = True,
+                                    cache: ResponseCache = None, refresh: bool = False,
+                                    client=None, context_cache: PromptContextCache = None,
+                                    scheduler: GeminiScheduler = None):
+    """Async generate_elements_stream on the shared async client (cache in threads)."""
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    cached = await _acached_elements(cache, key, refresh, verbose)
+    if cached is not None:
+        for element in cached:
+            yield element
+        return
 
+    client = client or get_async_client(GEMINI_API_KEY)
+    if verbose:
+        print(f"[1/2] Streaming from Gemini ({GEMINI_MODEL})...")
+    config = await asyncio.to_thread(_generation_config, system_prompt, context_cache)
+    await (scheduler or default_scheduler()).athrottle(estimate_tokens(system_prompt, user_prompt))
+    stream = await client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=user_prompt,
+        config=config,
+    )
+    parser = RepairingParser()
+    start = time.perf_counter()
+    received = []
+    async for chunk in stream:
+        for element in parser.feed(chunk.text or ""):
+            if verbose and parser.count == 1:
+                print(f"      ✔ First element after {time.perf_counter() - start:.2f}s")
+            received.append(json.loads(json.dumps(element)))
+            yield element
+
+    tail = parser.salvage_tail()
+    if tail is not None:
+        received.append(json.loads(json.dumps(tail)))
+        yield tail
+    await asyncio.to_thread(_finish_stream, parser, start, received, verbose, cache, key)
+
+
+def _finish_stream(parser: RepairingParser, start: float, received: list, verbose: bool,
+                   cache: ResponseCache, key: str) -> None:
+    timing.record("gemini.stream", time.perf_counter() - start, elements=parser.count)
+    if verbose:
+        print(f"      ✔ Streamed {parser.count} raw elements from Gemini in {time.perf_counter() - start:.2f}s")
+    if parser.repaired:
+        print(f"      ⚠ Repaired {parser.repaired} malformed element(s)")
+    if parser.skipped:
+        print(f"      ⚠ Skipped {parser.skipped} malformed element(s)")
+    if parser.truncated:
+        print("      ⚠ Gemini output ended before the closing ']' — diagram may be incomplete"
+              + (" (partial last element kept)" if parser.tail_recovered else ""))
+    elif cache is not None and not parser.skipped:
+        cache.put(key, received)
+
+
+# ─────────────────────────────────────────────
+# Step 2: sanitize + write .excalidraw file
+# ─────────────────────────────────────────────
+def build_excalidraw_file(elements: list) -> dict:
+    return {
+        "type": "excalidraw",
+        "version": 2,
+        "source": "https://fastapi-gemini-app.com",
+        "elements": elements,
+        "appState": {"viewBackgroundColor": "#ffffff"},
+        "files": {}
+    }
+
+
+def fix_layout(elements: list, min_gap: float = 20, verbose: bool = True) -> list:
+    """Nudge overlapping / crowded shapes apart (min_gap=None skips the check)."""
+    if min_gap is None:
+        return elements
+    with timing.span("layout_repair", elements=len(elements)):
+        report = repair_layout(elements, min_gap=min_gap)
+    if verbose and (report["overlaps"] or report["spacing"]):
+        left = f", {report['remaining']} left" if report["remaining"] else ""
+        print(f"      ↔ Moved {report['moved']} shapes ({report['overlaps']} overlaps, "
+              f"{report['spacing']} closer than {min_gap:g}px{left})")
     return elements
 
 
+def fix_arrows(elements: list, verbose: bool = True) -> list:
+    """Snap bound arrow ends onto their shapes and fill in boundElements."""
+    with timing.span("bindings", elements=len(elements)):
+        report = resolve_bindings(elements)
+    if verbose and (report["snapped"] or report["dangling"]):
+        dangling = f", {report['dangling']} dangling bindings dropped" if report["dangling"] else ""
+        print(f"      🔗 Snapped {report['snapped']} arrow ends onto their shapes{dangling}")
+    return elements
+
+
+def finish_elements(elements: list, min_gap: float = 20, verbose: bool = True) -> list:
+    """fix_layout → fix_arrows, the last steps of every pipeline."""
+    return fix_arrows(fix_layout(elements, min_gap, verbose), verbose)
+
+
+def _normalize(elements: list, geometry: bool = True) -> list:
+    with timing.span("normalize", elements=len(elements)):
+        return normalize_elements(elements, geometry)
+
+
+@timing.timed("export.write")
+def write_excalidraw(elements: list, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(build_excalidraw_file(elements), f, ensure_ascii=False)
+
+
+def run_pipeline(user_prompt: str, diagram_type: str = None, verbose: bool = True,
+                 stream: bool = False, cache: ResponseCache = None, refresh: bool = False,
+                 context_cache: PromptContextCache = None, continuations: int = 0,
+                 scheduler: GeminiScheduler = None, min_gap: float = 20, layout: str = "model") -> list:
+    """
+    detect_diagram_type → generate_elements → normalize_elements (sanitize + fix)
+    → fix_layout → fix_arrows. With stream=True each element is sanitized as
+    soon as Gemini emits it (continuations only apply to the non-streaming call).
+    With layout="local" Gemini returns only the topology and auto_layout places
+    it (stream and continuations don't apply).
+    """
+    diagram_type = diagram_type or detect_diagram_type(user_prompt)
+    if layout == "local":
+        topology = generate_topology(user_prompt, get_topology_prompt(diagram_type), verbose=verbose,
+                                     cache=cache, refresh=refresh, context_cache=context_cache,
+                                     scheduler=scheduler)
+        elements = layout_topology(diagram_type, topology, verbose)
+        return finish_elements(elements, min_gap, verbose)
+
+    system_prompt = get_system_prompt(diagram_type)
+
+    if stream:
+        elements = list(iter_normalized(
+            generate_elements_stream(user_prompt, system_prompt, verbose=verbose,
+                                     cache=cache, refresh=refresh,
+                                     context_cache=context_cache, scheduler=scheduler)
+        ))
+        return finish_elements(elements, min_gap, verbose)
+
+    # Step 1 — Gemini
+    elements = generate_elements(user_prompt, system_prompt, verbose=verbose,
+                                 cache=cache, refresh=refresh, context_cache=context_cache,
+                                 continuations=continuations, scheduler=scheduler)
+
+    if verbose:
+        print(f"[2/2] Santize elements")
+    # Step 2 — Sanitize
+    return finish_elements(_normalize(elements), min_gap, verbose)
+
+
+async def arun_pipeline(user_prompt: str, diagram_type: str = None, verbose: bool = True,
+                        cache: ResponseCache = None, refresh: bool = False,
+                        context_cache: PromptContextCache = None, continuations: int = 0,
+                        scheduler: GeminiScheduler = None, min_gap: float = 20, layout: str = "model") -> list:
+    """
+    run_pipeline on the shared async client (no thread per request). The
+    CPU-bound steps (layout, normalize, repair) run in a thread, so a large
+    scene doesn't stall other requests sharing the event loop.
+    """
+    diagram_type = diagram_type or detect_diagram_type(user_prompt)
+    if layout == "local":
+        topology = await agenerate_topology(user_prompt, get_topology_prompt(diagram_type), verbose=verbose,
+                                            cache=cache, refresh=refresh, context_cache=context_cache,
+                                            scheduler=scheduler)
+        elements = await asyncio.to_thread(layout_topology, diagram_type, topology, verbose)
+        return await asyncio.to_thread(finish_elements, elements, min_gap, verbose)
+
+    system_prompt = get_system_prompt(diagram_type)
+    elements = await agenerate_elements(user_prompt, system_prompt, verbose=verbose,
+                                        cache=cache, refresh=refresh, context_cache=context_cache,
+                                        continuations=continuations, scheduler=scheduler)
+    elements = await asyncio.to_thread(_normalize, elements)
+    return await asyncio.to_thread(finish_elements, elements, min_gap, verbose)
+
+
+# ─────────────────────────────────────────────
+# Batch mode: many prompts, bounded concurrency
+# ─────────────────────────────────────────────
+def read_batch(path: str) -> list:
+    """
+    Read batch items from a JSONL file ("-" for stdin).
+    Each line is either a JSON string (the prompt) or an object:
+        {"prompt": "...", "type": "flowchart", "output": "flow.excalidraw"}
+    Only "prompt" is required. Blank lines and lines starting with # are skipped.
+    "output" is relative to --out-dir: absolute paths and paths that leave it
+    are rejected, and so are two items with the same "output" (rather than
+    overwriting each other).
+    """
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    items, outputs = [], {}
+    try:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}") from None
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not isinstance(item, dict) or not isinstance(item.get("prompt"), str) or not item["prompt"]:
+                raise ValueError(f"{path}:{lineno}: expected a prompt string or an object with 'prompt'")
+            if item.get("output"):
+                if not isinstance(item["output"], str):
+                    raise ValueError(f"{path}:{lineno}: output must be a string")
+                output = os.path.normpath(item["output"])
+                if os.path.isabs(output) or output.split(os.sep)[0] == os.pardir:
+                    raise ValueError(f"{path}:{lineno}: output {item['output']!r} is outside --out-dir")
+                if output in outputs:
+                    raise ValueError(f"{path}:{lineno}: output {item['output']!r} "
+                                     f"already used on line {outputs[output]}")
+                outputs[output] = lineno
+            items.append(item)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return items
+
+
+def _slugify(text: str, max_len: int = 40) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_len].rstrip("-") or "diagram"
+
+
+async def run_batch(items: list, out_dir: str, concurrency: int = 4, stream: bool = False,
+                    cache: ResponseCache = None, refresh: bool = False,
+                    context_cache: PromptContextCache = None, continuations: int = 0,
+                    scheduler: GeminiScheduler = None, min_gap: float = 20, layout: str = "model") -> list:
+    """
+    Run run_pipeline for every item with at most `concurrency` Gemini calls
+    in flight, writing one .excalidraw file per item into out_dir.
+    Returns one result dict per item, in input order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    total = len(items)
+
+    async def run_one(index: int, item: dict) -> dict:
+        path = out_dir
+        result = {"index": index, "prompt": item.get("prompt"), "output": path}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                name = item.get("output") or f"{index:04d}-{_slugify(item['prompt'])}.excalidraw"
+                path = result["output"] = os.path.join(out_dir, name)
+                with timing.span("batch.item", index=index):
+                    options = dict(verbose=False, cache=cache, refresh=refresh, context_cache=context_cache,
+                                   continuations=continuations, scheduler=scheduler, min_gap=min_gap,
+                                   layout=layout)
+                    if stream and layout != "local":
+                        elements = await asyncio.to_thread(
+                            functools.partial(run_pipeline, item["prompt"], item.get("type"), stream=True, **options)
+                        )
+                    else:
+                        elements = await arun_pipeline(item["prompt"], item.get("type"), **options)
+                    await asyncio.to_thread(write_excalidraw, elements, path)
+                    result.update(ok=True, elements=len(elements))
+            except Exception as e:
+                result.update(ok=False, error=f"{type(e).__name__}: {e}")
+            result["seconds"] = round(time.perf_counter() - start, 3)
+
+        status = f"✔ {result['elements']} elements" if result["ok"] else f"❌ {result['error']}"
+        print(f"[{index + 1}/{total}] {result['seconds']:7.2f}s  {status}  → {path}")
+        return result
+
+    return await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+
+
+def print_batch_summary(results: list, wall_seconds: float) -> None:
+    ok = [r for r in results if r["ok"]]
+    timings = sorted(r["seconds"] for r in results)
+    print("\n── Batch summary ───────────────────────────")
+    print(f"  items:      {len(results)}  (ok={len(ok)}, failed={len(results) - len(ok)})")
+    print(f"  wall time:  {wall_seconds:.2f}s")
+    if timings:
+        print(f"  per item:   min={timings[0]:.2f}s  "
+              f"median={timings[len(timings) // 2]:.2f}s  max={timings[-1]:.2f}s")
+        print(f"  throughput: {len(results) / wall_seconds:.2f} diagrams/s")
+    print("────────────────────────────────────────────\n")
+
+
+def print_call_summary(scheduler: GeminiScheduler) -> None:
+    stats = scheduler.summary()
+    if not stats["attempts"]:
+        return
+    print("── Gemini calls ────────────────────────────")
+    print(f"  attempts:   {stats['attempts']}  (ok={stats['ok']}, retries={stats['retries']}, "
+          f"hedges={stats['hedges']}, hedge wins={stats['hedge_wins']})")
+    if stats["p50_seconds"] is not None:
+        print(f"  latency:    p50={stats['p50_seconds']:.2f}s  p95={stats['p95_seconds']:.2f}s")
+    print(f"  throttled:  {stats['throttled_seconds']:.2f}s waiting for rate limits")
+    if stats["errors"]:
+        print("  errors:     " + ", ".join(f"{k}×{v}" for k, v in stats["errors"].items()))
+    print("────────────────────────────────────────────\n")
 
 
 # ─────────────────────────────────────────────
@@ -94,42 +678,99 @@ def main():
     parser.add_argument("--prompt",  "-p", type=str, default=None)
     parser.add_argument("--session", "-s", type=str, default="gemini-diagram")
     parser.add_argument("--output",  "-o", type=str, default=None)
+    parser.add_argument("--batch",   "-b", type=str, default=None,
+                        help="JSONL file of prompts to render ('-' for stdin)")
+    parser.add_argument("--out-dir",       type=str, default="diagrams",
+                        help="directory for batch outputs")
+    parser.add_argument("--concurrency", "-j", type=int, default=4,
+                        help="max concurrent Gemini calls in batch mode")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream Gemini output and sanitize elements as they arrive")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't read or write the on-disk response cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore cached responses but store the new ones")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="cache the per-type system prompt with Gemini context caching")
+    parser.add_argument("--continue", dest="continuations", type=int, default=1, metavar="N",
+                        help="ask Gemini up to N times for the rest of a truncated response (0 = off)")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="client-side limit on Gemini requests per minute")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="client-side limit on Gemini input tokens per minute")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="attempts per Gemini call on 429 / 5xx / timeouts")
+    parser.add_argument("--deadline", type=float, default=300.0,
+                        help="seconds a Gemini call may take including retries")
+    parser.add_argument("--hedge-after", type=float, default=None,
+                        help="send a duplicate request if the first hasn't answered after this many seconds")
+    parser.add_argument("--layout", choices=("model", "local"), default="model",
+                        help="'local': Gemini returns only nodes / edges and auto_layout places them")
+    parser.add_argument("--min-gap", type=float, default=20.0,
+                        help="minimum spacing (px) enforced between shapes after generation")
+    parser.add_argument("--no-layout-fix", action="store_true",
+                        help="leave overlapping / crowded shapes where Gemini put them")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a per-stage timing breakdown and append it to --profile-out")
+    parser.add_argument("--profile-out", type=str, default="profile.jsonl",
+                        help="JSON-lines file for --profile spans")
+    parser.add_argument("--cprofile", type=str, default=None, metavar="PATH",
+                        help="also run under cProfile and dump stats to PATH")
     args = parser.parse_args()
 
+    if args.profile:
+        timing.enable()
+    try:
+        with timing.cprofile(args.cprofile):
+            _run(args)
+    finally:
+        if args.profile:
+            timing.print_report()
+            written = timing.write_jsonl(args.profile_out)
+            print(f"      ✔ {written} spans → {args.profile_out}")
+
+
+def _run(args) -> None:
+    load_env()
     if GEMINI_API_KEY == "YOUR_GEMINI_API_KEY_HERE":
         sys.exit("❌  Set GEMINI_API_KEY environment variable.")
 
+    cache = None if args.no_cache else ResponseCache()
+    context_cache = PromptContextCache(get_client(GEMINI_API_KEY), GEMINI_MODEL) if args.context_cache else None
+    scheduler = GeminiScheduler(rpm=args.rpm, tpm=args.tpm, max_attempts=args.max_attempts,
+                                deadline=args.deadline, hedge_after=args.hedge_after)
+    min_gap = None if args.no_layout_fix else args.min_gap
+
+    if args.batch:
+        try:
+            items = read_batch(args.batch)
+        except (OSError, ValueError) as e:
+            sys.exit(f"❌  {e}")
+        if not items:
+            sys.exit("❌  No prompts in batch input.")
+        print(f"Rendering {len(items)} prompts (concurrency={args.concurrency})...")
+        start = time.perf_counter()
+        try:
+            results = asyncio.run(run_batch(items, args.out_dir, args.concurrency, args.stream,
+                                          cache, args.refresh, context_cache, args.continuations,
+                                          scheduler, min_gap, args.layout))
+        except KeyboardInterrupt:
+            sys.exit("\n👋 Cancelled.")
+        print_batch_summary(results, time.perf_counter() - start)
+        print_call_summary(scheduler)
+        if not all(r["ok"] for r in results):
+            sys.exit(1)
+        return
+
     user_prompt = args.prompt or input("📝 Enter diagram description: ").strip()
     if not user_prompt:
         sys.exit("❌  No prompt provided.")
 
+    elements = run_pipeline(user_prompt, stream=args.stream, cache=cache, refresh=args.refresh,
+                            context_cache=context_cache, continuations=args.continuations,
+                            scheduler=scheduler, min_gap=min_gap, layout=args.layout)
 
-    
-    diagram_type = detect_diagram_type(user_prompt)   # or pass explicitly
-    system_prompt = get_system_prompt(diagram_type)
-
-    # Step 1 — Gemini
-    elements = generate_elements(user_prompt,system_prompt)
-    
-    print(f"[2/2] Santize elements")
-    # Step 2 — Sanitize
-    elements = sanitize_elements(elements)
-    
-    elements = fix_elements(elements) 
-
-    excalidraw_file = {
-            "type": "excalidraw",
-            "version": 2,
-            "source": "https://fastapi-gemini-app.com",
-            "elements": elements,
-            "appState": {"viewBackgroundColor": "#ffffff"},
-            "files": {}
-        }
-    
-    with open("arch.excalidraw", "w") as f:
-        json.dump(excalidraw_file, f, ensure_ascii=False)
-   
-
+    write_excalidraw(elements, args.output or "arch.excalidraw")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+json_repair.py
+--------------
+Salvage for damaged Gemini element arrays.
+
+A response cut off by the token limit, or one stray trailing comma, makes
+json.loads reject the whole array even though almost every element in it
+is fine. salvage_elements recovers every complete element instead:
+
+  - complete objects are pulled out one by one (ElementStreamParser), so
+    a missing closing "]" or garbage after the array doesn't matter
+  - array items that aren't objects (numbers, strings, nested arrays) are
+    skipped, in valid arrays too
+  - objects with trailing commas ("{..., }", "[1, 2, ]") are retried with
+    the commas removed
+  - the truncated tail object is cut back to its last complete key/value
+    pair and closed, and kept if it still has id / type / geometry
+
+Usage:
+    elements, report = salvage_elements(raw)
+    if report["truncated"]:
+        ...   # ask the model for the rest (see gemini_to_excalidraw_no_mcp)
+"""
+import json
+import re
+
+from element_schema import REQUIRED_FIELDS
+from element_stream import ElementStreamParser
+
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket, leaving strings untouched."""
+    out, last = [], 0
+    for m in _STRING.finditer(text):
+        out.append(_TRAILING_COMMA.sub(r"\1", text[last:m.start()]))
+        out.append(m.group())
+        last = m.end()
+    out.append(_TRAILING_COMMA.sub(r"\1", text[last:]))
+    return "".join(out)
+
+
+def close_truncated_object(text: str):
+    """
+    Best-effort element from an object cut off mid-way: keep the pairs up to
+    its last top-level comma (each of those is complete) and close it.
+    Returns None if what is left isn't a usable element.
+    """
+    depth, in_string, escaped, cut = 0, False, False, None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            depth -= 1
+        elif ch == "," and depth == 1:
+            cut = i
+    if cut is None:
+        return None
+    try:
+        element = json.loads(strip_trailing_commas(text[:cut] + "}"))
+    except ValueError:
+        return None
+    if not isinstance(element, dict) or any(key not in element for key in REQUIRED_FIELDS):
+        return None
+    return element
+
+
+class RepairingParser(ElementStreamParser):
+    """ElementStreamParser that repairs trailing commas and can salvage the truncated tail."""
+
+    def __init__(self):
+        super().__init__()
+        self.repaired = 0          # objects that only parsed after repair
+        self.tail_recovered = False
+
+    def _decode(self, text: str):
+        try:
+            element = json.loads(text)
+        except ValueError:
+            try:
+                element = json.loads(strip_trailing_commas(text))
+            except ValueError:
+                self.skipped += 1
+                return None
+            self.repaired += 1
+        if not isinstance(element, dict):
+            self.skipped += 1
+            return None
+        self.count += 1
+        return element
+
+    def salvage_tail(self):
+        """Once the input has ended: the partial element it stopped in, if recoverable."""
+        if not self.truncated or self._obj_start is None or self.tail_recovered:
+            return None
+        element = close_truncated_object(self._buf[self._obj_start:])
+        if element is not None:
+            self.tail_recovered = True
+            self.count += 1
+        return element
+
+    def report(self) -> dict:
+        return {
+            "elements": self.count,
+            "repaired": self.repaired,
+            "skipped": self.skipped,
+            "truncated": self.truncated,
+            "tail_recovered": self.tail_recovered,
+        }
+
+
+def salvage_elements(raw: str):
+    """
+    Parse a (possibly damaged) JSON array of elements.
+    Returns (elements, report); report["elements"] is the number recovered.
+    Raises ValueError if nothing could be recovered.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        elements = [el for el in data if isinstance(el, dict)]
+        if data and not elements:
+            raise ValueError(f"no element objects in model output ({len(data)} items)")
+        return elements, {"elements": len(elements), "repaired": 0, "skipped": len(data) - len(elements),
+                          "truncated": False, "tail_recovered": False}
+
+    parser = RepairingParser()
+    elements = parser.feed(raw)
+    tail = parser.salvage_tail()
+    if tail is not None:
+        elements.append(tail)
+    if not elements:
+        raise ValueError(f"no complete elements in model output ({len(raw)} chars)")
+    return elements, parser.report()
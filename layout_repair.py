@@ -0,0 +1,330 @@
+"""
+layout_repair.py
+----------------
+Post-generation layout check and repair for Excalidraw scenes.
+
+The type rules ask Gemini for minimum spacing and no overlapping shapes,
+but nothing enforced it. This module finds shapes (rectangle / ellipse /
+diamond) that overlap or sit closer than `min_gap`, and nudges them apart
+deterministically.
+
+Candidate pairs come from a uniform grid over bounding boxes, so only
+shapes sharing a cell are compared. That is roughly linear for diagram-like
+scenes, instead of comparing all n² pairs.
+
+Containment is intentional (lanes, tiers, boundaries, class bodies), so a
+shape fully inside another is never a conflict. Neither are shapes drawn
+edge to edge, such as ERD header / body stacks or adjacent swimlanes. Each element's owner is the
+smallest shape containing it:
+  - when a shape moves, everything it owns moves with it (nested shapes and
+    text labels)
+  - the ends of arrows / lines that touch a moved shape follow it
+  - a moved shape is kept inside its owner whenever there is a move that
+    allows it
+
+Usage:
+    from layout_repair import find_layout_issues, repair_layout
+
+    issues = find_layout_issues(elements, min_gap=20)
+    report = repair_layout(elements, min_gap=20)   # mutates elements in place
+"""
+from collections import defaultdict
+from itertools import combinations
+
+SHAPE_TYPES = ("rectangle", "ellipse", "diamond")
+LINEAR_TYPES = ("arrow", "line")
+
+# How close (px) an arrow end must be to a shape's box to count as attached
+_SNAP = 12
+# Shapes whose edges meet within this (px) are drawn flush on purpose
+_FLUSH = 1
+
+
+def _box(el: dict) -> list:
+    x, y = el.get("x", 0), el.get("y", 0)
+    w, h = el.get("width", 0), el.get("height", 0)
+    return [min(x, x + w), min(y, y + h), max(x, x + w), max(y, y + h)]
+
+
+def _area(box) -> float:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _contains(outer, inner) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _gaps(a, b):
+    """Signed horizontal / vertical gaps between two boxes (negative = projections overlap)."""
+    return max(b[0] - a[2], a[0] - b[2]), max(b[1] - a[3], a[1] - b[3])
+
+
+class SpatialGrid:
+    """Uniform grid bucketing boxes by the cells they cover."""
+
+    def __init__(self, cell: float):
+        self.cell = max(float(cell), 1.0)
+        self.cells = defaultdict(list)
+
+    def _span(self, lo: float, hi: float) -> range:
+        return range(int(lo // self.cell), int(hi // self.cell) + 1)
+
+    def insert(self, key, box, margin: float = 0.0) -> None:
+        for cx in self._span(box[0] - margin, box[2] + margin):
+            for cy in self._span(box[1] - margin, box[3] + margin):
+                self.cells[(cx, cy)].append(key)
+
+    def at(self, x: float, y: float) -> list:
+        return self.cells.get((int(x // self.cell), int(y // self.cell)), [])
+
+    def query(self, box, margin: float = 0.0) -> set:
+        """Keys in any cell the box (grown by margin) covers."""
+        out = set()
+        for cx in self._span(box[0] - margin, box[2] + margin):
+            for cy in self._span(box[1] - margin, box[3] + margin):
+                out.update(self.cells.get((cx, cy), ()))
+        return out
+
+    def pairs(self) -> set:
+        """Every (a, b) pair, a < b, sharing at least one cell."""
+        out = set()
+        for members in self.cells.values():
+            if len(members) > 1:
+                for a, b in combinations(members, 2):
+                    out.add((a, b) if a < b else (b, a))
+        return out
+
+
+def _cell_size(boxes: list, min_gap: float) -> float:
+    sizes = sorted(max(b[2] - b[0], b[3] - b[1]) for b in boxes)
+    median = sizes[len(sizes) // 2] if sizes else 100
+    return max(median + min_gap, 50)
+
+
+class _Scene:
+    """Shapes of a scene with their boxes, owners and attached elements."""
+
+    def __init__(self, elements: list, min_gap: float):
+        self.elements = elements
+        self.min_gap = min_gap
+        self.shapes = [i for i, el in enumerate(elements)
+                       if el.get("type") in SHAPE_TYPES and not el.get("isDeleted")]
+        self.boxes = {i: _box(elements[i]) for i in self.shapes}
+        self.owner = {}                      # element index -> owning shape index
+        self.children = defaultdict(list)    # shape index -> owned element indexes
+        self._find_owners()
+
+    def _smallest_shape_at(self, x: float, y: float, grid: SpatialGrid, exclude=None, fits=None):
+        best, best_area = None, None
+        for j in grid.at(x, y):
+            if j == exclude:
+                continue
+            box = self.boxes[j]
+            if fits is not None and not (_contains(box, fits) and box != fits):
+                continue
+            if fits is None and not (box[0] <= x <= box[2] and box[1] <= y <= box[3]):
+                continue
+            area = _area(box)
+            if best is None or area < best_area or (area == best_area and j < best):
+                best, best_area = j, area
+        return best
+
+    def _find_owners(self) -> None:
+        grid = SpatialGrid(_cell_size(list(self.boxes.values()), self.min_gap))
+        for i in self.shapes:
+            grid.insert(i, self.boxes[i])
+        for i in self.shapes:
+            box = self.boxes[i]
+            # Any cell the shape touches holds every shape that contains it
+            owner = self._smallest_shape_at(box[0], box[1], grid, exclude=i, fits=box)
+            if owner is not None and not _contains(box, self.boxes[owner]):
+                self._own(owner, i)
+        by_id = {self.elements[i].get("id"): i for i in self.shapes}
+        for i, el in enumerate(self.elements):
+            if el.get("type") != "text":
+                continue
+            owner = by_id.get(el.get("containerId"))
+            if owner is None:
+                box = _box(el)
+                owner = self._smallest_shape_at((box[0] + box[2]) / 2, (box[1] + box[3]) / 2, grid)
+            if owner is not None:
+                self._own(owner, i)
+        self.grid = grid
+
+    def _own(self, owner: int, i: int) -> None:
+        self.owner[i] = owner
+        self.children[owner].append(i)
+
+    def is_ancestor(self, a: int, b: int) -> bool:
+        while b in self.owner:
+            b = self.owner[b]
+            if b == a:
+                return True
+        return False
+
+    def subtree(self, i: int) -> list:
+        out, stack = [], [i]
+        while stack:
+            j = stack.pop()
+            out.append(j)
+            stack.extend(self.children.get(j, ()))
+        return out
+
+    def depth(self, i: int) -> int:
+        d = 0
+        while i in self.owner:
+            i = self.owner[i]
+            d += 1
+        return d
+
+    def _conflict(self, a: int, b: int, box_a, box_b):
+        """(kind, gap) if a and b overlap or sit closer than min_gap, else None."""
+        if self.is_ancestor(a, b) or self.is_ancestor(b, a):
+            return None
+        gx, gy = _gaps(box_a, box_b)
+        gap = max(gx, gy)
+        if abs(gap) <= _FLUSH:
+            return None     # edge to edge on purpose: stacked compartments, adjacent lanes
+        if gap < 0:
+            return "overlap", gap
+        if gap < self.min_gap:
+            return "spacing", gap
+        return None
+
+    def conflicts(self) -> list:
+        grid = SpatialGrid(self.grid.cell)
+        for i in self.shapes:
+            grid.insert(i, self.boxes[i], margin=self.min_gap / 2)
+        found = []
+        for a, b in sorted(grid.pairs()):
+            hit = self._conflict(a, b, self.boxes[a], self.boxes[b])
+            if hit:
+                found.append((a, b) + hit)
+        return found
+
+    def conflicts_with(self, i: int, grid: SpatialGrid, box=None) -> list:
+        """Shapes in `grid` that `i` (optionally at `box`) conflicts with, sorted by index."""
+        box = box or self.boxes[i]
+        return sorted(j for j in grid.query(box, margin=self.min_gap / 2)
+                      if self._conflict(i, j, box, self.boxes[j]))
+
+
+def find_layout_issues(elements: list, min_gap: float = 20) -> list:
+    """Overlapping or too-close shape pairs: [{"a", "b", "kind", "gap"}], in a stable order."""
+    scene = _Scene(elements, min_gap)
+    return [
+        {"a": elements[a].get("id"), "b": elements[b].get("id"), "kind": kind, "gap": gap}
+        for a, b, kind, gap in scene.conflicts()
+    ]
+
+
+def _moves(fixed, box, gap: float) -> list:
+    """(dx, dy) candidates that separate `box` from `fixed` by `gap`, in preference order."""
+    return [
+        (fixed[2] + gap - box[0], 0),   # right
+        (0, fixed[3] + gap - box[1]),   # down
+        (fixed[0] - gap - box[2], 0),   # left
+        (0, fixed[1] - gap - box[3]),   # up
+    ]
+
+
+def _shift(box, dx: float, dy: float) -> list:
+    return [box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy]
+
+
+def repair_layout(elements: list, min_gap: float = 20, max_tries: int = 8) -> dict:
+    """
+    Nudge shapes apart so no two overlap or sit closer than min_gap.
+    Mutates elements in place; returns a report.
+
+    Shapes are placed one at a time, outermost first, then top-to-bottom and
+    left-to-right. A shape that conflicts with an already placed one takes the
+    smallest of four moves (right / down / left / up) that clears it, preferring
+    moves that keep it inside its owner and clear of every placed shape. After
+    max_tries moves it stays where it is and is counted in "remaining".
+    """
+    scene = _Scene(elements, min_gap)
+    issues = scene.conflicts()
+    report = {"overlaps": sum(1 for c in issues if c[2] == "overlap"), "spacing": 0,
+              "moved": 0, "remaining": 0}
+    report["spacing"] = len(issues) - report["overlaps"]
+    if not issues:
+        return report
+
+    # Arrow / line ends attached to shapes, found before anything moves
+    attached = {}
+    for i, el in enumerate(elements):
+        if el.get("type") in LINEAR_TYPES and el.get("points"):
+            attached[i] = [_attachment(scene, el, p) for p in (el["points"][0], el["points"][-1])]
+
+    delta = defaultdict(lambda: [0.0, 0.0])     # element index -> accumulated move
+    placed = SpatialGrid(scene.grid.cell)
+    order = sorted(scene.shapes, key=lambda i: (scene.depth(i), scene.boxes[i][1], scene.boxes[i][0], i))
+    for i in order:
+        for _ in range(max_tries):
+            box = scene.boxes[i]
+            hits = scene.conflicts_with(i, placed)
+            if not hits:
+                break
+            owner_box = scene.boxes.get(scene.owner.get(i))
+            candidates = _moves(scene.boxes[hits[0]], box, min_gap)
+            inside = [m for m in candidates if owner_box is None or _contains(owner_box, _shift(box, *m))]
+            pool = inside or candidates
+            free = [m for m in pool if not scene.conflicts_with(i, placed, _shift(box, *m))]
+            if not free:
+                # Crowded: clear every current hit at once, right or down
+                boxes = [scene.boxes[j] for j in hits]
+                pool = [(max(b[2] for b in boxes) + min_gap - box[0], 0),
+                        (0, max(b[3] for b in boxes) + min_gap - box[1])]
+            dx, dy = min(free or pool, key=lambda m: abs(m[0]) + abs(m[1]))
+            for j in scene.subtree(i):
+                if j in scene.boxes:
+                    scene.boxes[j] = _shift(scene.boxes[j], dx, dy)
+                delta[j][0] += dx
+                delta[j][1] += dy
+        placed.insert(i, scene.boxes[i], margin=min_gap / 2)
+
+    for i, (dx, dy) in delta.items():
+        if dx or dy:
+            elements[i]["x"] = elements[i].get("x", 0) + dx
+            elements[i]["y"] = elements[i].get("y", 0) + dy
+            report["moved"] += elements[i].get("type") in SHAPE_TYPES
+    for i, (start, end) in attached.items():
+        _follow(elements[i], delta.get(start), delta.get(end))
+    report["remaining"] = len(scene.conflicts())
+    return report
+
+
+def _attachment(scene: _Scene, el: dict, point) -> int:
+    """Index of the smallest shape whose box (plus a snap margin) holds this end, or None."""
+    x, y = el.get("x", 0) + point[0], el.get("y", 0) + point[1]
+    best, best_area = None, None
+    for j in scene.grid.at(x, y):
+        box = scene.boxes[j]
+        if box[0] - _SNAP <= x <= box[2] + _SNAP and box[1] - _SNAP <= y <= box[3] + _SNAP:
+            area = _area(box)
+            if best is None or area < best_area:
+                best, best_area = j, area
+    return best
+
+
+def _follow(el: dict, start_delta, end_delta) -> None:
+    """Move an arrow's ends with the shapes they touch; interior points move only if both ends agree."""
+    sd = tuple(start_delta) if start_delta else (0.0, 0.0)
+    ed = tuple(end_delta) if end_delta else (0.0, 0.0)
+    if sd == ed == (0.0, 0.0):
+        return
+    x, y = el.get("x", 0), el.get("y", 0)
+    pts = [[x + px, y + py] for px, py in el["points"]]
+    middle = sd if sd == ed else (0.0, 0.0)
+    for k, p in enumerate(pts):
+        d = sd if k == 0 else ed if k == len(pts) - 1 else middle
+        p[0] += d[0]
+        p[1] += d[1]
+    x0, y0 = pts[0]
+    el["x"], el["y"] = x0, y0
+    el["points"] = [[px - x0, py - y0] for px, py in pts]
+    xs = [p[0] for p in el["points"]]
+    ys = [p[1] for p in el["points"]]
+    el["width"] = max(xs) - min(xs)
+    el["height"] = max(ys) - min(ys)
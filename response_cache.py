@@ -0,0 +1,116 @@
+"""
+response_cache.py
+-----------------
+Content-addressed on-disk cache for Gemini diagram generations.
+
+Entries are keyed by a SHA-256 of (model, system prompt, user prompt) and
+hold the parsed element list, so a repeated prompt is answered without a
+network call. Storage is a single SQLite file; entries older than
+`max_age` seconds are dropped, and once the file holds more than
+`max_bytes` of payload the least recently used entries are evicted.
+
+Usage:
+    cache = ResponseCache()
+    key = cache_key(GEMINI_MODEL, system_prompt, user_prompt)
+    elements = cache.get(key)
+    if elements is None:
+        elements = ...   # call Gemini
+        cache.put(key, elements)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "gemini_excalidraw",
+    "responses.sqlite",
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024   # 256 MB of cached payload
+DEFAULT_MAX_AGE   = 30 * 24 * 3600      # 30 days
+
+
+def cache_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Stable hash of everything that determines Gemini's answer."""
+    h = hashlib.sha256()
+    for part in (model, system_prompt, user_prompt):
+        data = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of element lists, safe to share across threads."""
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE):
+        self.path = path or os.getenv("EXCALIDRAW_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str):
+        """Return the cached element list, or None on a miss / expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, elements: list) -> None:
+        payload = json.dumps(elements, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, collecting keys until we're under budget
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,6 +1,8 @@
 import time
 import random
 
+from text_layout import CONTAINER_TYPES, bound_label, fit_text
+
 
 # Default field sets per element type
 BASE_DEFAULTS = {
@@ -99,9 +101,13 @@ def fix_elements(elements: list) -> list:
             if not current_pts or current_pts[-1] != [w, h]:
                 el["points"] = [[0, 0], [w, h]]
 
-        # Fix 3: sync originalText to text
+        # Fix 3: sync originalText to text (bound text keeps its unwrapped original);
+        # free-standing text is sized to its measured text
         if el_type == "text":
-            el["originalText"] = el.get("text", "")
+            if not (el.get("containerId") and el.get("originalText")):
+                el["originalText"] = el.get("text", "")
+            if not el.get("containerId"):
+                fit_text(el)
 
     return elements
 
@@ -144,4 +150,176 @@ def sanitize_element(el: dict) -> dict:
 
 
 def sanitize_elements(elements: list) -> list:
-    return [sanitize_element(el) for el in elements]
\ No newline at end of file
+    """sanitize_element on every element; inline shape labels become bound text right after the shape."""
+    out = []
+    for el in elements:
+        text = bound_label(el) if el.get("type", "rectangle") in CONTAINER_TYPES else None
+        out.append(sanitize_element(el))
+        if text is not None:
+            out.append(sanitize_element(text))
+    return out
+
+# ─────────────────────────────────────────────
+# Normalization engine: sanitize + fix in one traversal
+# ─────────────────────────────────────────────
+# Every element goes through these rules exactly once, in this order:
+#
+#   1. defaults  BASE_DEFAULTS, then TYPE_DEFAULTS for the element's incoming
+#                type ("rectangle" if missing). Only absent keys are filled.
+#   2. type      an "arrow" taller than it is wide is a lifeline: it becomes a
+#                "line" with no arrowheads (compared on |width| / |height|).
+#   3. geometry  arrows/lines only. Negative width/height is moved into x/y
+#                and the points become [[0, 0], [w, h]]. Otherwise points are
+#                kept if they start at the origin and span exactly width ×
+#                height (multi-point paths such as self-calls survive), and
+#                are replaced by [[0, 0], [w, h]] if not.
+#   4. text      text: originalText = text, unless the text is bound to a
+#                container and already has one (the unwrapped original).
+#                Free-standing text gets its measured width / height
+#                (text_layout.fit_text), keeping its textAlign point in place.
+#                rectangle / ellipse / diamond: an inline "label" becomes a
+#                bound text element (text_layout.bound_label), yielded right
+#                after its shape with the text defaults applied.
+#
+# Later rules never undo earlier ones, so the result doesn't depend on how
+# many times (or in what order) the old sanitize/fix passes would have run.
+# Elements whose geometry is already exact (auto_layout's) skip rules 2 and 3:
+# their arrows may point up or left, and their tall edges aren't lifelines.
+_SEED_RANGE = range(1, 1000000)   # same range as random.randint(1, 999999)
+_RANDOM_CHUNK = 1024
+_random_pool = []   # shared by every call, so small batches don't each draw a chunk
+
+
+def _next_random(_) -> int:
+    while True:
+        try:
+            return _random_pool.pop()
+        except IndexError:
+            _random_pool.extend(random.choices(_SEED_RANGE, k=_RANDOM_CHUNK))
+
+
+def _copier(value):
+    """Cheapest copy that keeps elements from sharing a mutable default."""
+    if isinstance(value, dict):
+        return dict.copy
+    if isinstance(value, list):
+        if any(isinstance(v, list) for v in value):
+            return lambda v: [list(p) for p in v]
+        return list.copy
+    return None
+
+
+def _defaults_table(el_type: str, generated: dict) -> tuple:
+    """(key, value, copier) for every default of a type, in apply order."""
+    table = []
+    for key, value in BASE_DEFAULTS.items():
+        if callable(value):
+            table.append((key, None, generated[key]))
+        else:
+            table.append((key, value, _copier(value)))
+    for key, value in TYPE_DEFAULTS.get(el_type, {}).items():
+        table.append((key, value, _copier(value)))
+    return tuple(table)
+
+
+def _spans(points, w, h) -> bool:
+    """True if points start at [0, 0] and their extent is exactly w × h."""
+    try:
+        if len(points) == 2:   # the common case — no extent scan needed
+            return points[0] == [0, 0] and points[1] == [w, h]
+        if not points or list(points[0]) != [0, 0]:
+            return False
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+    except (TypeError, IndexError, KeyError):
+        return False
+    return max(xs) - min(xs) == w and max(ys) - min(ys) == h
+
+
+def normalizer(geometry: bool = True):
+    """
+    One normalization run as a function: normalize(el) applies the rules to
+    el in place and returns [el], or [el, bound text] for a labelled shape.
+    For sources that hand over elements one at a time (an async stream)
+    but should still share one run. geometry=False skips rules 2 and 3.
+
+    Seeds/nonces come from a module-wide pool refilled from the RNG in
+    chunks, and one timestamp is used for the whole run, instead of
+    per-field random/time calls.
+    """
+    now = int(time.time() * 1000)
+    generated = {"seed": _next_random, "versionNonce": _next_random, "updated": lambda _: now}
+    tables = {t: _defaults_table(t, generated) for t in TYPE_DEFAULTS}
+    other_table = _defaults_table(None, generated)
+    text_table = tables["text"]
+
+    def normalize(el: dict) -> list:
+        el_type = el.get("type", "rectangle")
+
+        # 1. defaults
+        for key, value, copier in tables.get(el_type, other_table):
+            if key not in el:
+                el[key] = copier(value) if copier else value
+
+        if el_type == "arrow" or el_type == "line":
+            if not geometry:
+                return [el]
+            w = el.get("width", 0)
+            h = el.get("height", 0)
+
+            # 2. type — lifelines should be type "line", not "arrow"
+            if el_type == "arrow" and abs(h) > abs(w):
+                el["type"] = el_type = "line"
+                el["endArrowhead"] = None
+                el["startArrowhead"] = None
+
+            # 3. geometry
+            if w < 0 or h < 0:
+                el["x"] = el.get("x", 0) + w
+                el["y"] = el.get("y", 0) + h
+                w = el["width"] = abs(w)
+                h = el["height"] = abs(h)
+                el["points"] = [[0, 0], [w, h]]
+            elif not _spans(el.get("points"), w, h):
+                el["points"] = [[0, 0], [w, h]]
+
+        # 4. text
+        elif el_type == "text":
+            if not (el.get("containerId") and el.get("originalText")):
+                el["originalText"] = el.get("text", "")
+            if not el.get("containerId"):
+                fit_text(el)
+        elif el_type in CONTAINER_TYPES and "label" in el:
+            text = bound_label(el)
+            if text is not None:
+                for key, value, copier in text_table:
+                    if key not in text:
+                        text[key] = copier(value) if copier else value
+                return [el, text]
+
+        return [el]
+
+    return normalize
+
+
+def iter_normalized(elements, geometry: bool = True):
+    """
+    Generator form of normalize_elements: normalizes each element as it is
+    pulled, so it can sit directly on a streaming source.
+    """
+    normalize = normalizer(geometry)
+    for el in elements:
+        yield from normalize(el)
+
+
+def normalize_elements(elements: list, geometry: bool = True) -> list:
+    """
+    Single-traversal replacement for fix_elements(sanitize_elements(...)).
+    See the rule order above; geometry=False keeps arrows / lines as they are.
+    """
+    return list(iter_normalized(elements, geometry))
+
+
+def normalize_element(el: dict) -> dict:
+    """One element; an inline label's bound text is not returned (use normalize_elements)."""
+    return normalizer()(el)[0]
@@ -0,0 +1,230 @@
+"""
+scene_model.py
+--------------
+Compact in-memory form of an Excalidraw scene.
+
+A normalized element is a plain dict of about 25 keys, and most of its
+values repeat across the scene:
+  - groupIds / boundElements are usually []
+  - link is null
+  - the TYPE_DEFAULTS styles are the same colors and enums everywhere
+json.loads and sanitize_element give every element its own copy of all of
+them. For scenes of tens of thousands of elements, those dicts are most of
+the memory.
+
+Element stores one element in `__slots__`:
+  - A known field is an attribute and costs one pointer.
+  - The element's key order is an interned tuple, shared by every element
+    with the same layout.
+  - Lists become tuples and objects become _Map tuples. Both are immutable,
+    so style objects such as roundness or groupIds can be pooled and shared,
+    and the empty [] / {} are single shared instances.
+  - Strings of style fields (type, colors, enums) are interned, and their
+    numbers pooled.
+  - Unknown keys go into a small per-element dict.
+
+Scene is a list of Elements. The pools of key orders and style values belong
+to the Scene and go away with it, so a long-running process building one
+Scene per request doesn't accumulate them. Converting back gives the same
+keys in the same order with the same values and value types (1 / 1.0 / True
+and 0.0 / -0.0 stay apart), so json.dumps of a round-tripped scene is
+byte-for-byte the original.
+
+Usage:
+    from scene_model import Scene
+
+    scene = Scene.from_list(elements)      # or Scene.loads(json_text)
+    scene.extend(more_elements)
+    elements = scene.to_list()             # fresh dicts, same JSON
+"""
+import json
+import math
+import sys
+
+from sanitize_elements import BASE_DEFAULTS, TYPE_DEFAULTS
+
+# Every key normalize_elements can produce, plus the geometry / text the model writes
+FIELDS = tuple(dict.fromkeys(
+    ("id", "type", "x", "y", "width", "height", "text", "index", "frameId")
+    + tuple(BASE_DEFAULTS)
+    + tuple(key for defaults in TYPE_DEFAULTS.values() for key in defaults)
+))
+_FIELD_SET = frozenset(FIELDS)
+
+# Fields whose values repeat across a scene: their strings are interned and
+# their numbers / lists / objects pooled. Per-element values (ids, text,
+# points, bindings, seeds, timestamps) are only frozen.
+_SHARED = frozenset(("type", "angle", "version", "isDeleted", "groupIds", "link", "locked",
+                     "opacity", "frameId") + tuple(
+    key for defaults in TYPE_DEFAULTS.values() for key in defaults
+    if key not in ("points", "startBinding", "endBinding", "originalText", "containerId")
+))
+
+
+class _Map(tuple):
+    """A frozen JSON object: a tuple of (key, value) pairs, told apart from a frozen array."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"_Map({tuple.__repr__(self)})"
+
+
+_EMPTY_MAP = _Map()
+_EMPTY_LIST = ()
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value) if value else _EMPTY_LIST
+    if isinstance(value, dict):
+        return _Map((k, _freeze(v)) for k, v in value.items()) if value else _EMPTY_MAP
+    return value
+
+
+def _shared(value, pool: dict):
+    """value, frozen, as the equal instance already in `pool` (a Scene's) if there is one."""
+    cls = value.__class__
+    if cls is str:
+        return sys.intern(value)
+    if cls is int:
+        # the class is part of the key: 1, 1.0 and True compare (and hash) equal
+        return pool.setdefault((cls, value), value)
+    if cls is float:
+        if value != value:      # NaN never finds itself in a dict
+            return value
+        # and the sign, since 0.0 == -0.0
+        return pool.setdefault((cls, value, math.copysign(1.0, value)), value)
+    if value is None or cls is bool:
+        return value
+    frozen = _freeze(value)
+    if frozen is _EMPTY_LIST or frozen is _EMPTY_MAP:
+        return frozen
+    # repr tells frozen objects from arrays, and 1 / 1.0 / True and -0.0 apart inside them
+    return pool.setdefault(repr(frozen), frozen)
+
+
+def _thaw(value):
+    if isinstance(value, _Map):
+        return {k: _thaw(v) for k, v in value}
+    if isinstance(value, (tuple, list)):
+        return [_thaw(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+class Element:
+    """One element; known fields are slots, nested values are read-only tuples."""
+    __slots__ = FIELDS + ("_keys", "_extra")
+
+    @classmethod
+    def from_dict(cls, data: dict, pool: dict = None) -> "Element":
+        """
+        Element for `data`. Elements built with the same `pool` share key
+        orders and style values; Scene passes its own.
+        """
+        if pool is None:
+            pool = {}
+        el = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            slot = _SET.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = _freeze(value)
+                continue
+            if key in _SHARED:
+                value = _shared(value, pool)
+            elif value.__class__ is list or value.__class__ is dict:
+                value = _freeze(value)
+            slot(el, value)
+        keys = tuple(data)
+        # key orders are tuples of str: they can't collide with the value keys
+        el._keys = pool.setdefault(keys, keys)
+        el._extra = extra
+        return el
+
+    def to_dict(self) -> dict:
+        """A new, mutable dict equal to the one this element was built from."""
+        out = {}
+        for key in self._keys:
+            get = _GET.get(key)
+            value = get(self) if get is not None else self._extra[key]
+            out[key] = _thaw(value) if value.__class__ is tuple or value.__class__ is _Map else value
+        return out
+
+    def __getitem__(self, key: str):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key) if key in _FIELD_SET else self._extra[key]
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self._keys else default
+
+    def __setitem__(self, key: str, value) -> None:
+        # Edits aren't pooled: the element doesn't know its Scene
+        value = _freeze(value)
+        if key in _FIELD_SET:
+            setattr(self, key, sys.intern(value) if value.__class__ is str and key in _SHARED else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        if key not in self._keys:
+            self._keys = self._keys + (key,)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def keys(self) -> tuple:
+        return self._keys
+
+    def __repr__(self):
+        return f"Element({self.get('type')!r}, id={self.get('id')!r})"
+
+
+# Slot descriptors by field name, to skip getattr / setattr's lookup
+_SET = {key: Element.__dict__[key].__set__ for key in FIELDS}
+_GET = {key: Element.__dict__[key].__get__ for key in FIELDS}
+
+
+class Scene:
+    """Ordered collection of compact Elements, with its own pool of shared values."""
+    __slots__ = ("elements", "_pool")
+
+    def __init__(self, elements=()):
+        self._pool = {}
+        self.elements = [Element.from_dict(el, self._pool) for el in elements]
+
+    @classmethod
+    def from_list(cls, elements: list) -> "Scene":
+        return cls(elements)
+
+    @classmethod
+    def loads(cls, text: str) -> "Scene":
+        """From a JSON array of elements, or a .excalidraw file's JSON."""
+        data = json.loads(text)
+        return cls(data["elements"] if isinstance(data, dict) else data)
+
+    def append(self, element: dict) -> None:
+        self.elements.append(Element.from_dict(element, self._pool))
+
+    def extend(self, elements) -> None:
+        pool = self._pool
+        self.elements.extend(Element.from_dict(el, pool) for el in elements)
+
+    def to_list(self) -> list:
+        return [el.to_dict() for el in self.elements]
+
+    def dumps(self, **kwargs) -> str:
+        return json.dumps(self.to_list(), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __getitem__(self, index):
+        return self.elements[index]
@@ -0,0 +1,418 @@
+"""
+server.py
+---------
+Long-running HTTP service for diagram generation.
+
+Prompts are queued onto a bounded asyncio.Queue and processed by a fixed
+pool of worker tasks that share one Gemini client (and, for canvas
+rendering, one warm excalidraw-mcp server). When the queue is full new
+requests are rejected with 429 + Retry-After instead of piling up.
+
+Requirements:
+    pip install google-genai mcp python-dotenv starlette uvicorn
+
+Usage:
+    python server.py --port 8000 --workers 4 --queue-size 64
+
+    curl -X POST localhost:8000/generate -H 'Content-Type: application/json' \
+         -d '{"prompt": "Draw a 3-tier web architecture"}'
+    curl -X POST localhost:8000/generate -H 'Content-Type: application/json' \
+         -d '{"prompt": "Order flowchart", "type": "flowchart", "format": "excalidraw"}' -o flow.excalidraw
+
+Endpoints:
+    POST /generate   {"prompt", "type"?, "format"?: "elements" | "excalidraw",
+                      "layout"?: "model" | "local", "render"?: bool, "session"?: str}
+    GET|POST /generate/stream
+                     Server-sent events: "start" (diagram type), one "elements"
+                     event per sanitized batch as Gemini streams, then "done"
+                     with the full .excalidraw scene, overlaps repaired and
+                     arrows snapped (or "error", also after --request-timeout).
+                     Params: prompt, type?, batch? (elements per event, default 1)
+    GET  /types      supported diagram types
+    GET  /health     queue depth, worker count and Gemini call metrics
+"""
+import asyncio
+import argparse
+import contextlib
+import json
+import sys
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from sse_starlette.sse import EventSourceResponse
+
+from excalidraw_rules import SUPPORTED_TYPES, detect_diagram_type, get_system_prompt
+from sanitize_elements import normalizer
+from scene_model import Scene
+from excalidraw_mcp import ExcalidrawMCPClient, push_to_canvas
+from response_cache import ResponseCache
+from gemini_client import get_client, PromptContextCache
+from gemini_scheduler import GeminiScheduler
+import gemini_to_excalidraw_no_mcp as pipeline
+from gemini_to_excalidraw_no_mcp import (
+    arun_pipeline, agenerate_elements_stream, build_excalidraw_file, finish_elements,
+)
+
+FORMATS = ("elements", "excalidraw")
+LAYOUTS = ("model", "local")   # "local": Gemini returns topology, auto_layout places it
+
+
+class QueueFull(Exception):
+    pass
+
+
+async def _within(source, timeout: float = None):
+    """Items of an async generator; TimeoutError once `timeout` seconds have passed in all."""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    try:
+        while True:
+            left = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                item = await asyncio.wait_for(source.__anext__(), left)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"generation did not finish within {timeout:.0f}s") from None
+            yield item
+    finally:
+        await source.aclose()
+
+
+def _final_scene(elements: list) -> str:
+    """The "done" payload: layout repaired, arrows snapped, as a .excalidraw file."""
+    elements = finish_elements(elements, verbose=False)
+    return json.dumps(build_excalidraw_file(elements), ensure_ascii=False)
+
+
+# ─────────────────────────────────────────────
+# Worker pool
+# ─────────────────────────────────────────────
+class DiagramService:
+    """Bounded job queue + fixed pool of generation workers."""
+
+    def __init__(self, workers: int = 4, queue_size: int = 64,
+                 cache: ResponseCache = None, context_cache=None, ready_timeout: float = 10.0,
+                 max_streams: int = None, scheduler: GeminiScheduler = None):
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue(maxsize=max(1, queue_size))
+        # Streams hold a Gemini connection open for their whole duration, so
+        # they get their own slots instead of a place in the job queue.
+        self.max_streams = max(1, max_streams or workers)
+        self._streams = set()
+        self.cache = cache
+        self.context_cache = context_cache
+        self.ready_timeout = ready_timeout
+        # Shared by all workers and streams, so rate limits apply service-wide
+        self.scheduler = scheduler or GeminiScheduler()
+        self.mcp_client = None          # started on the first render request
+        self._tasks = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.mcp_client is not None:
+            await self.mcp_client.close()
+
+    def submit(self, job: dict) -> asyncio.Future:
+        """Queue a job; raises QueueFull when the service is saturated."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            raise QueueFull() from None
+        return future
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job, future = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                # Cancelling the future (request timeout) cancels the running job
+                task = asyncio.ensure_future(self._run(job))
+                future.add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+                try:
+                    await asyncio.wait({task})
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                if task.cancelled():
+                    continue    # the request gave up; this worker takes the next job
+                if not future.done():
+                    future.set_result(task.result())
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: dict) -> list:
+        elements = await arun_pipeline(
+            job["prompt"], job.get("type"), verbose=False,
+            cache=self.cache, context_cache=self.context_cache, scheduler=self.scheduler,
+            layout=job.get("layout", "model"),
+        )
+        if job.get("render"):
+            if self.mcp_client is None:
+                self.mcp_client = ExcalidrawMCPClient()
+            await push_to_canvas(self.mcp_client, elements, job["session"], self.ready_timeout)
+        return elements
+
+    async def stream(self, job: dict, batch_size: int = 1, slot=None, future: asyncio.Future = None,
+                     timeout: float = None):
+        """
+        Async generator of SSE events for one job. `slot` comes from
+        open_stream and is released when the generator finishes or the
+        client disconnects (see generate_stream for the not-started case).
+        The whole stream gets at most `timeout` seconds, after which it ends
+        with an error event. For "layout": "local" jobs, `future` is the job
+        already submitted to the worker queue.
+        """
+        try:
+            diagram_type = job.get("type") or detect_diagram_type(job["prompt"])
+            yield {"event": "start", "data": json.dumps({"type": diagram_type})}
+
+            if future is not None:
+                # The layout needs the whole graph: one batch once the queued job is done
+                try:
+                    elements = await asyncio.wait_for(asyncio.shield(future), timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"generation did not finish within {timeout:.0f}s") from None
+                yield {"event": "elements", "data": json.dumps(elements, ensure_ascii=False)}
+                yield {"event": "done", "data": json.dumps(build_excalidraw_file(elements), ensure_ascii=False)}
+                return
+
+            # One normalization run for the whole stream; batches already sent
+            # are kept compact until the final file is built
+            normalize = normalizer()
+            scene, pending = Scene(), []
+            async for raw in _within(agenerate_elements_stream(
+                job["prompt"], get_system_prompt(diagram_type), verbose=False,
+                cache=self.cache, context_cache=self.context_cache, scheduler=self.scheduler,
+            ), timeout):
+                pending.extend(normalize(raw))
+                if len(pending) >= batch_size:
+                    scene.extend(pending)
+                    yield {"event": "elements", "data": json.dumps(pending, ensure_ascii=False)}
+                    pending = []
+            if pending:
+                scene.extend(pending)
+                yield {"event": "elements", "data": json.dumps(pending, ensure_ascii=False)}
+
+            # Overlaps and bindings can involve shapes from later batches: the
+            # final file is repaired as a whole, as /generate does (in a thread)
+            yield {"event": "done", "data": await asyncio.to_thread(_final_scene, scene.to_list())}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"error": f"{type(e).__name__}: {e}"})}
+        finally:
+            self.close_stream(slot, future)
+
+    def open_stream(self):
+        """A stream slot (pass it to close_stream), or None when all are taken."""
+        if len(self._streams) >= self.max_streams:
+            return None
+        slot = object()
+        self._streams.add(slot)
+        return slot
+
+    def close_stream(self, slot, future: asyncio.Future = None) -> None:
+        """Release a slot and cancel its queued job if unfinished; safe to call more than once."""
+        self._streams.discard(slot)
+        if future is not None:
+            future.cancel()
+
+    @property
+    def active_streams(self) -> int:
+        return len(self._streams)
+
+
+# ─────────────────────────────────────────────
+# HTTP layer
+# ─────────────────────────────────────────────
+def _error(status: int, message: str, headers: dict = None) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+def parse_job(body) -> dict:
+    """Validate a /generate request body; raises ValueError on bad input."""
+    if not isinstance(body, dict):
+        raise ValueError("request body must be a JSON object")
+    prompt = body.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError("'prompt' is required")
+    diagram_type = body.get("type")
+    if diagram_type is not None and diagram_type not in SUPPORTED_TYPES:
+        raise ValueError(f"unknown 'type' {diagram_type!r}; expected one of {SUPPORTED_TYPES}")
+    fmt = body.get("format", "elements")
+    if fmt not in FORMATS:
+        raise ValueError(f"'format' must be one of {list(FORMATS)}")
+    layout = body.get("layout", "model")
+    if layout not in LAYOUTS:
+        raise ValueError(f"'layout' must be one of {list(LAYOUTS)}")
+    render = body.get("render", False)
+    if not isinstance(render, bool):
+        raise ValueError("'render' must be true or false")
+    return {
+        "prompt": prompt.strip(),
+        "type": diagram_type,
+        "format": fmt,
+        "layout": layout,
+        "render": render,
+        "session": str(body.get("session") or f"diagram-{uuid.uuid4().hex[:8]}"),
+    }
+
+
+def create_app(service: DiagramService, request_timeout: float = 300.0) -> Starlette:
+
+    async def generate(request: Request) -> Response:
+        try:
+            job = parse_job(await request.json())
+        except json.JSONDecodeError:
+            return _error(400, "request body is not valid JSON")
+        except ValueError as e:
+            return _error(400, str(e))
+
+        try:
+            future = service.submit(job)
+        except QueueFull:
+            return _error(429, "generation queue is full, retry later", {"Retry-After": "5"})
+
+        try:
+            elements = await asyncio.wait_for(asyncio.shield(future), timeout=request_timeout)
+        except asyncio.TimeoutError:
+            # Frees the worker: the job is cancelled wherever it got to (a
+            # blocking step already handed to a thread still runs to its end)
+            future.cancel()
+            return _error(504, f"generation did not finish within {request_timeout:.0f}s")
+        except Exception as e:
+            return _error(502, f"generation failed: {type(e).__name__}: {e}")
+
+        if job["format"] == "excalidraw":
+            return Response(
+                json.dumps(build_excalidraw_file(elements), ensure_ascii=False),
+                media_type="application/json",
+                headers={"Content-Disposition": 'attachment; filename="diagram.excalidraw"'},
+            )
+        return JSONResponse({"elements": elements, "session": job["session"] if job["render"] else None})
+
+    async def generate_stream(request: Request) -> Response:
+        try:
+            body = dict(request.query_params) if request.method == "GET" else await request.json()
+            job = parse_job(body)
+            batch_size = int(body.get("batch", 1))
+            if not 1 <= batch_size <= 500:
+                raise ValueError("'batch' must be between 1 and 500")
+        except json.JSONDecodeError:
+            return _error(400, "request body is not valid JSON")
+        except (TypeError, ValueError) as e:
+            return _error(400, str(e))
+
+        slot = service.open_stream()
+        if slot is None:
+            return _error(429, "too many concurrent streams, retry later", {"Retry-After": "5"})
+        future = None
+        if job["layout"] == "local":
+            # Whole-graph layout: queued and timed out like /generate
+            job["type"] = job["type"] or detect_diagram_type(job["prompt"])
+            try:
+                future = service.submit({**job, "render": False})
+            except QueueFull:
+                service.close_stream(slot)
+                return _error(429, "generation queue is full, retry later", {"Retry-After": "5"})
+        # The generator's finally never runs if the client leaves before it
+        # starts; the background task releases the slot in that case too.
+        return EventSourceResponse(service.stream(job, batch_size, slot, future, request_timeout),
+                                   background=BackgroundTask(service.close_stream, slot, future))
+
+    async def types(request: Request) -> Response:
+        return JSONResponse({"types": SUPPORTED_TYPES})
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({
+            "status": "ok",
+            "workers": service.workers,
+            "queued": service.queue.qsize(),
+            "queue_size": service.queue.maxsize,
+            "streams": service.active_streams,
+            "max_streams": service.max_streams,
+            "gemini": service.scheduler.summary(),
+        })
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        try:
+            yield
+        finally:
+            await service.stop()
+
+    return Starlette(
+        routes=[
+            Route("/generate", generate, methods=["POST"]),
+            Route("/generate/stream", generate_stream, methods=["GET", "POST"]),
+            Route("/types", types, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+# ─────────────────────────────────────────────
+# Entry point
+# ─────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", "-j", type=int, default=4,
+                        help="concurrent generations")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="max queued requests before answering 429")
+    parser.add_argument("--max-streams", type=int, default=None,
+                        help="max concurrent /generate/stream requests (default: --workers)")
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't read or write the on-disk response cache")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="cache the per-type system prompt with Gemini context caching")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="client-side limit on Gemini requests per minute")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="client-side limit on Gemini input tokens per minute")
+    parser.add_argument("--hedge-after", type=float, default=None,
+                        help="send a duplicate Gemini request if the first hasn't answered after this many seconds")
+    args = parser.parse_args()
+
+    pipeline.load_env()
+    if pipeline.GEMINI_API_KEY == "YOUR_GEMINI_API_KEY_HERE":
+        sys.exit("❌  Set GEMINI_API_KEY environment variable.")
+
+    service = DiagramService(
+        workers=args.workers,
+        queue_size=args.queue_size,
+        max_streams=args.max_streams,
+        cache=None if args.no_cache else ResponseCache(),
+        context_cache=PromptContextCache(get_client(pipeline.GEMINI_API_KEY), pipeline.GEMINI_MODEL) if args.context_cache else None,
+        scheduler=GeminiScheduler(rpm=args.rpm, tpm=args.tpm, deadline=args.request_timeout,
+                                  hedge_after=args.hedge_after),
+    )
+    uvicorn.run(create_app(service, args.request_timeout), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
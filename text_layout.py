@@ -0,0 +1,258 @@
+"""
+text_layout.py
+--------------
+Text measurement, wrapping and container-bound labels for Excalidraw scenes.
+
+Gemini used to be asked for text width ≈ len × fontSize × 0.6 and a
+separate centered text element for every shape caption. That is a lot of
+output tokens for something computed here, and any `label` it put on a
+shape was silently dropped. Now:
+
+  - measure_text sizes text from a per-family advance-width table
+    (fontFamily 1 = Virgil, 2 = Helvetica, 3 = Cascadia), with each family's
+    Excalidraw line height. Widths of measured strings are kept in an LRU
+    cache, and diagrams repeat the same words and labels over and over.
+  - wrap_text breaks text greedily at spaces to fit a width. A word longer
+    than a whole line is split between characters.
+  - bind_text creates a text element bound to a shape (containerId on the
+    text, an entry in the shape's boundElements). It is wrapped to the
+    shape's text area and positioned in it the same way Excalidraw does it.
+    The shape grows taller if the text needs more room.
+  - bound_label turns a shape's inline `label` into such a text element.
+    normalize_elements calls it for every rectangle / ellipse / diamond.
+  - fit_text sizes a free-standing text element to its measured text, so
+    the model's width / height guesses don't matter.
+
+The widths approximate the real fonts well enough for wrapping and sizing.
+Excalidraw re-measures bound text when its fonts load, so small errors
+don't show.
+
+Usage:
+    from text_layout import measure_text, wrap_text, bind_text, fit_text
+
+    width, height = measure_text("Order service", font_size=16, font_family=1)
+    text = bind_text(rectangle, "Validate the payment details")
+"""
+import math
+import unicodedata
+from functools import lru_cache
+
+CONTAINER_TYPES = ("rectangle", "ellipse", "diamond")
+
+DEFAULT_FONT_SIZE = 16
+DEFAULT_FONT_FAMILY = 1
+# Excalidraw's padding between a container's outline and its bound text
+BOUND_TEXT_PADDING = 5
+
+# Helvetica advance widths (1/1000 em) for printable ASCII, from its AFM
+_HELVETICA = dict(zip(
+    " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~",
+    (278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+     556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+     1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+     333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+     556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584),
+))
+
+# fontFamily -> (advance widths in em, width of other narrow characters, line height)
+FONT_METRICS = {
+    # Virgil has no AFM. Its hand-drawn glyphs run about 15% wider than
+    # Helvetica's, which lands near the old 0.6 em average.
+    1: ({c: w * 1.15 / 1000 for c, w in _HELVETICA.items()}, 0.64, 1.25),
+    2: ({c: w / 1000 for c, w in _HELVETICA.items()}, 0.556, 1.15),
+    # Cascadia is monospaced: 1200 / 2048 em per character
+    3: ({}, 0.586, 1.2),
+}
+
+
+def _char_width(ch: str, widths: dict, fallback: float) -> float:
+    width = widths.get(ch)
+    if width is not None:
+        return width
+    if unicodedata.combining(ch) or ch in "\u200d\ufe0e\ufe0f":
+        return 0.0      # combining marks, zero-width joiner, variation selectors
+    if unicodedata.east_asian_width(ch) in "WF":
+        return 1.0      # CJK and emoji take a full em in every family
+    return fallback
+
+
+@lru_cache(maxsize=8192)
+def _em_width(line: str, font_family: int) -> float:
+    """Width of one line of text, in ems."""
+    widths, fallback, _ = FONT_METRICS.get(font_family, FONT_METRICS[DEFAULT_FONT_FAMILY])
+    return sum(_char_width(ch, widths, fallback) for ch in line)
+
+
+def line_height(font_family: int = DEFAULT_FONT_FAMILY) -> float:
+    """Excalidraw's line height for a font family (as a multiple of fontSize)."""
+    return FONT_METRICS.get(font_family, FONT_METRICS[DEFAULT_FONT_FAMILY])[2]
+
+
+def measure_text(text: str, font_size: float = DEFAULT_FONT_SIZE,
+                 font_family: int = DEFAULT_FONT_FAMILY) -> tuple:
+    """(width, height) of possibly multiline text."""
+    lines = str(text).split("\n")
+    width = max(_em_width(line, font_family) for line in lines) * font_size
+    return width, len(lines) * font_size * line_height(font_family)
+
+
+def _split_word(word: str, max_width: float, font_size: float, font_family: int) -> list:
+    """Break a word that doesn't fit on one line between characters."""
+    pieces, current = [], ""
+    for ch in word:
+        if current and _em_width(current + ch, font_family) * font_size > max_width:
+            pieces.append(current)
+            current = ch
+        else:
+            current += ch
+    return pieces + [current]
+
+
+def wrap_text(text: str, max_width: float, font_size: float = DEFAULT_FONT_SIZE,
+              font_family: int = DEFAULT_FONT_FAMILY) -> str:
+    """Greedy word wrap to max_width px, keeping existing line breaks."""
+    if max_width <= 0:
+        return str(text)
+    space = _em_width(" ", font_family) * font_size
+    out = []
+    for paragraph in str(text).split("\n"):
+        line, width = [], 0.0
+        for word in paragraph.split():
+            w = _em_width(word, font_family) * font_size
+            if line and width + space + w <= max_width:
+                line.append(word)
+                width += space + w
+                continue
+            if line:
+                out.append(" ".join(line))
+            if w > max_width:
+                *full, word = _split_word(word, max_width, font_size, font_family)
+                out.extend(full)
+                w = _em_width(word, font_family) * font_size
+            line, width = [word], w
+        out.append(" ".join(line))
+    return "\n".join(out)
+
+
+def _font(size, family) -> tuple:
+    """(fontSize, fontFamily) with anything unusable replaced by the defaults."""
+    size = size if isinstance(size, (int, float)) and not isinstance(size, bool) and size > 0 \
+        else DEFAULT_FONT_SIZE
+    family = family if isinstance(family, int) and family in FONT_METRICS else DEFAULT_FONT_FAMILY
+    return size, family
+
+
+def fit_text(el: dict) -> dict:
+    """
+    Size a free-standing text element to its measured text, in place. The
+    point its textAlign refers to (left edge, center or right edge) stays
+    where it was, so text the model centered stays centered.
+    """
+    text = el.get("text")
+    if not isinstance(text, str):
+        return el
+    font_size, font_family = _font(el.get("fontSize"), el.get("fontFamily"))
+    w, h = measure_text(text, font_size, font_family)
+    lh = el.get("lineHeight")
+    if isinstance(lh, (int, float)) and not isinstance(lh, bool) and lh > 0:
+        h = (text.count("\n") + 1) * font_size * lh
+    old_w, x = el.get("width"), el.get("x")
+    if isinstance(old_w, (int, float)) and isinstance(x, (int, float)):
+        shift = {"center": (old_w - w) / 2, "right": old_w - w}.get(el.get("textAlign"), 0)
+        if shift:
+            el["x"] = round(x + shift, 2)
+    el["width"] = round(w, 2)
+    el["height"] = round(h, 2)
+    return el
+
+
+# ─────────────────────────────────────────────
+# Container-bound text
+# ─────────────────────────────────────────────
+def text_area(container: dict) -> tuple:
+    """
+    (x, y, width, height) a container's bound text may use, following
+    Excalidraw: the box inscribed in an ellipse or diamond, minus padding.
+    """
+    x, y = container.get("x", 0), container.get("y", 0)
+    w, h = abs(container.get("width", 0)), abs(container.get("height", 0))
+    kind = container.get("type")
+    if kind == "ellipse":
+        dx, dy = w / 2 * (1 - math.sqrt(2) / 2), h / 2 * (1 - math.sqrt(2) / 2)
+    elif kind == "diamond":
+        dx, dy = w / 4, h / 4
+    else:
+        dx = dy = 0
+    pad = BOUND_TEXT_PADDING
+    return x + dx + pad, y + dy + pad, max(w - 2 * (dx + pad), 0), max(h - 2 * (dy + pad), 0)
+
+
+def _fit(kind: str, size: float) -> float:
+    """Container width (or height) whose text area is `size` wide (or tall)."""
+    inner = size + 2 * BOUND_TEXT_PADDING
+    if kind == "ellipse":
+        return inner * math.sqrt(2)
+    if kind == "diamond":
+        return inner * 2
+    return inner
+
+
+def bind_text(container: dict, text: str, el_id: str = None, font_size: float = DEFAULT_FONT_SIZE,
+              font_family: int = DEFAULT_FONT_FAMILY, color: str = "#1e1e1e",
+              align: str = "center", valign: str = "middle") -> dict:
+    """
+    Text element bound to `container`, wrapped to its text area. The
+    container widens (around its center) if a single word doesn't fit, grows
+    taller if the lines don't, and gets a boundElements entry for the text.
+    """
+    el_id = el_id or f"{container['id']}-label"
+    kind = container.get("type")
+    _, _, area_w, area_h = text_area(container)
+    longest = max((_em_width(word, font_family) for word in str(text).split()), default=0) * font_size
+    if longest > area_w:
+        grow = _fit(kind, longest) - abs(container.get("width", 0))
+        container["x"] = round(container.get("x", 0) - grow / 2, 2)
+        container["width"] = round(abs(container.get("width", 0)) + grow, 2)
+        area_w = text_area(container)[2]
+    wrapped = wrap_text(text, max(area_w, longest), font_size, font_family)   # rounding can't split a word
+    w, h = measure_text(wrapped, font_size, font_family)
+    if h > area_h:
+        container["height"] = round(_fit(kind, h), 2)
+    ax, ay, area_w, area_h = text_area(container)
+
+    x = {"left": ax, "right": ax + area_w - w}.get(align, ax + (area_w - w) / 2)
+    y = {"top": ay, "bottom": ay + area_h - h}.get(valign, ay + (area_h - h) / 2)
+    bound = container.get("boundElements")
+    if not isinstance(bound, list):
+        bound = container["boundElements"] = []
+    bound.append({"id": el_id, "type": "text"})
+    return {"id": el_id, "type": "text", "x": round(x, 2), "y": round(y, 2),
+            "width": round(w, 2), "height": round(h, 2), "text": wrapped, "originalText": str(text),
+            "fontSize": font_size, "fontFamily": font_family, "lineHeight": line_height(font_family),
+            "textAlign": align, "verticalAlign": valign, "containerId": container["id"],
+            "strokeColor": color}
+
+
+def bound_label(container: dict):
+    """
+    Pop a shape's inline `label` and return it as a bound text element, or
+    None. The label may be a string or an object with text and optional
+    fontSize / fontFamily / strokeColor / textAlign / verticalAlign.
+    """
+    label = container.pop("label", None)
+    if isinstance(label, dict):
+        options, label = label, label.get("text")
+    else:
+        options = {}
+    if label is None or not str(label).strip() or container.get("id") is None:
+        return None
+    font_size, font_family = _font(options.get("fontSize"), options.get("fontFamily"))
+    return bind_text(
+        container, str(label),
+        font_size=font_size,
+        font_family=font_family,
+        color=options.get("strokeColor") or "#1e1e1e",
+        align=options.get("textAlign") if options.get("textAlign") in ("left", "right") else "center",
+        valign=options.get("verticalAlign") if options.get("verticalAlign") in ("top", "bottom") else "middle",
+    )
@@ -0,0 +1,205 @@
+"""
+timing.py
+---------
+Lightweight span timers for the diagram pipeline.
+
+Wrap a stage in `with span("gemini.generate"):` and, once timing is
+enabled, its wall time is recorded together with its parent span (tracked
+per thread / asyncio task via contextvars). Disabled — the default — a
+span is a shared no-op context manager, so instrumentation stays in the
+code at practically no cost.
+
+At the end of a run, print_report() prints a per-stage breakdown and
+write_jsonl() appends one JSON line per span for offline comparison.
+cprofile() wraps a block in cProfile and dumps the stats to a file.
+
+Usage:
+    timing.enable()
+    with timing.span("pipeline", prompt=prompt[:40]):
+        with timing.span("gemini.generate"):
+            ...
+    timing.print_report()
+    timing.write_jsonl("profile.jsonl")
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+
+_enabled = False
+_spans = []
+_lock = threading.Lock()
+_parent = contextvars.ContextVar("timing_parent", default="")
+_run_id = uuid.uuid4().hex[:12]
+
+
+class _Span:
+    __slots__ = ("name", "path", "attrs", "start", "seconds", "error", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+
+    def __enter__(self):
+        parent = _parent.get()
+        self.path = f"{parent}/{self.name}" if parent else self.name
+        self._token = _parent.set(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        with _lock:
+            _spans.append(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _spans.clear()
+
+
+def span(name: str, **attrs):
+    """Context manager timing one stage (a no-op unless enable() was called)."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def record(name: str, seconds: float, **attrs) -> None:
+    """Record an already-measured duration (e.g. a stream consumed across yields)."""
+    if not _enabled:
+        return
+    s = _Span(name, attrs)
+    parent = _parent.get()
+    s.path = f"{parent}/{name}" if parent else name
+    s.start = time.perf_counter() - seconds
+    s.seconds = seconds
+    with _lock:
+        _spans.append(s)
+
+
+def timed(name: str = None):
+    """Decorator form of span for plain and async functions."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ─────────────────────────────────────────────
+# Reports
+# ─────────────────────────────────────────────
+def summary() -> list:
+    """Per span path: count, total / mean / max seconds and errors, in first-seen order."""
+    with _lock:
+        spans = list(_spans)
+    rows = {}
+    for s in sorted(spans, key=lambda s: s.start):
+        row = rows.setdefault(s.path, {"path": s.path, "count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+        row["count"] += 1
+        row["total"] += s.seconds
+        row["max"] = max(row["max"], s.seconds)
+        row["errors"] += s.error is not None
+    for row in rows.values():
+        row["mean"] = row["total"] / row["count"]
+    return list(rows.values())
+
+
+def print_report() -> None:
+    rows = summary()
+    if not rows:
+        return
+    with _lock:
+        wall = max(s.start + s.seconds for s in _spans) - min(s.start for s in _spans)
+    print("\n── Timing ──────────────────────────────────")
+    print(f"  {'stage':<40} {'count':>5} {'total':>9} {'mean':>9} {'max':>9} {'wall%':>6}")
+    for row in rows:
+        depth = row["path"].count("/")
+        label = ("  " * depth + row["path"].rsplit("/", 1)[-1])[:40]
+        errors = f"  ({row['errors']} failed)" if row["errors"] else ""
+        print(f"  {label:<40} {row['count']:>5} {row['total']:>8.3f}s {row['mean']:>8.3f}s "
+              f"{row['max']:>8.3f}s {100 * row['total'] / wall if wall else 0:>5.1f}%{errors}")
+    print(f"  wall time: {wall:.3f}s")
+    print("────────────────────────────────────────────\n")
+
+
+def write_jsonl(path: str) -> int:
+    """Append one JSON line per recorded span; returns the number written."""
+    with _lock:
+        spans = sorted(_spans, key=lambda s: s.start)
+    if not spans:
+        return 0
+    origin = spans[0].start
+    epoch = time.time() - (time.perf_counter() - origin)
+    with open(path, "a", encoding="utf-8") as f:
+        for s in spans:
+            f.write(json.dumps({
+                "run": _run_id,
+                "name": s.name,
+                "path": s.path,
+                "ts": round(epoch + s.start - origin, 6),
+                "offset": round(s.start - origin, 6),
+                "seconds": round(s.seconds, 6),
+                "error": s.error,
+                **({"attrs": s.attrs} if s.attrs else {}),
+            }, ensure_ascii=False, default=str) + "\n")
+    return len(spans)
+
+
+@contextlib.contextmanager
+def cprofile(path: str = None):
+    """Run the block under cProfile and dump stats to `path` (no-op if path is None)."""
+    if not path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"      ✔ cProfile stats → {path}  (python -m pstats {path})")